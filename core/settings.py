@@ -93,6 +93,10 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": "/db/sqlite.db",
+        # Several consumer workers write task state concurrently
+        "OPTIONS": {"timeout": 20},
+        # A file like in production, so tests of concurrent writers lock alike
+        "TEST": {"NAME": "/db/test_sqlite.db"},
     }
 }
 
@@ -200,12 +204,109 @@ LOGOUT_REDIRECT_URL = "/"
 AXES_COOLOFF_TIME = 0.1
 
 
+def parse_concurrency_limits(value):
+    """Parses "name=limit,name=limit" into a dictionary of limits."""
+    limits = {}
+    for item in value.split(","):
+        if "=" in item:
+            name, limit = item.split("=", 1)
+            limits[name.strip()] = int(limit)
+    return limits
+
+
+# Download task dispatching, a limit of 0 means unlimited
+DOWNLOADER_MAX_CONCURRENT_TASKS = int(
+    os.getenv("DOWNLOADER_MAX_CONCURRENT_TASKS", "4")
+)
+DOWNLOADER_SAVE_STRATEGY_CONCURRENCY_LIMITS = parse_concurrency_limits(
+    os.getenv("DOWNLOADER_SAVE_STRATEGY_CONCURRENCY_LIMITS", "")
+)
+DOWNLOADER_MAX_CONCURRENT_TASKS_PER_CATALOGUE = int(
+    os.getenv("DOWNLOADER_MAX_CONCURRENT_TASKS_PER_CATALOGUE", "0")
+)
+# Bytes probed tasks may download at once, a task larger than that runs alone
+DOWNLOADER_MAX_IN_PROGRESS_BYTES = int(
+    os.getenv("DOWNLOADER_MAX_IN_PROGRESS_BYTES", "0")
+)
+DOWNLOADER_TASK_LEASE_SECONDS = int(os.getenv("DOWNLOADER_TASK_LEASE_SECONDS", "600"))
+DOWNLOADER_TASK_LEASE_RENEW_SECONDS = int(
+    os.getenv("DOWNLOADER_TASK_LEASE_RENEW_SECONDS", "30")
+)
+DOWNLOADER_MAX_TASK_RECLAIMS = int(os.getenv("DOWNLOADER_MAX_TASK_RECLAIMS", "3"))
+DOWNLOADER_MAX_CONCURRENT_ITEMS_PER_TASK = int(
+    os.getenv("DOWNLOADER_MAX_CONCURRENT_ITEMS_PER_TASK", "2")
+)
+DOWNLOADER_MAX_ITEM_ATTEMPTS = int(os.getenv("DOWNLOADER_MAX_ITEM_ATTEMPTS", "2"))
+# Cache of yt-dlp metadata, format URLs of full metadata expire after a few hours
+EXTRACTION_CACHE_TTL_SECONDS = int(os.getenv("EXTRACTION_CACHE_TTL_SECONDS", "1800"))
+EXTRACTION_CACHE_FLAT_TTL_SECONDS = int(
+    os.getenv("EXTRACTION_CACHE_FLAT_TTL_SECONDS", "3600")
+)
+EXTRACTION_CACHE_MAX_BYTES = int(
+    os.getenv("EXTRACTION_CACHE_MAX_BYTES", str(256 * 1024 * 1024))
+)
+# Seconds a worker counts cache hits and misses in memory before writing them
+EXTRACTION_CACHE_COUNTER_FLUSH_SECONDS = int(
+    os.getenv("EXTRACTION_CACHE_COUNTER_FLUSH_SECONDS", "60")
+)
+# Warm YoutubeDL instances kept per worker thread, and the yt-dlp cache they share
+YTDLP_POOL_SIZE = int(os.getenv("YTDLP_POOL_SIZE", "4"))
+YTDLP_CACHE_DIR = os.getenv("YTDLP_CACHE_DIR", str(BASE_DIR / "cache" / "yt-dlp"))
+# Playlist entries downloaded at once by a task that is not fanned out
+PLAYLIST_DOWNLOAD_CONCURRENCY = int(os.getenv("PLAYLIST_DOWNLOAD_CONCURRENCY", "4"))
+# Playlist entries queued for download at once, and resolved at once lazily
+PLAYLIST_ENTRY_WINDOW = int(os.getenv("PLAYLIST_ENTRY_WINDOW", "16"))
+# Connections each process wide S3 client keeps open to its endpoint
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "32"))
+# How long a bucket found or created is assumed to still exist
+S3_BUCKET_CACHE_TTL_SECONDS = int(os.getenv("S3_BUCKET_CACHE_TTL_SECONDS", "300"))
+# Files moved into a local catalogue at once
+LOCAL_SAVE_CONCURRENCY = int(os.getenv("LOCAL_SAVE_CONCURRENCY", "4"))
+# Files of a task or item saved at once, parts uploaded at once per file to S3.
+# Together they should not need more connections than S3_MAX_POOL_CONNECTIONS
+DOWNLOADER_SAVE_WORKERS = int(os.getenv("DOWNLOADER_SAVE_WORKERS", "4"))
+S3_MAX_CONCURRENCY = int(os.getenv("S3_MAX_CONCURRENCY", "8"))
+S3_MULTIPART_THRESHOLD = int(os.getenv("S3_MULTIPART_THRESHOLD", str(16 * 1024 * 1024)))
+S3_MULTIPART_CHUNKSIZE = int(os.getenv("S3_MULTIPART_CHUNKSIZE", str(16 * 1024 * 1024)))
+# Files this large are uploaded so a retried task continues the upload, whose
+# parts are aborted when it makes no progress for the deadline
+S3_RESUMABLE_UPLOAD_THRESHOLD = int(
+    os.getenv("S3_RESUMABLE_UPLOAD_THRESHOLD", str(256 * 1024 * 1024))
+)
+S3_MULTIPART_UPLOAD_DEADLINE_HOURS = int(
+    os.getenv("S3_MULTIPART_UPLOAD_DEADLINE_HOURS", "24")
+)
+# ffmpeg processes converting audio at once per worker, one per core by default
+TRANSCODE_CONCURRENCY = int(
+    os.getenv("TRANSCODE_CONCURRENCY", str(os.cpu_count() or 1))
+)
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+FFPROBE_BINARY = os.getenv("FFPROBE_BINARY", "ffprobe")
+# Link or copy media already in storage instead of downloading and saving it
+# again for every task, not only those whose download profile enables it
+MEDIA_DEDUP = os.getenv("MEDIA_DEDUP", "False") == "True"
+# Pending tasks probed for their size per minute, 0 disables probing, and the
+# entries of a playlist or list probed to estimate all of them
+TASK_PROBE_BATCH_SIZE = int(os.getenv("TASK_PROBE_BATCH_SIZE", "10"))
+TASK_PROBE_SAMPLE_ENTRIES = int(os.getenv("TASK_PROBE_SAMPLE_ENTRIES", "3"))
+
 HUEY = {
     "huey_class": "huey.SqliteHuey",
     "immediate": False,
     "filename": "/huey_db/huey.db",
     "consumer": {
-        "workers": 1,
+        # Enough workers for every item of every running task, plus one each
+        # that keep the periodic dispatcher and probe from waiting on downloads.
+        # Without a task limit the workers limit the running tasks, to 4 of them
+        "workers": int(
+            os.getenv(
+                "HUEY_WORKERS",
+                (DOWNLOADER_MAX_CONCURRENT_TASKS or 4)
+                * DOWNLOADER_MAX_CONCURRENT_ITEMS_PER_TASK
+                + 2,
+            )
+        ),
         "worker_type": "thread",
+        "flush_locks": True,
     },
 }
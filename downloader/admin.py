@@ -1,9 +1,108 @@
 from django.contrib import admin
-from .models import DownloadTask, TaskExecutionWindow
+from .models import (
+    DownloadArchiveEntry,
+    DownloadProfile,
+    DownloadTask,
+    DownloadTaskItem,
+    ExtractorTuning,
+    MultipartUpload,
+    StoredMedia,
+    TaskExecutionWindow,
+)
+from .domain.task_services import save_or_coalesce_task
+from .domain.task_state import TaskState
+from .tasks import dispatch_download_tasks
 
 admin.site.register(TaskExecutionWindow)
 
 
+@admin.register(DownloadArchiveEntry)
+class DownloadArchiveEntryAdmin(admin.ModelAdmin):
+    list_display = ["archive_id", "save_strategy", "catalogue_name", "created_at"]
+    list_filter = ["save_strategy", "catalogue_name"]
+    search_fields = ["archive_id"]
+
+
+@admin.register(DownloadProfile)
+class DownloadProfileAdmin(admin.ModelAdmin):
+    list_display = [
+        "name",
+        "concurrent_fragment_downloads",
+        "http_chunk_size",
+        "ratelimit",
+        "max_height",
+    ]
+
+
+@admin.register(ExtractorTuning)
+class ExtractorTuningAdmin(admin.ModelAdmin):
+    list_display = [
+        "extractor",
+        "concurrent_fragment_downloads",
+        "fragment_bytes_per_second",
+        "http_chunk_size",
+        "http_bytes_per_second",
+        "updated_at",
+    ]
+
+
+@admin.register(MultipartUpload)
+class MultipartUploadAdmin(admin.ModelAdmin):
+    list_display = ["key", "bucket", "file_size", "part_size", "updated_at"]
+    search_fields = ["key"]
+
+
+@admin.register(StoredMedia)
+class StoredMediaAdmin(admin.ModelAdmin):
+    list_display = [
+        "file_name",
+        "save_strategy",
+        "catalogue_name",
+        "variant",
+        "size_bytes",
+        "created_at",
+    ]
+    list_filter = ["save_strategy", "variant"]
+    search_fields = ["file_name", "archive_id", "content_hash"]
+
+
+class DownloadTaskItemInline(admin.TabularInline):
+    model = DownloadTaskItem
+    extra = 0
+    readonly_fields = ["position", "url", "state", "attempts", "error_message"]
+    exclude = ["filename_prefix", "created_at"]
+    can_delete = False
+
+
 @admin.register(DownloadTask)
 class DownloadTaskAdmin(admin.ModelAdmin):
-    readonly_fields = ["priority"]
+    readonly_fields = [
+        "priority",
+        "lease_owner",
+        "lease_expires_at",
+        "reclaim_count",
+        "estimated_bytes",
+        "media_duration",
+        "media_format",
+        "entry_count",
+        "probed_at",
+    ]
+    inlines = [DownloadTaskItemInline]
+    actions = ["retry_tasks"]
+
+    @admin.action(description="Retry selected failed tasks")
+    def retry_tasks(self, request, queryset):
+        coalesced = 0
+        for task in queryset.filter(state=TaskState.FAILED.value):
+            task.state = TaskState.PENDING.value
+            task.reclaim_count = 0
+            task.error_message = ""
+            if save_or_coalesce_task(task) is not None:
+                coalesced += 1
+        if coalesced:
+            self.message_user(
+                request,
+                f"{coalesced} tasks were not retried, unfinished tasks download "
+                f"the same media.",
+            )
+        dispatch_download_tasks()
@@ -0,0 +1,243 @@
+import threading
+import logging
+
+from django.apps import apps
+from yt_dlp.postprocessor.common import PostProcessor
+
+logger = logging.getLogger("downloader")
+
+MiB = 1024 * 1024
+
+CONCURRENCY_STEPS = [1, 2, 4, 8, 16]
+CHUNK_SIZE_STEPS = [1 * MiB, 2 * MiB, 5 * MiB, 10 * MiB, 20 * MiB, 50 * MiB]
+DEFAULT_CHUNK_SIZE = 10 * MiB
+
+# A step up is kept when it is at least this much faster
+MIN_GAIN = 0.1
+# A settled climber probes again when throughput drops by this much
+MAX_DROP = 0.3
+# A settled climber probes the next step up after this many samples
+PROBE_INTERVAL = 8
+# More retries per fragment or HTTP download than this count as throttling
+MAX_RETRY_RATE = 0.05
+# Downloads smaller than this finish too fast to measure throughput
+MIN_SAMPLE_BYTES = 1 * MiB
+
+FRAGMENTED_PROTOCOLS = ("m3u8", "m3u8_native", "http_dash_segments")
+
+
+class ThroughputClimber:
+    """
+    Picks one value of a setting, e.g. the fragment concurrency, out of an
+    ascending list of steps by hill climbing on the observed bytes/s.
+
+    While probing, it moves one step at a time while throughput improves by
+    at least MIN_GAIN. When the first step does not help, it tries the other
+    direction, then settles on the best step. Errors move it one step down
+    right away. A settled climber probes again every PROBE_INTERVAL samples,
+    upwards first, or when throughput drops by MAX_DROP, downwards first.
+    """
+
+    def __init__(self, steps, value, bytes_per_second=None, settled=False):
+        self.steps = steps
+        self.index = min(range(len(steps)), key=lambda index: abs(steps[index] - value))
+        self.settled = settled
+        self.estimate = bytes_per_second
+        self.baseline = None
+        self.direction = 1
+        self.reversed = False
+        self.samples_since_probe = 0
+
+    @property
+    def value(self):
+        return self.steps[self.index]
+
+    def _start_probe(self, direction, bytes_per_second):
+        self.reversed = False
+        self._probe(direction, bytes_per_second)
+
+    def _probe(self, direction, bytes_per_second):
+        """Moves one step into direction, measured against bytes_per_second."""
+        self.baseline = (self.index, bytes_per_second)
+        self.direction = direction
+        self.samples_since_probe = 0
+        if 0 <= self.index + direction < len(self.steps):
+            self.index += direction
+            self.settled = False
+        elif not self.reversed:
+            self.reversed = True
+            self._probe(-direction, bytes_per_second)
+        else:
+            self._settle(self.index, bytes_per_second)
+
+    def _settle(self, index, bytes_per_second):
+        self.index = index
+        self.estimate = bytes_per_second
+        self.baseline = None
+        self.settled = True
+        self.samples_since_probe = 0
+
+    def observe(self, bytes_per_second):
+        if self.settled:
+            if self.estimate is None:
+                self.estimate = bytes_per_second
+                return
+            self.samples_since_probe += 1
+            if bytes_per_second < self.estimate * (1 - MAX_DROP):
+                self._start_probe(-1, bytes_per_second)
+            elif self.samples_since_probe >= PROBE_INTERVAL:
+                self._start_probe(1, bytes_per_second)
+            else:
+                self.estimate = 0.8 * self.estimate + 0.2 * bytes_per_second
+            return
+
+        if self.baseline is None:
+            self._start_probe(self.direction, bytes_per_second)
+            return
+
+        baseline_index, baseline_bytes_per_second = self.baseline
+        if bytes_per_second > baseline_bytes_per_second * (1 + MIN_GAIN):
+            # Moving on, the other direction is known to be slower
+            self.reversed = True
+            self._probe(self.direction, bytes_per_second)
+        elif not self.reversed:
+            self.reversed = True
+            self.index = baseline_index
+            self._probe(-self.direction, baseline_bytes_per_second)
+        else:
+            self._settle(baseline_index, baseline_bytes_per_second)
+
+    def observe_errors(self):
+        self._settle(max(self.index - 1, 0), None)
+
+
+class AdaptiveDownloadTuner:
+    """
+    Adjusts concurrent_fragment_downloads for HLS and DASH formats and
+    http_chunk_size for plain HTTP formats per extractor, based on the
+    throughput reported by yt-dlp progress hooks and the retries counted
+    through its retry_sleep_functions.
+
+    Attach it to every YoutubeDL instance of a task with attach(). The values
+    are applied to ydl.params right before each entry is downloaded, so
+    later entries of a playlist use what earlier ones measured. save()
+    records the chosen values, which the next task starts from.
+    """
+
+    def __init__(self, concurrent_fragment_downloads=1, http_chunk_size=None):
+        self.initial_concurrency = concurrent_fragment_downloads
+        self.initial_chunk_size = http_chunk_size or DEFAULT_CHUNK_SIZE
+        self.climbers = {}
+        self.retries = {}
+        self.fragment_counts = {}
+        self._lock = threading.Lock()
+
+    def _climber(self, extractor, fragmented):
+        """Returns the climber of the fragment concurrency or HTTP chunk size."""
+        if extractor not in self.climbers:
+            ExtractorTuning = apps.get_model("downloader", "ExtractorTuning")
+            tuning = ExtractorTuning.objects.filter(extractor=extractor).first()
+            if tuning:
+                self.climbers[extractor] = (
+                    ThroughputClimber(
+                        CONCURRENCY_STEPS,
+                        tuning.concurrent_fragment_downloads,
+                        tuning.fragment_bytes_per_second,
+                        settled=True,
+                    ),
+                    ThroughputClimber(
+                        CHUNK_SIZE_STEPS,
+                        tuning.http_chunk_size,
+                        tuning.http_bytes_per_second,
+                        settled=True,
+                    ),
+                )
+            else:
+                self.climbers[extractor] = (
+                    ThroughputClimber(CONCURRENCY_STEPS, self.initial_concurrency),
+                    ThroughputClimber(CHUNK_SIZE_STEPS, self.initial_chunk_size),
+                )
+        concurrency, chunk_size = self.climbers[extractor]
+        return concurrency if fragmented else chunk_size
+
+    def attach(self, ydl):
+        ydl.add_post_processor(AdaptiveTuningPP(self, ydl), when="before_dl")
+        ydl.add_progress_hook(self.progress_hook)
+        return ydl
+
+    def apply(self, params, info_dict):
+        extractor = info_dict.get("extractor_key") or ""
+        with self._lock:
+            params["concurrent_fragment_downloads"] = self._climber(
+                extractor, True
+            ).value
+            params["http_chunk_size"] = self._climber(extractor, False).value
+        params["retry_sleep_functions"] = {
+            **params.get("retry_sleep_functions", {}),
+            "fragment": lambda n: self.count_retry(extractor, True),
+            "http": lambda n: self.count_retry(extractor, False),
+        }
+
+    def count_retry(self, extractor, fragmented):
+        """Used as yt-dlp retry sleep function, returns the sleep time."""
+        with self._lock:
+            key = (extractor, fragmented)
+            self.retries[key] = self.retries.get(key, 0) + 1
+        return 0
+
+    def progress_hook(self, progress):
+        info_dict = progress.get("info_dict") or {}
+        filename = progress.get("filename")
+        if progress.get("status") == "downloading":
+            if progress.get("fragment_count"):
+                self.fragment_counts[filename] = progress["fragment_count"]
+            return
+        if progress.get("status") != "finished":
+            return
+
+        extractor = info_dict.get("extractor_key") or ""
+        fragmented = info_dict.get("protocol") in FRAGMENTED_PROTOCOLS
+        requests = self.fragment_counts.pop(filename, None) or 1
+        with self._lock:
+            climber = self._climber(extractor, fragmented)
+            retries = self.retries.pop((extractor, fragmented), 0)
+            if retries / requests > MAX_RETRY_RATE:
+                climber.observe_errors()
+                return
+
+            downloaded_bytes = progress.get("downloaded_bytes") or 0
+            elapsed = progress.get("elapsed") or 0
+            if downloaded_bytes >= MIN_SAMPLE_BYTES and elapsed > 0:
+                climber.observe(downloaded_bytes / elapsed)
+
+    def save(self):
+        """Records the values chosen for every extractor seen by this tuner."""
+        ExtractorTuning = apps.get_model("downloader", "ExtractorTuning")
+        with self._lock:
+            for extractor, (concurrency, chunk_size) in self.climbers.items():
+                ExtractorTuning.objects.update_or_create(
+                    extractor=extractor,
+                    defaults={
+                        "concurrent_fragment_downloads": concurrency.value,
+                        "fragment_bytes_per_second": concurrency.estimate,
+                        "http_chunk_size": chunk_size.value,
+                        "http_bytes_per_second": chunk_size.estimate,
+                    },
+                )
+                logger.info(
+                    f"Tuned {extractor or 'unknown extractor'}: "
+                    f"{concurrency.value} concurrent fragments, "
+                    f"{chunk_size.value} bytes HTTP chunks"
+                )
+
+
+class AdaptiveTuningPP(PostProcessor):
+    """Applies the tuned values to the YoutubeDL params before each download."""
+
+    def __init__(self, tuner, ydl):
+        super().__init__(ydl)
+        self.tuner = tuner
+
+    def run(self, info):
+        self.tuner.apply(self._downloader.params, info)
+        return [], info
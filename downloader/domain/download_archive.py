@@ -0,0 +1,79 @@
+from django.apps import apps
+
+
+def entry_archive_id(info_dict):
+    """
+    Returns the yt-dlp download archive id ("<extractor> <video id>") of a
+    full or flat info dict, or None when the extractor or id is unknown.
+    """
+    extractor = info_dict.get("extractor_key") or info_dict.get("ie_key")
+    video_id = info_dict.get("id")
+    if not extractor or not video_id:
+        return None
+    # Imported here, tasks need the archive without loading yt_dlp
+    from yt_dlp.utils import make_archive_id
+
+    return make_archive_id(extractor, video_id)
+
+
+def entry_archive_ids(info_dict):
+    """Returns the archive id of an info dict and the ids older yt-dlp versions used."""
+    archive_id = entry_archive_id(info_dict)
+    return ([archive_id] if archive_id else []) + list(
+        info_dict.get("_old_archive_ids") or []
+    )
+
+
+class DownloadArchive:
+    """
+    The archive ids of everything saved to one catalogue of one save strategy.
+
+    Passed to yt-dlp as its download_archive option, so entries already in
+    the catalogue are skipped. yt-dlp adds entries once they are downloaded,
+    this archive only records them with record() once they are saved.
+    """
+
+    def __init__(self, save_strategy, catalogue_name):
+        self.save_strategy = save_strategy
+        self.catalogue_name = catalogue_name
+
+    def _entries(self):
+        DownloadArchiveEntry = apps.get_model("downloader", "DownloadArchiveEntry")
+        return DownloadArchiveEntry.objects.filter(
+            save_strategy=self.save_strategy, catalogue_name=self.catalogue_name
+        )
+
+    def __bool__(self):
+        # yt-dlp skips the archive lookup for empty archives
+        return True
+
+    def __contains__(self, archive_id):
+        return self._entries().filter(archive_id=archive_id).exists()
+
+    def add(self, archive_id):
+        pass
+
+    def archived_ids(self, archive_ids):
+        """Returns the given archive ids that are already in the archive."""
+        archive_ids = [archive_id for archive_id in archive_ids if archive_id]
+        archived = set()
+        for start in range(0, len(archive_ids), 500):
+            archived.update(
+                self._entries()
+                .filter(archive_id__in=archive_ids[start : start + 500])
+                .values_list("archive_id", flat=True)
+            )
+        return archived
+
+    def record(self, archive_id):
+        DownloadArchiveEntry = apps.get_model("downloader", "DownloadArchiveEntry")
+        DownloadArchiveEntry.objects.bulk_create(
+            [
+                DownloadArchiveEntry(
+                    save_strategy=self.save_strategy,
+                    catalogue_name=self.catalogue_name,
+                    archive_id=archive_id,
+                )
+            ],
+            ignore_conflicts=True,
+        )
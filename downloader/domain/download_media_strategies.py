@@ -1,25 +1,144 @@
-import enum
+import io
 import os
-import re
 import tempfile
 import logging
 import shutil
-import yt_dlp
-from yt_dlp.utils import DownloadError, ExtractorError
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from django.conf import settings
+from django.db import connection
+from yt_dlp.utils import DownloadError, ExtractorError, PagedList
+
+from .download_archive import entry_archive_id, entry_archive_ids
+from .format_stream import STREAM_BUFFER_SIZE, FormatStream, is_streamable
+from .transcoding import TranscodeError, TranscodingStage
+from .youtubedl_pool import borrow_youtubedl
+from .extraction_cache import (
+    FLAT_INFO,
+    FULL_INFO,
+    get_cached_info,
+    invalidate_cached_info,
+    store_cached_info,
+)
 
 # Set up Django logger
 logger = logging.getLogger("downloader")
 
+# Digits of the index prefix of lazily resolved playlist entries
+LAZY_PREFIX_WIDTH = 5
+# URL results followed to the playlist, e.g. from a channel to its videos tab
+MAX_URL_RESULTS = 5
+
+
+def with_progress_hook(ydl_opts, progress_hook):
+    """Reports download and postprocessing progress to progress_hook, if given."""
+    if progress_hook:
+        ydl_opts["progress_hooks"] = [progress_hook]
+        ydl_opts["postprocessor_hooks"] = [progress_hook]
+    return ydl_opts
+
+
+def with_ydl_overrides(ydl_opts, ydl_overrides):
+    """Applies the options of a download profile, if given, over ydl_opts."""
+    if ydl_overrides:
+        ydl_opts.update(ydl_overrides)
+    return ydl_opts
+
+
+def with_download_archive(ydl_opts, download_archive):
+    """Makes yt-dlp skip entries found in download_archive, if given."""
+    if download_archive is not None:
+        ydl_opts["download_archive"] = download_archive
+    return ydl_opts
+
 
-def download_single_video_highest_quality(urls):
+def in_download_archive(ydl, info_dict, download_archive):
+    """Tells whether yt-dlp skipped info_dict because it is in download_archive."""
+    return download_archive is not None and ydl.in_download_archive(info_dict)
+
+
+def extract_info_cached(ydl, urls, download=True):
+    """
+    Same as ydl.extract_info, but reuses metadata extracted earlier for the
+    same URL. When a download fails with cached metadata, e.g. because the
+    format URLs expired, the metadata is extracted again.
+    """
+    info_dict = get_cached_info(urls, FULL_INFO)
+    if info_dict is not None:
+        try:
+            return ydl.process_ie_result(info_dict, download=download)
+        except DownloadError:
+            logger.info(f"Cached metadata failed for {urls}, extracting again")
+            invalidate_cached_info(urls, FULL_INFO)
+
+    info_dict = ydl.extract_info(urls, download=False)
+    if info_dict:
+        store_cached_info(
+            urls, FULL_INFO, ydl.sanitize_info(info_dict, remove_private_keys=True)
+        )
+        if download:
+            info_dict = ydl.process_ie_result(info_dict, download=True)
+    return info_dict
+
+
+def hand_over_files(file_paths, on_file_ready, archive_id=None):
+    """
+    Passes finished files to on_file_ready, if given, e.g. to save them right
+    away, together with the download archive id of the entry they belong to.
+    """
+    if on_file_ready:
+        for file_path in file_paths:
+            on_file_ready(file_path, archive_id)
+
+
+def extract_and_download(ydl, urls, stream_file=None):
+    """
+    Same as extract_info_cached, but when stream_file is given and the
+    selected format can be read as a stream, see is_streamable, the stream
+    is passed to stream_file together with the file name and the download
+    archive id instead of being downloaded. When stream_file returns False,
+    the format is downloaded after all.
+    Returns the info dict and whether it was streamed.
+    """
+    if stream_file is None:
+        return extract_info_cached(ydl, urls), False
+
+    info_dict = extract_info_cached(ydl, urls, download=False)
+    if not info_dict or ydl.in_download_archive(info_dict):
+        return info_dict, False
+    if is_streamable(ydl, info_dict):
+        file_name = os.path.basename(ydl.prepare_filename(info_dict))
+        # Buffered, so reads return whole parts rather than what one response had
+        with io.BufferedReader(
+            FormatStream(ydl, info_dict), STREAM_BUFFER_SIZE
+        ) as stream:
+            if stream_file(stream, file_name, entry_archive_id(info_dict)):
+                logger.info(f"Streamed {file_name} without staging it")
+                return info_dict, True
+    return extract_info_cached(ydl, urls), False
+
+
+def download_single_video_highest_quality(
+    urls,
+    progress_hook=None,
+    filename_prefix="",
+    on_file_ready=None,
+    download_archive=None,
+    ydl_overrides=None,
+    adaptive_tuner=None,
+    staging_dir=None,
+    stream_file=None,
+):
     """
     Downloads a single video at the highest available quality.
+    Files are downloaded to a new directory inside staging_dir, if given,
+    or passed to stream_file, see extract_and_download.
     Returns a dictionary with success status and list of file paths.
     """
     logger.info("Downloading single video with highest quality. URL: %s", urls)
-    temp_dir = tempfile.mkdtemp()
+    temp_dir = tempfile.mkdtemp(dir=staging_dir)
     ydl_opts = {
-        "outtmpl": os.path.join(temp_dir, "%(title)s.%(ext)s"),
+        "outtmpl": os.path.join(temp_dir, f"{filename_prefix}%(title)s.%(ext)s"),
         "format": "bestvideo+bestaudio/best",
         "noplaylist": True,
         "quiet": True,
@@ -29,12 +148,24 @@ def download_single_video_highest_quality(urls):
 
     file_paths = []
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info_dict = ydl.extract_info(urls, download=True)
+        ydl_opts = with_ydl_overrides(ydl_opts, ydl_overrides)
+        ydl_opts = with_download_archive(ydl_opts, download_archive)
+        with borrow_youtubedl(
+            with_progress_hook(ydl_opts, progress_hook), adaptive_tuner
+        ) as ydl:
+            info_dict, streamed = extract_and_download(ydl, urls, stream_file)
+            if streamed or (
+                info_dict and in_download_archive(ydl, info_dict, download_archive)
+            ):
+                if not streamed:
+                    logger.info(f"Skipping {urls}, it is already in the catalogue")
+                shutil.rmtree(temp_dir)
+                return {"success": True, "file_paths": []}
             if info_dict:
                 filename = ydl.prepare_filename(info_dict)
                 file_paths.append(filename)
                 logger.info(f"Downloaded video to {filename}")
+                hand_over_files(file_paths, on_file_ready, entry_archive_id(info_dict))
             else:
                 error_message = "Failed to retrieve video information."
                 logger.error(error_message)
@@ -53,10 +184,20 @@ def download_single_video_highest_quality(urls):
         return {"success": False, "error": error_message}
 
 
-def download_audios_from_list(urls_list):
+def download_audios_from_list(
+    urls_list,
+    progress_hook=None,
+    on_file_ready=None,
+    download_archive=None,
+    ydl_overrides=None,
+    adaptive_tuner=None,
+    staging_dir=None,
+    stream_file=None,
+):
     """
     Downloads audio files from a list of URLs, each separated by a newline.
     Uses the highest available quality for each audio.
+    Audios are converted to MP3 while the next ones download.
     Returns a dictionary with success status and list of file paths.
     """
     logger.info("Downloading audios from list.")
@@ -64,20 +205,44 @@ def download_audios_from_list(urls_list):
     # Split the list of URLs by newline and strip any extra spaces
     urlss = [urls.strip() for urls in urls_list.split("\n") if urls.strip()]
 
-    all_file_paths = []
+    transcoding_stage = TranscodingStage(on_file_ready)
+    error_message = None
     for urls in urlss:
         logger.info(f"Processing URL: {urls}")
-        result = download_single_audio_highest_quality(urls)
-        if result["success"]:
-            all_file_paths.extend(result["file_paths"])
-        else:
+        result = download_single_audio_highest_quality(
+            urls,
+            progress_hook,
+            download_archive=download_archive,
+            ydl_overrides=ydl_overrides,
+            adaptive_tuner=adaptive_tuner,
+            staging_dir=staging_dir,
+            transcoding_stage=transcoding_stage,
+        )
+        if not result["success"]:
             logger.error(f"Failed to download from URL: {urls}")
-            return {"success": False, "error": result.get("error", "Unknown error")}
+            error_message = result.get("error", "Unknown error")
+            break
 
+    try:
+        all_file_paths = transcoding_stage.wait()
+    except TranscodeError as e:
+        logger.error(str(e))
+        error_message = error_message or f"Error converting audio: {e}"
+    if error_message:
+        return {"success": False, "error": error_message}
     return {"success": True, "file_paths": all_file_paths}
 
 
-def download_videos_from_list(urls_list):
+def download_videos_from_list(
+    urls_list,
+    progress_hook=None,
+    on_file_ready=None,
+    download_archive=None,
+    ydl_overrides=None,
+    adaptive_tuner=None,
+    staging_dir=None,
+    stream_file=None,
+):
     """
     Downloads videos from a list of URLs, each separated by a newline.
     Uses the highest quality for each video.
@@ -90,7 +255,16 @@ def download_videos_from_list(urls_list):
     all_file_paths = []
     for urls in urlss:
         logger.info(f"Processing URL: {urls}")
-        result = download_single_video_highest_quality(urls)
+        result = download_single_video_highest_quality(
+            urls,
+            progress_hook,
+            on_file_ready=on_file_ready,
+            download_archive=download_archive,
+            ydl_overrides=ydl_overrides,
+            adaptive_tuner=adaptive_tuner,
+            staging_dir=staging_dir,
+            stream_file=stream_file,
+        )
         if result["success"]:
             all_file_paths.extend(result["file_paths"])
         else:
@@ -100,44 +274,139 @@ def download_videos_from_list(urls_list):
     return {"success": True, "file_paths": all_file_paths}
 
 
-def download_video_playlist_highest_quality(urls):
+def download_playlist_entries(
+    urls,
+    temp_dir,
+    ydl_opts,
+    entry_file_path,
+    on_file_ready=None,
+    download_archive=None,
+    adaptive_tuner=None,
+    stream_file=None,
+):
+    """
+    Resolves the entries of a playlist and downloads them through a bounded
+    pool of YoutubeDL instances, PLAYLIST_DOWNLOAD_CONCURRENCY at a time.
+    Files keep the playlist index prefix in their names. Entries found in
+    download_archive, if given, are skipped. adaptive_tuner, if given, tunes
+    every entry with what the entries before it measured. Entries are passed
+    to stream_file instead, if given and possible, see extract_and_download.
+    With the lazy_playlist option entries are downloaded while the playlist
+    is resolved, see iter_playlist_entries. At most PLAYLIST_ENTRY_WINDOW
+    entries are queued at once either way.
+    Returns the file paths in playlist order, raises DownloadError when the
+    playlist or any of its entries cannot be downloaded.
+    """
+    if ydl_opts.get("lazy_playlist"):
+        entries = iter_playlist_entries(urls, download_archive)
+    else:
+        resolve_result = resolve_playlist_entries(urls, download_archive)
+        if not resolve_result["success"]:
+            raise DownloadError(resolve_result["error"])
+        entries = resolve_result["entries"]
+
+    concurrency = settings.PLAYLIST_DOWNLOAD_CONCURRENCY
+    window = max(settings.PLAYLIST_ENTRY_WINDOW, concurrency, 1)
+
+    def download_entry(entry_url, prefix):
+        entry_opts = with_download_archive(
+            {
+                **ydl_opts,
+                "outtmpl": os.path.join(temp_dir, f"{prefix}%(title)s.%(ext)s"),
+                "noplaylist": True,
+            },
+            download_archive,
+        )
+        try:
+            with borrow_youtubedl(entry_opts, adaptive_tuner) as ydl:
+                info_dict, streamed = extract_and_download(ydl, entry_url, stream_file)
+                if not info_dict:
+                    raise DownloadError(
+                        "Failed to retrieve information for one or more playlist entries."
+                    )
+                if streamed or in_download_archive(ydl, info_dict, download_archive):
+                    return None
+                filename = entry_file_path(ydl, info_dict)
+                logger.info(f"Downloaded playlist entry to {filename}")
+                hand_over_files([filename], on_file_ready, entry_archive_id(info_dict))
+                return filename
+        finally:
+            # Pool threads must not keep the connections used by the cache open
+            connection.close()
+
+    file_paths = {}
+    pending = {}
+
+    def collect(futures):
+        for future in futures:
+            file_paths[pending.pop(future)] = future.result()
+
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+        try:
+            for position, (entry_url, prefix) in enumerate(entries):
+                if len(pending) >= window:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                pending[executor.submit(download_entry, entry_url, prefix)] = position
+            collect(list(pending))
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+    return [
+        file_paths[position] for position in sorted(file_paths) if file_paths[position]
+    ]
+
+
+def video_entry_file_path(ydl, info_dict):
+    return ydl.prepare_filename(info_dict)
+
+
+def audio_entry_file_path(ydl, info_dict):
+    """The downloaded file, which the transcoding stage converts to MP3."""
+    return info_dict["requested_downloads"][0]["filepath"]
+
+
+def download_video_playlist_highest_quality(
+    urls,
+    progress_hook=None,
+    on_file_ready=None,
+    download_archive=None,
+    ydl_overrides=None,
+    adaptive_tuner=None,
+    staging_dir=None,
+    stream_file=None,
+):
     """
     Downloads a playlist of videos at the highest available quality.
+    Files are downloaded to a new directory inside staging_dir, if given.
+    Entries are downloaded in parallel, see download_playlist_entries.
+    Each finished entry is passed to on_file_ready, if given.
     Returns a dictionary with success status and list of file paths.
     """
     logger.info(f"Downloading video playlist with highest quality. URL: {urls}")
 
-    temp_dir = tempfile.mkdtemp()
+    temp_dir = tempfile.mkdtemp(dir=staging_dir)
     ydl_opts = {
-        "outtmpl": os.path.join(temp_dir, "%(playlist_index)s-%(title)s.%(ext)s"),
         "format": "bestvideo+bestaudio/best",
         "quiet": True,
         "no_warnings": True,
         "continuedl": True,
     }
 
-    file_paths = []
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info_dict = ydl.extract_info(urls, download=True)
-            logger.info(f"Extracted info successfully")
-            if info_dict and "entries" in info_dict:
-                for entry in info_dict["entries"]:
-                    if entry:
-                        logger.info(f"Processing: {entry}")
-                        filename = ydl.prepare_filename(entry)
-                        file_paths.append(filename)
-                        logger.info(f"Downloaded video to {filename}")
-                    else:
-                        error_message = "Failed to retrieve information for one or more playlist entries."
-                        logger.error(error_message)
-                        shutil.rmtree(temp_dir)
-                        return {"success": False, "error": error_message}
-            else:
-                error_message = "Failed to retrieve playlist information."
-                logger.error(error_message)
-                shutil.rmtree(temp_dir)
-                return {"success": False, "error": error_message}
+        file_paths = download_playlist_entries(
+            urls,
+            temp_dir,
+            with_progress_hook(
+                with_ydl_overrides(ydl_opts, ydl_overrides), progress_hook
+            ),
+            video_entry_file_path,
+            on_file_ready,
+            download_archive,
+            adaptive_tuner,
+            stream_file,
+        )
         return {"success": True, "file_paths": file_paths}
     except (DownloadError, ExtractorError) as e:
         error_message = f"Error downloading playlist: {e}"
@@ -151,24 +420,32 @@ def download_video_playlist_highest_quality(urls):
         return {"success": False, "error": error_message}
 
 
-def download_single_audio_highest_quality(urls):
+def download_single_audio_highest_quality(
+    urls,
+    progress_hook=None,
+    filename_prefix="",
+    on_file_ready=None,
+    download_archive=None,
+    ydl_overrides=None,
+    adaptive_tuner=None,
+    staging_dir=None,
+    stream_file=None,
+    transcoding_stage=None,
+):
     """
     Downloads a single audio track at the highest available quality.
+    Files are downloaded to a new directory inside staging_dir, if given, and
+    converted to MP3, see TranscodingStage, so they are never streamed. When
+    transcoding_stage is given, the file is queued there and returned before
+    it is converted.
     Returns a dictionary with success status and list of file paths.
     """
     logger.info(f"Downloading single audio with highest quality. URL: {urls}")
 
-    temp_dir = tempfile.mkdtemp()
+    temp_dir = tempfile.mkdtemp(dir=staging_dir)
     ydl_opts = {
-        "outtmpl": os.path.join(temp_dir, "%(title)s.%(ext)s"),
+        "outtmpl": os.path.join(temp_dir, f"{filename_prefix}%(title)s.%(ext)s"),
         "format": "bestaudio/best",
-        "postprocessors": [
-            {
-                "key": "FFmpegExtractAudio",
-                "preferredcodec": "mp3",
-                "preferredquality": "0",  # This indicates the highest quality
-            }
-        ],
         "noplaylist": True,
         "quiet": True,
         "no_warnings": True,
@@ -177,8 +454,16 @@ def download_single_audio_highest_quality(urls):
 
     file_paths = []
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info_dict = ydl.extract_info(urls, download=True)
+        ydl_opts = with_ydl_overrides(ydl_opts, ydl_overrides)
+        ydl_opts = with_download_archive(ydl_opts, download_archive)
+        with borrow_youtubedl(
+            with_progress_hook(ydl_opts, progress_hook), adaptive_tuner
+        ) as ydl:
+            info_dict = extract_info_cached(ydl, urls)
+            if info_dict and in_download_archive(ydl, info_dict, download_archive):
+                logger.info(f"Skipping {urls}, it is already in the catalogue")
+                shutil.rmtree(temp_dir)
+                return {"success": True, "file_paths": []}
             if info_dict:
                 file_paths = [
                     item["filepath"] for item in info_dict["requested_downloads"]
@@ -189,8 +474,12 @@ def download_single_audio_highest_quality(urls):
                 logger.error(error_message)
                 shutil.rmtree(temp_dir)
                 return {"success": False, "error": error_message}
+        stage = transcoding_stage or TranscodingStage(on_file_ready)
+        hand_over_files(file_paths, stage.submit, entry_archive_id(info_dict))
+        if transcoding_stage is None:
+            file_paths = stage.wait()
         return {"success": True, "file_paths": file_paths}
-    except (DownloadError, ExtractorError) as e:
+    except (DownloadError, ExtractorError, TranscodeError) as e:
         error_message = f"Error downloading audio: {e}"
         logger.error(error_message)
         shutil.rmtree(temp_dir)
@@ -202,111 +491,251 @@ def download_single_audio_highest_quality(urls):
         return {"success": False, "error": error_message}
 
 
-def download_audio_playlist_highest_quality(urls):
+def download_audio_playlist_highest_quality(
+    urls,
+    progress_hook=None,
+    on_file_ready=None,
+    download_archive=None,
+    ydl_overrides=None,
+    adaptive_tuner=None,
+    staging_dir=None,
+    stream_file=None,
+):
     """
     Downloads an audio playlist at the highest available quality and converts it to MP3.
+    Files are downloaded to a new directory inside staging_dir, if given.
+    Entries are downloaded in parallel, see download_playlist_entries, and
+    converted while the next ones download, see TranscodingStage.
+    Each converted entry is passed to on_file_ready, if given.
     Returns a dictionary with success status and list of file paths.
     """
     logger.info(f"Downloading audio playlist with highest quality. URL: {urls}")
 
-    temp_dir = tempfile.mkdtemp()
+    temp_dir = tempfile.mkdtemp(dir=staging_dir)
     ydl_opts = {
-        "outtmpl": os.path.join(temp_dir, "%(playlist_index)s-%(title)s.%(ext)s"),
         "format": "bestaudio/best",
-        "postprocessors": [
-            {
-                "key": "FFmpegExtractAudio",
-                "preferredcodec": "mp3",
-                "preferredquality": "0",  # This indicates the highest quality
-            }
-        ],
         "quiet": True,
         "no_warnings": True,
         "continuedl": True,
     }
 
-    file_paths = []
+    transcoding_stage = TranscodingStage(on_file_ready)
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info_dict = ydl.extract_info(urls, download=True)
-            if info_dict and "entries" in info_dict:
-                for entry in info_dict["entries"]:
-                    if entry:
-                        filename = ydl.prepare_filename(entry)
-                        mp3_filename = re.sub(r"\.[^.]+$", ".mp3", filename)
-                        file_paths.append(mp3_filename)
-                        logger.info(f"Downloaded audio to {mp3_filename}")
-                    else:
-                        error_message = "Failed to retrieve information for one or more playlist entries."
-                        logger.error(error_message)
-                        shutil.rmtree(temp_dir)
-                        return {"success": False, "error": error_message}
-            else:
-                error_message = "Failed to retrieve playlist information."
-                logger.error(error_message)
-                shutil.rmtree(temp_dir)
-                return {"success": False, "error": error_message}
+        download_playlist_entries(
+            urls,
+            temp_dir,
+            with_progress_hook(
+                with_ydl_overrides(ydl_opts, ydl_overrides), progress_hook
+            ),
+            audio_entry_file_path,
+            transcoding_stage.submit,
+            download_archive,
+            adaptive_tuner,
+        )
+        file_paths = transcoding_stage.wait()
         return {"success": True, "file_paths": file_paths}
-    except (DownloadError, ExtractorError) as e:
+    except (DownloadError, ExtractorError, TranscodeError) as e:
         error_message = f"Error downloading playlist: {e}"
         logger.error(error_message)
+        transcoding_stage.close()
         shutil.rmtree(temp_dir)
         return {"success": False, "error": error_message}
     except Exception as e:
         error_message = f"Unexpected error: {e}"
         logger.error(error_message)
+        transcoding_stage.close()
         shutil.rmtree(temp_dir)
         return {"success": False, "error": error_message}
 
 
-class MediaDownloadStrategies(enum.Enum):
-    AUDIO_HIGHEST = (
-        "audio_highest",
-        "Downloads single audios using ytdlp with highest available quality.",
-        download_single_audio_highest_quality,
-    )
-    AUDIO_PLAYLIST_HIGHEST = (
-        "audio_playlist_highest",
-        "Downloads audio playlist using ytdlp with highest available quality.",
-        download_audio_playlist_highest_quality,
-    )
-    VIDEO_HIGHEST = (
-        "video_highest",
-        "Downloads single videos using ytdlp with highest available quality.",
-        download_single_video_highest_quality,
-    )
-    VIDEO_PLAYLIST_HIGHEST = (
-        "video_playlist_highest",
-        "Downloads videos playlist using ytdlp with highest available quality.",
-        download_video_playlist_highest_quality,
-    )
-    VIDEO_LIST_HIGHEST = (
-        "video_list_highest",
-        "Downloads videos from a list of URLs separated by newlines using ytdlp at the highest available quality.",
-        download_videos_from_list,
-    )
-    AUDIO_LIST_HIGHEST = (
-        "audio_list_highest",
-        "Downloads audios from a list of URLs separated by newlines using ytdlp at the highest available quality.",
-        download_audios_from_list,
+def split_url_list(urls_list, download_archive=None):
+    """
+    Splits a newline separated list of URLs into fan-out entries.
+    Entries are only checked against download_archive once they are downloaded.
+    Returns a dictionary with success status and a list of (url, filename prefix) pairs.
+    """
+    urlss = [urls.strip() for urls in urls_list.split("\n") if urls.strip()]
+    return {"success": True, "entries": [(urls, "") for urls in urlss]}
+
+
+def extract_playlist_lazily(ydl, urls):
+    """
+    Same as ydl.extract_info, but without processing the result, so the
+    entries of a playlist stay the generator the extractor returned.
+    Follows URL results, e.g. from a channel to its videos tab.
+    """
+    info_dict = ydl.extract_info(urls, download=False, process=False)
+    for _ in range(MAX_URL_RESULTS):
+        if not info_dict or info_dict.get("_type") not in ("url", "url_transparent"):
+            break
+        info_dict = ydl.extract_info(
+            info_dict["url"],
+            download=False,
+            ie_key=info_dict.get("ie_key"),
+            process=False,
+        )
+    return info_dict
+
+
+def iter_raw_entries(entries):
+    """
+    Iterates the entries of an unprocessed playlist as the extractor returns
+    them. Paged playlists are read PLAYLIST_ENTRY_WINDOW entries at a time.
+    """
+    if not isinstance(entries, PagedList):
+        yield from entries
+        return
+    start = 0
+    while True:
+        page = entries.getslice(start, start + settings.PLAYLIST_ENTRY_WINDOW)
+        if not page:
+            return
+        yield from page
+        start += len(page)
+
+
+def iter_entry_windows(entries):
+    """
+    Groups the non-empty entries of an unprocessed playlist into lists of
+    up to PLAYLIST_ENTRY_WINDOW (playlist index, entry) pairs.
+    """
+    window = []
+    index = 0
+    for entry in iter_raw_entries(entries):
+        if not entry:
+            continue
+        index += 1
+        window.append((index, entry))
+        if len(window) >= settings.PLAYLIST_ENTRY_WINDOW:
+            yield window
+            window = []
+    if window:
+        yield window
+
+
+def flat_entry(ydl, entry):
+    """
+    Returns entry as extract_flat would have. Entries extracted together
+    with the playlist, e.g. media embedded in a page, only get the URL of
+    their format once processed.
+    """
+    if entry.get("url") or entry.get("webpage_url"):
+        return entry
+    return ydl.process_ie_result(entry, download=False)
+
+
+def new_playlist_entries(numbered_entries, width, download_archive=None):
+    """
+    Returns (url, filename prefix) pairs of (playlist index, entry) pairs,
+    leaving out entries found in download_archive, if given.
+    """
+    archived_ids = set()
+    if download_archive is not None:
+        archived_ids = download_archive.archived_ids(
+            [
+                archive_id
+                for _, entry in numbered_entries
+                for archive_id in entry_archive_ids(entry)
+            ]
+        )
+    return [
+        (entry.get("url") or entry.get("webpage_url"), f"{index:0{width}d}-")
+        for index, entry in numbered_entries
+        if archived_ids.isdisjoint(entry_archive_ids(entry))
+    ]
+
+
+def iter_playlist_entries(urls, download_archive=None):
+    """
+    Resolves the entries of a playlist lazily and yields (url, filename
+    prefix) pairs like resolve_playlist_entries, as soon as the extractor
+    returns them. Only PLAYLIST_ENTRY_WINDOW entries are held at once and
+    checked against download_archive, if given, together, so a channel with
+    thousands of videos starts downloading after its first page. Playlists
+    resolved this way are not cached. Raises DownloadError.
+    """
+    logger.info(f"Resolving playlist entries lazily. URL: {urls}")
+
+    ydl_opts = {
+        "extract_flat": "in_playlist",
+        "quiet": True,
+        "no_warnings": True,
+    }
+
+    started = time.monotonic()
+    entry_count = 0
+    new_entry_count = 0
+    try:
+        with borrow_youtubedl(ydl_opts) as ydl:
+            info_dict = get_cached_info(urls, FLAT_INFO) or extract_playlist_lazily(
+                ydl, urls
+            )
+            if not info_dict or "entries" not in info_dict:
+                raise DownloadError("Failed to retrieve playlist information.")
+
+            # The number of entries is unknown until all pages are read
+            width = len(str(info_dict.get("playlist_count") or "")) or LAZY_PREFIX_WIDTH
+            for window in iter_entry_windows(info_dict["entries"]):
+                entry_count += len(window)
+                window = [(index, flat_entry(ydl, entry)) for index, entry in window]
+                for new_entry in new_playlist_entries(window, width, download_archive):
+                    if new_entry_count == 0:
+                        logger.info(
+                            f"First new playlist entry resolved after "
+                            f"{time.monotonic() - started:.1f}s"
+                        )
+                    new_entry_count += 1
+                    yield new_entry
+    except ExtractorError as e:
+        raise DownloadError(f"Error resolving playlist: {e}")
+
+    logger.info(
+        f"{new_entry_count} of {entry_count} playlist entries are new, "
+        f"resolved in {time.monotonic() - started:.1f}s"
     )
 
-    def __new__(cls, value, description, strategy_function):
-        obj = object.__new__(cls)
-        obj._value_ = value
-        obj.description = description
-        obj.strategy_function = strategy_function
-        return obj
-
-    @classmethod
-    def choices(cls):
-        """Get a list of available strategies and their descriptions."""
-        return [(key.value, key.description) for key in cls]
-
-    @classmethod
-    def get_strategy_function(cls, value):
-        """Retrieve the appropriate download strategy function."""
-        for item in cls:
-            if item.value == value:
-                return item.strategy_function
-        raise ValueError(f"No strategy function found for value: {value}")
+
+def resolve_playlist_entries(urls, download_archive=None):
+    """
+    Resolves the entry URLs of a playlist without downloading anything.
+    Entries found in download_archive, if given, are left out.
+    Returns a dictionary with success status and a list of (url, filename prefix)
+    pairs, prefixed with the playlist index like the playlist strategies do.
+    """
+    logger.info(f"Resolving playlist entries. URL: {urls}")
+
+    ydl_opts = {
+        "extract_flat": "in_playlist",
+        "quiet": True,
+        "no_warnings": True,
+    }
+
+    try:
+        info_dict = get_cached_info(urls, FLAT_INFO)
+        if info_dict is None:
+            with borrow_youtubedl(ydl_opts) as ydl:
+                info_dict = ydl.extract_info(urls, download=False)
+                if info_dict and "entries" in info_dict:
+                    # Private keys include the entries, which are the point here
+                    store_cached_info(urls, FLAT_INFO, ydl.sanitize_info(info_dict))
+    except (DownloadError, ExtractorError) as e:
+        error_message = f"Error resolving playlist: {e}"
+        logger.error(error_message)
+        return {"success": False, "error": error_message}
+    except Exception as e:
+        error_message = f"Unexpected error: {e}"
+        logger.error(error_message)
+        return {"success": False, "error": error_message}
+
+    if not info_dict or "entries" not in info_dict:
+        error_message = "Failed to retrieve playlist information."
+        logger.error(error_message)
+        return {"success": False, "error": error_message}
+
+    entries = [entry for entry in info_dict["entries"] if entry]
+    new_entries = new_playlist_entries(
+        list(enumerate(entries, start=1)), len(str(len(entries))), download_archive
+    )
+    if download_archive is not None:
+        logger.info(f"{len(new_entries)} of {len(entries)} playlist entries are new")
+    return {"success": True, "entries": new_entries}
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from django.apps import apps
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import F, Sum
+from django.utils import timezone
+
+logger = logging.getLogger("downloader")
+
+FULL_INFO = "full"
+FLAT_INFO = "flat"
+
+# Hits and misses of this process not written to ExtractionCacheCounter yet
+_lookup_counts = Counter()
+_lookup_counts_lock = threading.Lock()
+_lookup_counts_flushed_at = time.monotonic()
+
+
+def normalize_url(url):
+    """Lowercases scheme and host, drops the fragment and sorts query parameters."""
+    parts = urlsplit(url.strip())
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit(
+        (parts.scheme.lower(), parts.netloc.lower(), parts.path, query, "")
+    )
+
+
+def cache_key(url, kind):
+    return hashlib.sha256(f"{kind}:{normalize_url(url)}".encode()).hexdigest()
+
+
+def count_lookup(counter_name):
+    """
+    Counts a lookup in memory, the counters are written at most once per
+    EXTRACTION_CACHE_COUNTER_FLUSH_SECONDS rather than on every lookup.
+    """
+    with _lookup_counts_lock:
+        _lookup_counts[counter_name] += 1
+        due = (
+            time.monotonic() - _lookup_counts_flushed_at
+            >= settings.EXTRACTION_CACHE_COUNTER_FLUSH_SECONDS
+        )
+    if due:
+        flush_lookup_counts()
+
+
+def flush_lookup_counts():
+    """Adds the lookups counted in memory by this process to the stored counters."""
+    global _lookup_counts_flushed_at
+    ExtractionCacheCounter = apps.get_model("downloader", "ExtractionCacheCounter")
+
+    with _lookup_counts_lock:
+        counts = dict(_lookup_counts)
+        _lookup_counts.clear()
+        _lookup_counts_flushed_at = time.monotonic()
+
+    for counter_name, value in counts.items():
+        counter = ExtractionCacheCounter.objects.filter(name=counter_name)
+        if not counter.update(value=F("value") + value):
+            try:
+                ExtractionCacheCounter.objects.create(name=counter_name, value=value)
+            except IntegrityError:
+                counter.update(value=F("value") + value)
+
+
+def get_cached_info(url, kind):
+    """Returns the cached info dict for the URL, or None on a miss."""
+    ExtractionCacheEntry = apps.get_model("downloader", "ExtractionCacheEntry")
+
+    now = timezone.now()
+    entry = ExtractionCacheEntry.objects.filter(
+        key=cache_key(url, kind), expires_at__gt=now
+    ).first()
+    if entry is None:
+        count_lookup("miss")
+        return None
+
+    ExtractionCacheEntry.objects.filter(id=entry.id).update(
+        hit_count=F("hit_count") + 1, last_used_at=now
+    )
+    count_lookup("hit")
+    logger.info(f"Extraction cache hit for {url}")
+    return entry.info
+
+
+def store_cached_info(url, kind, info):
+    """
+    Caches a JSON serializable info dict for the URL. Old entries are evicted
+    by evict_extraction_cache() from a periodic task.
+    """
+    ExtractionCacheEntry = apps.get_model("downloader", "ExtractionCacheEntry")
+
+    ttl = (
+        settings.EXTRACTION_CACHE_FLAT_TTL_SECONDS
+        if kind == FLAT_INFO
+        else settings.EXTRACTION_CACHE_TTL_SECONDS
+    )
+    now = timezone.now()
+    key = cache_key(url, kind)
+    values = {
+        "url": url,
+        "kind": kind,
+        "extractor": info.get("extractor_key") or info.get("ie_key") or "",
+        "video_id": str(info.get("id") or ""),
+        "info": info,
+        "size_bytes": len(json.dumps(info)),
+        "created_at": now,
+        "last_used_at": now,
+        "expires_at": now + timedelta(seconds=ttl),
+    }
+    # Single statements rather than update_or_create, whose read then write
+    # transaction SQLite fails right away when playlist threads store at once
+    if not ExtractionCacheEntry.objects.filter(key=key).update(**values):
+        try:
+            ExtractionCacheEntry.objects.create(key=key, **values)
+        except IntegrityError:
+            ExtractionCacheEntry.objects.filter(key=key).update(**values)
+
+
+def invalidate_cached_info(url, kind):
+    ExtractionCacheEntry = apps.get_model("downloader", "ExtractionCacheEntry")
+    ExtractionCacheEntry.objects.filter(key=cache_key(url, kind)).delete()
+
+
+def evict_extraction_cache():
+    """
+    Deletes expired entries, then the least recently used ones until the
+    cache fits in EXTRACTION_CACHE_MAX_BYTES.
+    """
+    ExtractionCacheEntry = apps.get_model("downloader", "ExtractionCacheEntry")
+
+    ExtractionCacheEntry.objects.filter(expires_at__lte=timezone.now()).delete()
+
+    total_size = (
+        ExtractionCacheEntry.objects.aggregate(Sum("size_bytes"))["size_bytes__sum"]
+        or 0
+    )
+    if total_size <= settings.EXTRACTION_CACHE_MAX_BYTES:
+        return
+
+    evicted_ids = []
+    for entry_id, size_bytes in ExtractionCacheEntry.objects.order_by(
+        "last_used_at"
+    ).values_list("id", "size_bytes"):
+        if total_size <= settings.EXTRACTION_CACHE_MAX_BYTES:
+            break
+        evicted_ids.append(entry_id)
+        total_size -= size_bytes
+    ExtractionCacheEntry.objects.filter(id__in=evicted_ids).delete()
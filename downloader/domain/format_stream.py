@@ -0,0 +1,120 @@
+import io
+import logging
+import re
+
+from yt_dlp.networking import Request
+from yt_dlp.networking.exceptions import HTTPError, TransportError
+
+logger = logging.getLogger("downloader")
+
+STREAMABLE_PROTOCOLS = ("http", "https")
+CONTENT_RANGE_TOTAL = re.compile(r"/(\d+)$")
+STREAM_BUFFER_SIZE = 1024 * 1024
+
+
+def is_streamable(ydl, info_dict):
+    """
+    Tells whether the format selected in info_dict is a single file yt-dlp
+    would save unchanged, so it can be read once from start to end.
+    """
+    return bool(
+        info_dict.get("url")
+        and info_dict.get("protocol") in STREAMABLE_PROTOCOLS
+        and not info_dict.get("requested_formats")
+        and not info_dict.get("is_live")
+        # yt-dlp fixes up the container of DASH formats after the download
+        and not (info_dict.get("container") or "").endswith("_dash")
+        and not ydl.params.get("postprocessors")
+        # Enforced by the yt-dlp downloaders only
+        and not ydl.params.get("ratelimit")
+        and not ydl.params.get("max_filesize")
+    )
+
+
+class FormatStream(io.RawIOBase):
+    """
+    Reads the format selected in info_dict through the network stack of a
+    YoutubeDL instance, with its cookies, headers and proxy. Like yt-dlp, it
+    requests ranges of http_chunk_size when set, so sources throttling long
+    responses stay fast, and reconnects where it stopped on network errors.
+    """
+
+    def __init__(self, ydl, info_dict):
+        super().__init__()
+        self.ydl = ydl
+        self.url = info_dict["url"]
+        self.headers = info_dict.get("http_headers") or {}
+        self.chunk_size = ydl.params.get("http_chunk_size") or 0
+        self.retries = ydl.params.get("retries", 10)
+        self.position = 0
+        self.total_size = info_dict.get("filesize")
+        self.response = None
+        self.range_end = None
+        self.finished = False
+
+    def readable(self):
+        return True
+
+    def _open(self):
+        headers = dict(self.headers)
+        self.range_end = None
+        if self.chunk_size:
+            self.range_end = self.position + self.chunk_size - 1
+            headers["Range"] = f"bytes={self.position}-{self.range_end}"
+        elif self.position:
+            headers["Range"] = f"bytes={self.position}-"
+
+        response = self.ydl.urlopen(Request(self.url, headers=headers))
+        if response.status == 200:
+            # The server ignored the range and sends the whole file
+            if self.position:
+                response.close()
+                raise TransportError(msg="Server does not support ranges")
+            self.range_end = None
+        total = CONTENT_RANGE_TOTAL.search(response.headers.get("Content-Range", ""))
+        if total:
+            self.total_size = int(total.group(1))
+        self.response = response
+
+    def _close_response(self):
+        if self.response is not None:
+            self.response.close()
+            self.response = None
+
+    def readinto(self, buffer):
+        retries = 0
+        while not self.finished:
+            try:
+                if self.response is None:
+                    self._open()
+                data = self.response.read(len(buffer))
+            except (TransportError, HTTPError, OSError) as e:
+                self._close_response()
+                if isinstance(e, HTTPError) and e.status == 416:
+                    # Range starts at the end of a file of unknown size
+                    self.finished = True
+                    break
+                if isinstance(e, HTTPError) and e.status < 500 and e.status != 429:
+                    raise
+                retries += 1
+                if retries > self.retries:
+                    raise
+                logger.info(f"Reconnecting to {self.url} at byte {self.position}: {e}")
+                continue
+
+            if data:
+                buffer[: len(data)] = data
+                self.position += len(data)
+                return len(data)
+
+            self._close_response()
+            self.finished = (
+                self.range_end is None
+                or self.position <= self.range_end
+                or (self.total_size is not None and self.position >= self.total_size)
+            )
+        return 0
+
+    def close(self):
+        self._close_response()
+        super().close()
@@ -0,0 +1,226 @@
+import hashlib
+import logging
+import threading
+
+from django.apps import apps
+from django.db import IntegrityError
+
+from .strategy_registry import MediaSaveStrategies
+
+logger = logging.getLogger("downloader")
+
+HASH_ALGORITHM = "sha256"
+
+
+def hash_file(file_path):
+    """Returns the hex digest of the content of file_path."""
+    with open(file_path, "rb") as file:
+        return hashlib.file_digest(file, HASH_ALGORITHM).hexdigest()
+
+
+class MediaIndex:
+    """
+    The media saved with one save strategy, as one variant, e.g. the audio
+    of entries. Files of other variants are only reused by their content.
+    """
+
+    def __init__(self, save_strategy, variant=""):
+        self.save_strategy = save_strategy
+        self.variant = variant
+
+    def _stored(self):
+        StoredMedia = apps.get_model("downloader", "StoredMedia")
+        return StoredMedia.objects.filter(save_strategy=self.save_strategy)
+
+    def record(
+        self, catalogue_name, file_name, content_hash, size_bytes, archive_id=None
+    ):
+        """Records a file saved to catalogue_name, replacing what it overwrote."""
+        StoredMedia = apps.get_model("downloader", "StoredMedia")
+        stored = StoredMedia.objects.filter(
+            save_strategy=self.save_strategy,
+            catalogue_name=catalogue_name,
+            file_name=file_name,
+        )
+        values = {
+            "content_hash": content_hash,
+            "size_bytes": size_bytes,
+            "archive_id": archive_id or "",
+            "variant": self.variant,
+        }
+        # Single statements rather than update_or_create, whose read then write
+        # transaction SQLite fails right away when saving threads record at once
+        if not stored.update(**values):
+            try:
+                StoredMedia.objects.create(
+                    save_strategy=self.save_strategy,
+                    catalogue_name=catalogue_name,
+                    file_name=file_name,
+                    **values,
+                )
+            except IntegrityError:
+                stored.update(**values)
+
+    def _reference(self, candidates, catalogue_name, file_name=None, archive_id=None):
+        """
+        Places the first of candidates still in storage into catalogue_name,
+        as file_name or under its own name. Candidates gone from storage are
+        dropped from the index. Returns the candidate placed, or None.
+        """
+        reference_func = MediaSaveStrategies.get_reference_strategy_function(
+            self.save_strategy
+        )
+        if reference_func is None:
+            return None
+
+        for stored in candidates:
+            target_name = file_name or stored.file_name
+            result = reference_func(
+                stored.catalogue_name, stored.file_name, catalogue_name, target_name
+            )
+            if result.get("success"):
+                if (stored.catalogue_name, stored.file_name) != (
+                    catalogue_name,
+                    target_name,
+                ):
+                    self.record(
+                        catalogue_name,
+                        target_name,
+                        stored.content_hash,
+                        stored.size_bytes,
+                        archive_id or stored.archive_id,
+                    )
+                return stored
+            if result.get("missing"):
+                logger.info(f"{stored} is gone, dropping it from the media index")
+                stored.delete()
+        return None
+
+    def _entry_candidates(self, archive_ids):
+        """Returns the media of this variant stored under archive_ids, newest first."""
+        archive_ids = [archive_id for archive_id in archive_ids if archive_id]
+        candidates = {}
+        for start in range(0, len(archive_ids), 500):
+            for stored in (
+                self._stored()
+                .filter(
+                    variant=self.variant,
+                    archive_id__in=archive_ids[start : start + 500],
+                )
+                .order_by("-created_at")
+            ):
+                candidates.setdefault(stored.archive_id, []).append(stored)
+        return candidates
+
+    def stored_entries(self, archive_ids):
+        """
+        Returns the archive ids of the entries of this variant stored under
+        any of archive_ids and still in storage, without changing anything.
+        """
+        exists_func = MediaSaveStrategies.get_exists_strategy_function(
+            self.save_strategy
+        )
+        reference_func = MediaSaveStrategies.get_reference_strategy_function(
+            self.save_strategy
+        )
+        if exists_func is None or reference_func is None:
+            return set()
+
+        stored_ids = set()
+        for archive_id, stored_media in self._entry_candidates(archive_ids).items():
+            for stored in stored_media:
+                if exists_func(stored.catalogue_name, stored.file_name).get("exists"):
+                    stored_ids.add(archive_id)
+                    break
+                logger.debug(f"{stored} is not in storage")
+        return stored_ids
+
+    def reuse_entries(self, archive_ids, catalogue_name):
+        """
+        Places the entries of this variant stored under any of archive_ids
+        into catalogue_name. Returns the media placed by archive id.
+        """
+        reused = {}
+        for archive_id, stored_media in self._entry_candidates(archive_ids).items():
+            stored = self._reference(stored_media, catalogue_name)
+            if stored is not None:
+                logger.info(f"Reused {archive_id} from storage instead of downloading")
+                reused[archive_id] = stored
+        return reused
+
+    def reuse_content(
+        self, content_hash, size_bytes, catalogue_name, file_name, archive_id=None
+    ):
+        """
+        Places a file with the same content, stored already, into
+        catalogue_name as file_name. Returns whether one was found.
+        """
+        candidates = (
+            self._stored()
+            .filter(content_hash=content_hash, size_bytes=size_bytes)
+            .order_by("-created_at")
+        )
+        return (
+            self._reference(candidates, catalogue_name, file_name, archive_id)
+            is not None
+        )
+
+
+class DedupArchive:
+    """
+    Download archive of a catalogue, passed to yt-dlp like DownloadArchive,
+    which also counts entries stored anywhere as present. Looking entries up
+    changes nothing, place_stored_entries() places the entries skipped this
+    way into the catalogue. Entries only recorded in the archive of the
+    catalogue count when incremental is set.
+    """
+
+    def __init__(self, media_index, download_archive, incremental=False):
+        self.media_index = media_index
+        self.download_archive = download_archive
+        self.incremental = incremental
+        # Skipped as stored, yt-dlp and the strategies ask from several threads
+        self._stored_ids = set()
+        self._lock = threading.Lock()
+
+    def __bool__(self):
+        # yt-dlp skips the archive lookup for empty archives
+        return True
+
+    def __contains__(self, archive_id):
+        return bool(self.archived_ids([archive_id]))
+
+    def add(self, archive_id):
+        pass
+
+    def archived_ids(self, archive_ids):
+        """Returns the given archive ids that are in the catalogue or stored."""
+        archive_ids = [archive_id for archive_id in archive_ids if archive_id]
+        with self._lock:
+            archived = self._stored_ids.intersection(archive_ids)
+        if self.incremental:
+            archived |= self.download_archive.archived_ids(archive_ids)
+
+        stored_ids = self.media_index.stored_entries(
+            [archive_id for archive_id in archive_ids if archive_id not in archived]
+        )
+        with self._lock:
+            self._stored_ids |= stored_ids
+        return archived | stored_ids
+
+    def place_stored_entries(self):
+        """
+        Places the entries skipped as stored into the catalogue and records
+        them in its archive. Returns the media placed by archive id, and the
+        archive ids of the entries gone from storage since they were skipped.
+        """
+        with self._lock:
+            stored_ids = sorted(self._stored_ids)
+        placed = self.media_index.reuse_entries(
+            stored_ids, self.download_archive.catalogue_name
+        )
+        for archive_id in placed:
+            self.download_archive.record(archive_id)
+        return placed, [
+            archive_id for archive_id in stored_ids if archive_id not in placed
+        ]
@@ -0,0 +1,231 @@
+import hashlib
+import logging
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+from botocore.exceptions import ClientError
+from django.apps import apps
+from django.conf import settings
+from django.utils import timezone
+
+from .s3_clients import MiB, get_s3_client, s3_client_options
+
+logger = logging.getLogger("downloader")
+
+# S3 limits of a multipart upload
+MIN_PART_SIZE = 5 * MiB
+MAX_PARTS = 10000
+# Bytes hashed from the start and the end of a file for its fingerprint
+FINGERPRINT_SAMPLE_BYTES = 1 * MiB
+
+
+def file_fingerprint(filepath, file_size):
+    """
+    Identifies a file by its size and the data at its start and end, so a
+    file downloaded again to another path matches its earlier upload.
+    """
+    digest = hashlib.sha256(str(file_size).encode())
+    with open(filepath, "rb") as file:
+        digest.update(file.read(FINGERPRINT_SAMPLE_BYTES))
+        file.seek(max(file_size - FINGERPRINT_SAMPLE_BYTES, 0))
+        digest.update(file.read(FINGERPRINT_SAMPLE_BYTES))
+    return digest.hexdigest()
+
+
+def choose_part_size(file_size):
+    """S3_MULTIPART_CHUNKSIZE, raised in MiB steps when the file needs too many parts."""
+    part_size = max(settings.S3_MULTIPART_CHUNKSIZE, MIN_PART_SIZE)
+    return max(part_size, math.ceil(file_size / MAX_PARTS / MiB) * MiB)
+
+
+def listed_parts(s3_client, upload):
+    """Returns {part number: ETag} of the parts S3 holds for upload."""
+    parts = {}
+    paginator = s3_client.get_paginator("list_parts")
+    for page in paginator.paginate(
+        Bucket=upload.bucket, Key=upload.key, UploadId=upload.upload_id
+    ):
+        for part in page.get("Parts", []):
+            parts[part["PartNumber"]] = part["ETag"]
+    return parts
+
+
+def resume_or_create_upload(s3_client, bucket_name, key, fingerprint, file_size):
+    """
+    Returns the recorded upload of the file with the ETags of its parts
+    still held by S3, or a new upload without parts.
+    """
+    MultipartUpload = apps.get_model("downloader", "MultipartUpload")
+    upload = (
+        MultipartUpload.objects.filter(
+            endpoint_url=s3_client.meta.endpoint_url,
+            bucket=bucket_name,
+            key=key,
+            fingerprint=fingerprint,
+            file_size=file_size,
+        )
+        .order_by("-updated_at")
+        .first()
+    )
+    if upload is not None:
+        try:
+            listed = listed_parts(s3_client, upload)
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "NoSuchUpload":
+                raise
+            logger.info(f"Upload of {key} to {bucket_name} was aborted, starting over")
+            upload.delete()
+        else:
+            kept = {
+                part_number: etag
+                for part_number, etag in upload.parts.values_list("part_number", "etag")
+                if listed.get(part_number) == etag
+            }
+            logger.info(
+                f"Resuming upload of {key} to {bucket_name} with {len(kept)} parts"
+            )
+            return upload, kept
+
+    response = s3_client.create_multipart_upload(Bucket=bucket_name, Key=key)
+    upload = MultipartUpload.objects.create(
+        endpoint_url=s3_client.meta.endpoint_url,
+        bucket=bucket_name,
+        key=key,
+        upload_id=response["UploadId"],
+        fingerprint=fingerprint,
+        file_size=file_size,
+        part_size=choose_part_size(file_size),
+    )
+    return upload, {}
+
+
+def upload_part(s3_client, upload, filepath, part_number, kept_etag, progress_hook):
+    """
+    Uploads a part of filepath unless kept_etag matches its data.
+    Returns the ETag of the part and whether it was uploaded.
+    """
+    with open(filepath, "rb") as file:
+        file.seek((part_number - 1) * upload.part_size)
+        data = file.read(upload.part_size)
+    etag = f'"{hashlib.md5(data, usedforsecurity=False).hexdigest()}"'
+    if etag == kept_etag:
+        return etag, False
+
+    response = s3_client.upload_part(
+        Bucket=upload.bucket,
+        Key=upload.key,
+        UploadId=upload.upload_id,
+        PartNumber=part_number,
+        Body=data,
+    )
+    if progress_hook:
+        progress_hook()
+    return response["ETag"], True
+
+
+def resumable_upload(s3_client, filepath, bucket_name, key, progress_hook=None):
+    """
+    Uploads filepath to key in parts, S3_MAX_CONCURRENCY at a time, continuing
+    an earlier upload of the same file. Every uploaded part is recorded from
+    the calling thread, so a later attempt can skip it.
+    """
+    MultipartUploadPart = apps.get_model("downloader", "MultipartUploadPart")
+    file_size = os.path.getsize(filepath)
+    upload, kept = resume_or_create_upload(
+        s3_client, bucket_name, key, file_fingerprint(filepath, file_size), file_size
+    )
+
+    part_count = max(math.ceil(file_size / upload.part_size), 1)
+    etags = {}
+    uploaded_parts = 0
+    with ThreadPoolExecutor(
+        max_workers=max(settings.S3_MAX_CONCURRENCY, 1)
+    ) as executor:
+        futures = {
+            executor.submit(
+                upload_part,
+                s3_client,
+                upload,
+                filepath,
+                part_number,
+                kept.get(part_number),
+                progress_hook,
+            ): part_number
+            for part_number in range(1, part_count + 1)
+        }
+        try:
+            for future in as_completed(futures):
+                part_number = futures[future]
+                etag, uploaded = future.result()
+                etags[part_number] = etag
+                if uploaded:
+                    uploaded_parts += 1
+                    # One statement, while other files of the task upload
+                    # concurrently, update_or_create fails on a locked SQLite
+                    MultipartUploadPart.objects.bulk_create(
+                        [
+                            MultipartUploadPart(
+                                upload=upload, part_number=part_number, etag=etag
+                            )
+                        ],
+                        update_conflicts=True,
+                        unique_fields=["upload", "part_number"],
+                        update_fields=["etag"],
+                    )
+                    # Keeps an upload in progress from being aborted as stale
+                    upload.save(update_fields=["updated_at"])
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+    s3_client.complete_multipart_upload(
+        Bucket=bucket_name,
+        Key=key,
+        UploadId=upload.upload_id,
+        MultipartUpload={
+            "Parts": [
+                {"PartNumber": part_number, "ETag": etags[part_number]}
+                for part_number in sorted(etags)
+            ]
+        },
+    )
+    upload.delete()
+    logger.info(
+        f"Uploaded {key} in {part_count} parts, "
+        f"{part_count - uploaded_parts} kept from an earlier attempt"
+    )
+
+
+def abort_stale_multipart_uploads():
+    """
+    Aborts the recorded uploads of the configured S3 endpoint that made no
+    progress for S3_MULTIPART_UPLOAD_DEADLINE_HOURS, so S3 drops their
+    parts. Returns the number of uploads aborted.
+    """
+    MultipartUpload = apps.get_model("downloader", "MultipartUpload")
+    deadline = timezone.now() - timedelta(
+        hours=settings.S3_MULTIPART_UPLOAD_DEADLINE_HOURS
+    )
+    stale_uploads = MultipartUpload.objects.filter(updated_at__lt=deadline)
+    if not stale_uploads.exists():
+        return 0
+
+    s3_client = get_s3_client(s3_client_options())
+    aborted = 0
+    for upload in stale_uploads.filter(endpoint_url=s3_client.meta.endpoint_url):
+        try:
+            s3_client.abort_multipart_upload(
+                Bucket=upload.bucket, Key=upload.key, UploadId=upload.upload_id
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "NoSuchUpload":
+                logger.error(f"Failed to abort upload of {upload.key}: {e}")
+                continue
+        upload.delete()
+        aborted += 1
+    if aborted:
+        logger.info(f"Aborted {aborted} stale multipart uploads")
+    return aborted
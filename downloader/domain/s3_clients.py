@@ -0,0 +1,118 @@
+import logging
+import os
+import threading
+import time
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from django.conf import settings
+
+logger = logging.getLogger("downloader")
+
+MiB = 1024 * 1024
+
+TRUE_VALUES = ["true", "1", "t", "yes", "y"]
+BUCKET_EXISTS_CODES = ["BucketAlreadyOwnedByYou", "BucketAlreadyExists"]
+
+_clients = {}
+_clients_lock = threading.Lock()
+# (endpoint url, bucket name) -> monotonic time until which it is known to exist
+_known_buckets = {}
+
+
+def s3_client_options():
+    """Reads the S3 endpoint and credentials from the environment."""
+    return {
+        "endpoint_url": os.environ.get("S3_ENDPOINT_URL"),
+        "region_name": os.environ.get("S3_REGION"),
+        "aws_access_key_id": os.environ.get("S3_ACCESS_KEY_ID"),
+        "aws_secret_access_key": os.environ.get("S3_SECRET_ACCESS_KEY"),
+        "verify": os.getenv("S3_SELF_SIGNED_CERTIFICATE", "False").lower()
+        not in TRUE_VALUES,
+    }
+
+
+def get_s3_client(client_options):
+    """
+    Returns the S3 client of the process for client_options, creating it on
+    first use. Its connection pool holds S3_MAX_POOL_CONNECTIONS connections,
+    enough for every thread uploading through it.
+    """
+    key = tuple(sorted(client_options.items()))
+    s3_client = _clients.get(key)
+    if s3_client is not None:
+        return s3_client
+
+    with _clients_lock:
+        if key not in _clients:
+            # Sessions are not thread safe, unlike the clients they create
+            _clients[key] = boto3.session.Session().client(
+                "s3",
+                config=Config(
+                    max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+                    retries={"mode": "standard"},
+                ),
+                **client_options,
+            )
+            logger.info(f"Created S3 client for {client_options['endpoint_url']}")
+        return _clients[key]
+
+
+def ensure_bucket(s3_client, bucket_name):
+    """
+    Creates bucket_name unless it exists. A bucket found or created is not
+    checked again for S3_BUCKET_CACHE_TTL_SECONDS. Raises ClientError when
+    the bucket can neither be accessed nor created.
+    """
+    key = (s3_client.meta.endpoint_url, bucket_name)
+    if _known_buckets.get(key, 0) > time.monotonic():
+        return
+
+    try:
+        s3_client.head_bucket(Bucket=bucket_name)
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "404":
+            raise
+        try:
+            s3_client.create_bucket(Bucket=bucket_name)
+            logger.info(f"Created bucket {bucket_name}")
+        except ClientError as e:
+            # Another thread created it first
+            if e.response["Error"]["Code"] not in BUCKET_EXISTS_CODES:
+                raise
+    _known_buckets[key] = time.monotonic() + settings.S3_BUCKET_CACHE_TTL_SECONDS
+
+
+def forget_bucket(s3_client, bucket_name):
+    """Checks bucket_name again on the next save, e.g. after it was deleted."""
+    _known_buckets.pop((s3_client.meta.endpoint_url, bucket_name), None)
+
+
+def transfer_config():
+    """
+    Multipart settings of uploads. Files above S3_MULTIPART_THRESHOLD are
+    uploaded in parts of S3_MULTIPART_CHUNKSIZE, S3_MAX_CONCURRENCY at a time.
+    """
+    return TransferConfig(
+        multipart_threshold=settings.S3_MULTIPART_THRESHOLD,
+        multipart_chunksize=settings.S3_MULTIPART_CHUNKSIZE,
+        max_concurrency=settings.S3_MAX_CONCURRENCY,
+    )
+
+
+def describe_throughput(size_bytes, seconds):
+    return (
+        f"{size_bytes / MiB:.1f} MiB in {seconds:.2f}s "
+        f"at {size_bytes / MiB / max(seconds, 1e-6):.1f} MiB/s"
+    )
+
+
+def clear_s3_clients():
+    """Drops every client and known bucket, the next save starts afresh."""
+    with _clients_lock:
+        for s3_client in _clients.values():
+            s3_client.close()
+        _clients.clear()
+    _known_buckets.clear()
@@ -1,27 +1,46 @@
-import enum
+import errno
+import hashlib
 import os
 import shutil
 import logging
-import boto3
+import time
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
+from django.conf import settings
+from django.db import connection
+
+from .media_index import HASH_ALGORITHM
+from .resumable_upload import resumable_upload
+from .s3_clients import (
+    describe_throughput,
+    ensure_bucket,
+    forget_bucket,
+    get_s3_client,
+    s3_client_options,
+    transfer_config,
+)
 
 
 # Set up Django logger
 logger = logging.getLogger("downloader")
 BASE_LOCAL_DIRECTORY = 'downloaded-media'
+STAGING_LOCAL_DIRECTORY = '.staging'
+COPY_FILE_RANGE_UNSUPPORTED = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP)
+HARD_LINK_UNSUPPORTED = (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.EOPNOTSUPP)
+MISSING_OBJECT_CODES = ["404", "NoSuchKey"]
 
-def s3_save_strategy(filepath_list, catalogue_name):
-    """Function to save files to S3."""
+def s3_save_strategy(filepath_list, catalogue_name, progress_hook=None):
+    """
+    Function to save files to S3, uploading DOWNLOADER_SAVE_WORKERS files at a time.
+    Large files are uploaded in parts, see transfer_config, and files above
+    S3_RESUMABLE_UPLOAD_THRESHOLD so that a retry continues the upload.
+    """
     logger.info("Saving to S3")
     logger.debug(f"Filepath list: {filepath_list}")
 
-    s3_endpoint_url = os.environ.get("S3_ENDPOINT_URL")
-    s3_access_key_id = os.environ.get("S3_ACCESS_KEY_ID")
-    s3_secret_access_key = os.environ.get("S3_SECRET_ACCESS_KEY")
-    s3_region = os.environ.get("S3_REGION")
-    s3_verify_certificate = not os.getenv(
-        "S3_SELF_SIGNED_CERTIFICATE", "False"
-    ).lower() in ["true", "1", "t", "yes", "y"]
+    client_options = s3_client_options()
+    s3_access_key_id = client_options["aws_access_key_id"]
+    s3_secret_access_key = client_options["aws_secret_access_key"]
     bucket_prefix = os.environ.get("CATALOGUE_PREFIX", "")
 
     bucket_name = f"{bucket_prefix}{catalogue_name}"
@@ -31,54 +50,78 @@ def s3_save_strategy(filepath_list, catalogue_name):
         return {"success": False, "error": error_message}
 
     try:
-        s3_client = boto3.client(
-            "s3",
-            endpoint_url=s3_endpoint_url,
-            region_name=s3_region,
-            aws_access_key_id=s3_access_key_id,
-            aws_secret_access_key=s3_secret_access_key,
-            verify=s3_verify_certificate,
-        )
-        if (
-            s3_client.head_bucket(Bucket=bucket_name)["ResponseMetadata"][
-                "HTTPStatusCode"
-            ]
-            != 200
-        ):
-            s3_client.create_bucket(Bucket=bucket_name)
-            logger.info(f"Created bucket {bucket_name}")
-    except ClientError as e:
-        if e.response["Error"]["Code"] == "404":
-            s3_client.create_bucket(Bucket=bucket_name)
-            logger.info(f"Created bucket {bucket_name}")
-        else:
-            error_message = f"Error accessing or creating bucket {bucket_name}: {e}"
-            logger.error(error_message)
-            return {"success": False, "error": error_message}
+        s3_client = get_s3_client(client_options)
     except Exception as e:
         error_message = f"Error creating S3 client: {e}"
         logger.error(error_message)
         return {"success": False, "error": error_message}
 
-    errors = []
-    for filepath in filepath_list:
+    try:
+        ensure_bucket(s3_client, bucket_name)
+    except Exception as e:
+        error_message = f"Error accessing or creating bucket {bucket_name}: {e}"
+        logger.error(error_message)
+        return {"success": False, "error": error_message}
+
+    config = transfer_config()
+
+    def upload_to_bucket(filepath):
         logger.debug(f"Processing file: {filepath}")
         try:
             filename = os.path.basename(filepath)
-            s3_client.upload_file(filepath, bucket_name, filename)
-            logger.info(f"Uploaded {filename} to S3 bucket {bucket_name}.")
+            file_size = os.path.getsize(filepath)
+            started = time.monotonic()
+            if file_size >= settings.S3_RESUMABLE_UPLOAD_THRESHOLD:
+                resumable_upload(s3_client, filepath, bucket_name, filename, progress_hook)
+            else:
+                s3_client.upload_file(
+                    filepath,
+                    bucket_name,
+                    filename,
+                    Callback=(lambda _bytes: progress_hook()) if progress_hook else None,
+                    Config=config,
+                )
+            logger.info(
+                f"Uploaded {filename} to S3 bucket {bucket_name}, "
+                f"{describe_throughput(file_size, time.monotonic() - started)}."
+            )
+            return file_size, None
         except ClientError as e:
+            if e.response["Error"]["Code"] == "NoSuchBucket":
+                forget_bucket(s3_client, bucket_name)
             error_message = f"Failed to upload {filepath} to S3: {e}"
             logger.error(error_message)
-            errors.append(error_message)
+            return 0, error_message
         except FileNotFoundError:
             error_message = f"File not found: {filepath}"
             logger.error(error_message)
-            errors.append(error_message)
+            return 0, error_message
         except Exception as e:
             error_message = f"Error uploading {filepath} to S3: {e}"
             logger.error(error_message)
-            errors.append(error_message)
+            return 0, error_message
+
+    def upload_in_thread(filepath):
+        try:
+            return upload_to_bucket(filepath)
+        finally:
+            # Resumable uploads record their parts through a connection of this thread
+            connection.close()
+
+    started = time.monotonic()
+    if len(filepath_list) == 1:
+        results = [upload_to_bucket(filepath_list[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=max(settings.DOWNLOADER_SAVE_WORKERS, 1)) as executor:
+            results = list(executor.map(upload_in_thread, filepath_list))
+    elapsed = time.monotonic() - started
+    errors = [error for _, error in results if error]
+    uploaded_bytes = sum(size for size, _ in results)
+    if len(filepath_list) > 1:
+        logger.info(
+            f"Uploaded {len(filepath_list) - len(errors)} files to S3 bucket {bucket_name}, "
+            f"{describe_throughput(uploaded_bytes, elapsed)}."
+        )
 
     if not errors:
         for filepath in filepath_list:
@@ -93,8 +136,205 @@ def s3_save_strategy(filepath_list, catalogue_name):
         return {"success": False, "errors": errors}
 
 
-def local_filesystem_save_strategy(filepath_list, catalogue_name):
-    """Function to save files to the local filesystem, using catalogue_name for directory names."""
+def s3_stream_save_strategy(stream, filename, catalogue_name, progress_hook=None):
+    """
+    Function to save a file to S3 while it is read from stream. Parts of
+    S3_MULTIPART_CHUNKSIZE are uploaded as soon as they are read, so at most
+    S3_MAX_CONCURRENCY parts are held in memory and nothing is written to disk.
+    """
+    logger.info(f"Streaming {filename} to S3")
+
+    client_options = s3_client_options()
+    s3_access_key_id = client_options["aws_access_key_id"]
+    s3_secret_access_key = client_options["aws_secret_access_key"]
+    bucket_prefix = os.environ.get("CATALOGUE_PREFIX", "")
+
+    bucket_name = f"{bucket_prefix}{catalogue_name}"
+    if not s3_access_key_id or not s3_secret_access_key or not bucket_name:
+        error_message = "Missing S3 credentials or S3 bucket name."
+        logger.error(error_message)
+        return {"success": False, "error": error_message}
+
+    counter = ByteCounter(stream)
+    try:
+        s3_client = get_s3_client(client_options)
+        ensure_bucket(s3_client, bucket_name)
+        started = time.monotonic()
+        s3_client.upload_fileobj(
+            counter,
+            bucket_name,
+            filename,
+            Callback=(lambda _bytes: progress_hook()) if progress_hook else None,
+            Config=transfer_config(),
+        )
+        logger.info(
+            f"Streamed {filename} to S3 bucket {bucket_name}, "
+            f"{describe_throughput(counter.bytes_read, time.monotonic() - started)}."
+        )
+        return {
+            "success": True,
+            "size_bytes": counter.bytes_read,
+            "content_hash": counter.digest.hexdigest(),
+        }
+    except Exception as e:
+        error_message = f"Error streaming {filename} to S3: {e}"
+        logger.error(error_message)
+        return {"success": False, "error": error_message}
+
+
+def s3_copy_strategy(source_catalogue, source_file_name, catalogue_name, file_name):
+    """
+    Function to place a file saved to S3 into a catalogue with a server side
+    copy, so its data is not uploaded again. A missing source object is
+    reported with "missing" in the result.
+    """
+    client_options = s3_client_options()
+    s3_access_key_id = client_options["aws_access_key_id"]
+    s3_secret_access_key = client_options["aws_secret_access_key"]
+    bucket_prefix = os.environ.get("CATALOGUE_PREFIX", "")
+
+    source_bucket = f"{bucket_prefix}{source_catalogue}"
+    bucket_name = f"{bucket_prefix}{catalogue_name}"
+    if not s3_access_key_id or not s3_secret_access_key or not bucket_name:
+        error_message = "Missing S3 credentials or S3 bucket name."
+        logger.error(error_message)
+        return {"success": False, "error": error_message}
+
+    try:
+        s3_client = get_s3_client(client_options)
+        if (source_bucket, source_file_name) == (bucket_name, file_name):
+            s3_client.head_object(Bucket=bucket_name, Key=file_name)
+            return {"success": True}
+        ensure_bucket(s3_client, bucket_name)
+        s3_client.copy(
+            {"Bucket": source_bucket, "Key": source_file_name},
+            bucket_name,
+            file_name,
+            Config=transfer_config(),
+        )
+        logger.info(f"Copied {source_file_name} from S3 bucket {source_bucket} to {bucket_name} as {file_name}.")
+        return {"success": True}
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "NoSuchBucket":
+            forget_bucket(s3_client, bucket_name)
+        missing = e.response["Error"]["Code"] in MISSING_OBJECT_CODES
+        error_message = f"Failed to copy {source_file_name} from S3 bucket {source_bucket}: {e}"
+        # Stored files deleted from their catalogue are expected
+        if missing:
+            logger.info(error_message)
+        else:
+            logger.error(error_message)
+        return {"success": False, "missing": missing, "error": error_message}
+    except Exception as e:
+        error_message = f"Error copying {source_file_name} from S3 bucket {source_bucket}: {e}"
+        logger.error(error_message)
+        return {"success": False, "error": error_message}
+
+
+def s3_exists_strategy(catalogue_name, file_name):
+    """
+    Function to look up whether a file is saved to a catalogue on S3, reported
+    with "exists" in the result. Changes nothing.
+    """
+    bucket_prefix = os.environ.get("CATALOGUE_PREFIX", "")
+    bucket_name = f"{bucket_prefix}{catalogue_name}"
+
+    try:
+        s3_client = get_s3_client(s3_client_options())
+        s3_client.head_object(Bucket=bucket_name, Key=file_name)
+        return {"success": True, "exists": True}
+    except ClientError as e:
+        if e.response["Error"]["Code"] in MISSING_OBJECT_CODES + ["NoSuchBucket"]:
+            return {"success": True, "exists": False}
+        error_message = f"Failed to look up {file_name} in S3 bucket {bucket_name}: {e}"
+        logger.error(error_message)
+        return {"success": False, "error": error_message}
+    except Exception as e:
+        error_message = f"Error looking up {file_name} in S3 bucket {bucket_name}: {e}"
+        logger.error(error_message)
+        return {"success": False, "error": error_message}
+
+
+class ByteCounter:
+    """Counts and hashes the bytes read from a stream."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.bytes_read = 0
+        self.digest = hashlib.new(HASH_ALGORITHM)
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.bytes_read += len(data)
+        self.digest.update(data)
+        return data
+
+
+def local_filesystem_staging_dir():
+    """
+    Downloads for the local filesystem are staged next to the catalogues,
+    so saving them is a rename on the same filesystem.
+    """
+    base_path = os.environ.get("FILESYSTEM_DESTINATION_PATH")
+    if not base_path:
+        return None
+    return os.path.join(base_path, STAGING_LOCAL_DIRECTORY)
+
+
+def copy_file_contents(source_path, destination_path):
+    """
+    Copies file contents inside the kernel with copy_file_range, which also
+    lets filesystems clone or offload the copy. Falls back to shutil, which
+    uses sendfile where available.
+    """
+    if hasattr(os, "copy_file_range"):
+        try:
+            with open(source_path, "rb") as source, open(destination_path, "wb") as destination:
+                remaining = os.fstat(source.fileno()).st_size
+                while remaining > 0:
+                    written = os.copy_file_range(
+                        source.fileno(), destination.fileno(), remaining
+                    )
+                    if written == 0:
+                        break
+                    remaining -= written
+            return
+        except OSError as e:
+            if e.errno not in COPY_FILE_RANGE_UNSUPPORTED:
+                raise
+    shutil.copyfile(source_path, destination_path)
+
+
+def move_file(source_path, destination_path):
+    """
+    Moves a file with an atomic rename. Across filesystems the file is
+    copied to a temporary name next to the destination and renamed into
+    place, so the destination never holds a partial file.
+    """
+    try:
+        os.replace(source_path, destination_path)
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+
+    partial_path = f"{destination_path}.part"
+    try:
+        copy_file_contents(source_path, partial_path)
+        shutil.copystat(source_path, partial_path)
+        os.replace(partial_path, destination_path)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    os.remove(source_path)
+
+
+def local_filesystem_save_strategy(filepath_list, catalogue_name, progress_hook=None):
+    """
+    Function to save files to the local filesystem, using catalogue_name for directory names.
+    Files are moved in parallel, LOCAL_SAVE_CONCURRENCY at a time, see move_file.
+    """
     logger.info("Saving to local filesystem")
 
     base_path = os.environ.get("FILESYSTEM_DESTINATION_PATH")
@@ -117,62 +357,100 @@ def local_filesystem_save_strategy(filepath_list, catalogue_name):
             logger.error(error_message)
             return {"success": False, "error": error_message}
 
-    errors = []
-    for filepath in filepath_list:
+    def move_to_catalogue(filepath):
         try:
             filename = os.path.basename(filepath)
             dest_file_path = os.path.join(destination_path, filename)
-            shutil.copy2(filepath, dest_file_path)
-            logger.info(f"Copied {filename} to {destination_path}")
+            if progress_hook:
+                progress_hook()
+            move_file(filepath, dest_file_path)
+            logger.info(f"Moved {filename} to {destination_path}")
         except FileNotFoundError:
             error_message = f"File not found: {filepath}"
             logger.error(error_message)
-            errors.append(error_message)
+            return error_message
         except Exception as e:
-            error_message = f"Error copying {filepath} to {destination_path}: {e}"
+            error_message = f"Error moving {filepath} to {destination_path}: {e}"
             logger.error(error_message)
-            errors.append(error_message)
+            return error_message
+
+    with ThreadPoolExecutor(
+        max_workers=max(settings.LOCAL_SAVE_CONCURRENCY, 1)
+    ) as executor:
+        errors = [
+            error
+            for error in executor.map(move_to_catalogue, filepath_list)
+            if error
+        ]
 
     if not errors:
-        for filepath in filepath_list:
-            try:
-                os.remove(filepath)
-                logger.info(f"Deleted local file {filepath}.")
-            except Exception as e:
-                error_message = f"Error deleting file {filepath}: {e}"
-                logger.error(error_message)
         return {"success": True}
     else:
         return {"success": False, "errors": errors}
 
 
-class MediaSaveStrategies(enum.Enum):
-    S3_SAVE = (
-        "s3_save",
-        "Saves file to the s3 instance.",
-        s3_save_strategy,
-    )
-    LOCAL_FILESYSTEM = (
-        "LOCAL_FILESYSTEM_SAVE",
-        "Saves files to the local filesystem.",
-        local_filesystem_save_strategy,
-    )
-
-    def __new__(cls, value, description, strategy_function):
-        obj = object.__new__(cls)
-        obj._value_ = value
-        obj.description = description
-        obj.strategy_function = strategy_function
-        return obj
-
-    @classmethod
-    def choices(cls):
-        return [(key.value, key.description) for key in cls]
-
-    @classmethod
-    def get_strategy_function(cls, value):
-        """Retrieve the appropriate save strategy function."""
-        for item in cls:
-            if item.value == value:
-                return item.strategy_function
-        raise ValueError(f"No strategy function found for value: {value}")
+def local_filesystem_link_strategy(source_catalogue, source_file_name, catalogue_name, file_name):
+    """
+    Function to place a file saved to the local filesystem into a catalogue as
+    a hard link, so both catalogues share its data. Falls back to a copy where
+    hard links are not possible. A missing source file is reported with
+    "missing" in the result.
+    """
+    base_path = os.environ.get("FILESYSTEM_DESTINATION_PATH")
+
+    if not base_path:
+        error_message = "Missing FILESYSTEM_DESTINATION_PATH environment variable."
+        logger.error(error_message)
+        return {"success": False, "error": error_message}
+    directory_prefix = os.environ.get("CATALOGUE_PREFIX", "")
+
+    catalogues_path = os.path.join(base_path, BASE_LOCAL_DIRECTORY)
+    source_path = os.path.join(catalogues_path, f"{directory_prefix}{source_catalogue}", source_file_name)
+    destination_path = os.path.join(catalogues_path, f"{directory_prefix}{catalogue_name}")
+    dest_file_path = os.path.join(destination_path, file_name)
+    partial_path = f"{dest_file_path}.part"
+
+    try:
+        if os.path.exists(dest_file_path) and os.path.samefile(source_path, dest_file_path):
+            return {"success": True}
+        os.makedirs(destination_path, exist_ok=True)
+        try:
+            os.link(source_path, partial_path)
+        except FileExistsError:
+            os.remove(partial_path)
+            os.link(source_path, partial_path)
+        except OSError as e:
+            if e.errno not in HARD_LINK_UNSUPPORTED:
+                raise
+            copy_file_contents(source_path, partial_path)
+        os.replace(partial_path, dest_file_path)
+        logger.info(f"Linked {source_file_name} from {source_catalogue} to {destination_path} as {file_name}")
+        return {"success": True}
+    except FileNotFoundError:
+        error_message = f"File not found: {source_path}"
+        # Stored files deleted from their catalogue are expected
+        logger.info(error_message)
+        return {"success": False, "missing": True, "error": error_message}
+    except Exception as e:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        error_message = f"Error linking {source_path} to {destination_path}: {e}"
+        logger.error(error_message)
+        return {"success": False, "error": error_message}
+
+
+def local_filesystem_exists_strategy(catalogue_name, file_name):
+    """
+    Function to look up whether a file is saved to a catalogue on the local
+    filesystem, reported with "exists" in the result. Changes nothing.
+    """
+    base_path = os.environ.get("FILESYSTEM_DESTINATION_PATH")
+
+    if not base_path:
+        error_message = "Missing FILESYSTEM_DESTINATION_PATH environment variable."
+        logger.error(error_message)
+        return {"success": False, "error": error_message}
+    directory_prefix = os.environ.get("CATALOGUE_PREFIX", "")
+
+    file_path = os.path.join(base_path, BASE_LOCAL_DIRECTORY, f"{directory_prefix}{catalogue_name}", file_name)
+    return {"success": True, "exists": os.path.isfile(file_path)}
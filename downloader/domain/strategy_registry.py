@@ -0,0 +1,205 @@
+import enum
+from functools import lru_cache
+
+from django.utils.module_loading import import_string
+
+# Strategy functions are imported on first use, so models and the web tier
+# never load yt_dlp and boto3
+DOWNLOAD_STRATEGIES = "downloader.domain.download_media_strategies"
+SAVE_STRATEGIES = "downloader.domain.save_media_strategies"
+
+
+@lru_cache(maxsize=None)
+def load_strategy_function(dotted_path):
+    return import_string(dotted_path)
+
+
+class MediaDownloadStrategies(enum.Enum):
+    AUDIO_HIGHEST = (
+        "audio_highest",
+        "Downloads single audios using ytdlp with highest available quality.",
+        f"{DOWNLOAD_STRATEGIES}.download_single_audio_highest_quality",
+    )
+    AUDIO_PLAYLIST_HIGHEST = (
+        "audio_playlist_highest",
+        "Downloads audio playlist using ytdlp with highest available quality.",
+        f"{DOWNLOAD_STRATEGIES}.download_audio_playlist_highest_quality",
+        f"{DOWNLOAD_STRATEGIES}.resolve_playlist_entries",
+        "audio_highest",
+    )
+    VIDEO_HIGHEST = (
+        "video_highest",
+        "Downloads single videos using ytdlp with highest available quality.",
+        f"{DOWNLOAD_STRATEGIES}.download_single_video_highest_quality",
+    )
+    VIDEO_PLAYLIST_HIGHEST = (
+        "video_playlist_highest",
+        "Downloads videos playlist using ytdlp with highest available quality.",
+        f"{DOWNLOAD_STRATEGIES}.download_video_playlist_highest_quality",
+        f"{DOWNLOAD_STRATEGIES}.resolve_playlist_entries",
+        "video_highest",
+    )
+    VIDEO_LIST_HIGHEST = (
+        "video_list_highest",
+        "Downloads videos from a list of URLs separated by newlines using ytdlp at the highest available quality.",
+        f"{DOWNLOAD_STRATEGIES}.download_videos_from_list",
+        f"{DOWNLOAD_STRATEGIES}.split_url_list",
+        "video_highest",
+    )
+    AUDIO_LIST_HIGHEST = (
+        "audio_list_highest",
+        "Downloads audios from a list of URLs separated by newlines using ytdlp at the highest available quality.",
+        f"{DOWNLOAD_STRATEGIES}.download_audios_from_list",
+        f"{DOWNLOAD_STRATEGIES}.split_url_list",
+        "audio_highest",
+    )
+
+    def __new__(
+        cls,
+        value,
+        description,
+        strategy_path,
+        fan_out_path=None,
+        item_strategy=None,
+    ):
+        obj = object.__new__(cls)
+        obj._value_ = value
+        obj.description = description
+        obj.strategy_path = strategy_path
+        obj.fan_out_path = fan_out_path
+        obj.item_strategy = item_strategy
+        return obj
+
+    @classmethod
+    def choices(cls):
+        """Get a list of available strategies and their descriptions."""
+        return [(key.value, key.description) for key in cls]
+
+    @classmethod
+    def get_strategy_function(cls, value):
+        """Retrieve the appropriate download strategy function."""
+        for item in cls:
+            if item.value == value:
+                return load_strategy_function(item.strategy_path)
+        raise ValueError(f"No strategy function found for value: {value}")
+
+    @classmethod
+    def get_fan_out_functions(cls, value):
+        """
+        Retrieve the function splitting a task into items and the download
+        strategy function for a single item, or (None, None) when the strategy
+        downloads a single URL.
+        """
+        item = cls(value)
+        if not item.fan_out_path:
+            return None, None
+        return (
+            load_strategy_function(item.fan_out_path),
+            cls.get_strategy_function(item.item_strategy),
+        )
+
+    @classmethod
+    def get_item_strategy(cls, value):
+        """
+        Retrieve the strategy downloading single entries for the strategy,
+        e.g. audio_highest for audio playlists, which saves the same files.
+        """
+        item = cls(value)
+        return item.item_strategy or item.value
+
+
+class MediaSaveStrategies(enum.Enum):
+    S3_SAVE = (
+        "s3_save",
+        "Saves file to the s3 instance.",
+        f"{SAVE_STRATEGIES}.s3_save_strategy",
+        None,
+        f"{SAVE_STRATEGIES}.s3_stream_save_strategy",
+        f"{SAVE_STRATEGIES}.s3_copy_strategy",
+        f"{SAVE_STRATEGIES}.s3_exists_strategy",
+    )
+    LOCAL_FILESYSTEM = (
+        "LOCAL_FILESYSTEM_SAVE",
+        "Saves files to the local filesystem.",
+        f"{SAVE_STRATEGIES}.local_filesystem_save_strategy",
+        f"{SAVE_STRATEGIES}.local_filesystem_staging_dir",
+        None,
+        f"{SAVE_STRATEGIES}.local_filesystem_link_strategy",
+        f"{SAVE_STRATEGIES}.local_filesystem_exists_strategy",
+    )
+
+    def __new__(
+        cls,
+        value,
+        description,
+        strategy_path,
+        staging_dir_path=None,
+        stream_strategy_path=None,
+        reference_strategy_path=None,
+        exists_strategy_path=None,
+    ):
+        obj = object.__new__(cls)
+        obj._value_ = value
+        obj.description = description
+        obj.strategy_path = strategy_path
+        obj.staging_dir_path = staging_dir_path
+        obj.stream_strategy_path = stream_strategy_path
+        obj.reference_strategy_path = reference_strategy_path
+        obj.exists_strategy_path = exists_strategy_path
+        return obj
+
+    @classmethod
+    def choices(cls):
+        return [(key.value, key.description) for key in cls]
+
+    @classmethod
+    def get_strategy_function(cls, value):
+        """Retrieve the appropriate save strategy function."""
+        for item in cls:
+            if item.value == value:
+                return load_strategy_function(item.strategy_path)
+        raise ValueError(f"No strategy function found for value: {value}")
+
+    @classmethod
+    def get_staging_dir(cls, value):
+        """
+        Retrieve the directory downloads should be staged in for the save
+        strategy, or None for the system temporary directory.
+        """
+        item = cls(value)
+        if not item.staging_dir_path:
+            return None
+        return load_strategy_function(item.staging_dir_path)()
+
+    @classmethod
+    def get_stream_strategy_function(cls, value):
+        """
+        Retrieve the function saving a file while it is read from a stream,
+        or None when the save strategy needs files on disk.
+        """
+        item = cls(value)
+        if not item.stream_strategy_path:
+            return None
+        return load_strategy_function(item.stream_strategy_path)
+
+    @classmethod
+    def get_reference_strategy_function(cls, value):
+        """
+        Retrieve the function placing a file already in storage into another
+        catalogue without saving it again, or None when there is none.
+        """
+        item = cls(value)
+        if not item.reference_strategy_path:
+            return None
+        return load_strategy_function(item.reference_strategy_path)
+
+    @classmethod
+    def get_exists_strategy_function(cls, value):
+        """
+        Retrieve the function telling whether a file is still in storage,
+        without changing anything, or None when there is none.
+        """
+        item = cls(value)
+        if not item.exists_strategy_path:
+            return None
+        return load_strategy_function(item.exists_strategy_path)
@@ -0,0 +1,218 @@
+import os
+import threading
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connection
+
+from .media_index import hash_file
+
+logger = logging.getLogger("downloader")
+
+MiB = 1024 * 1024
+
+
+class StreamingSaver:
+    """
+    Saves downloaded files in max_workers background threads, so the
+    download of the next file overlaps with saving the previous ones.
+    submit() blocks while max_pending files wait to be saved, which caps
+    the scratch space held by finished downloads.
+    Saved files are recorded in download_archive, if given.
+    With stream_save_func, save_stream() saves files while they are read.
+    With media_index, files whose content is stored already are referenced
+    rather than saved again, and saved files are recorded in the index.
+    place_stored() places the entries a DedupArchive skipped.
+    progress_hook is also called before every save, and stops it by raising,
+    e.g. once the task lease is lost.
+    """
+
+    def __init__(
+        self,
+        save_strategy_func,
+        catalogue_name,
+        progress_hook=None,
+        max_pending=2,
+        download_archive=None,
+        max_workers=1,
+        stream_save_func=None,
+        media_index=None,
+    ):
+        self.save_strategy_func = save_strategy_func
+        self.stream_save_func = stream_save_func
+        self.catalogue_name = catalogue_name
+        self.progress_hook = progress_hook
+        self.download_archive = download_archive
+        self.media_index = media_index
+        self.errors = []
+        self.saved_files = 0
+        self.saved_bytes = 0
+        self.reused_files = 0
+        self.reused_bytes = 0
+        # Seconds during which at least one file was being saved
+        self.saving_seconds = 0
+        self._saving = 0
+        self._saving_since = None
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(max_pending, max_workers))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def submit(self, file_path, archive_id=None):
+        """Queues a finished file for saving, safe to call from several threads."""
+        self._slots.acquire()
+        self._executor.submit(self._save, file_path, archive_id)
+
+    def save_stream(self, stream, file_name, archive_id=None):
+        """
+        Saves a file while it is read from stream, in the calling thread.
+        Returns whether it was saved, the caller downloads the file otherwise.
+        """
+        self._saving_started()
+        try:
+            self._before_save()
+            save_result = self.stream_save_func(
+                stream, file_name, self.catalogue_name, self.progress_hook
+            )
+            if not save_result.get("success"):
+                logger.warning(
+                    f"Streaming {file_name} failed, downloading it instead: "
+                    f"{save_result.get('error')}"
+                )
+                return False
+            size_bytes = save_result.get("size_bytes", 0)
+            self._saved(size_bytes, archive_id)
+            if self.media_index is not None and save_result.get("content_hash"):
+                self.media_index.record(
+                    self.catalogue_name,
+                    file_name,
+                    save_result["content_hash"],
+                    size_bytes,
+                    archive_id,
+                )
+            return True
+        finally:
+            self._saving_finished()
+
+    def _before_save(self):
+        if self.progress_hook is not None:
+            self.progress_hook()
+
+    def _saving_started(self):
+        with self._lock:
+            if self._saving == 0:
+                self._saving_since = time.monotonic()
+            self._saving += 1
+
+    def _saving_finished(self):
+        with self._lock:
+            self._saving -= 1
+            if self._saving == 0:
+                self.saving_seconds += time.monotonic() - self._saving_since
+
+    def _saved(self, size_bytes, archive_id):
+        with self._lock:
+            self.saved_files += 1
+            self.saved_bytes += size_bytes
+        if archive_id and self.download_archive is not None:
+            self.download_archive.record(archive_id)
+
+    def _reuse_stored(self, file_path, file_size, content_hash, archive_id):
+        """Tells whether the content of file_path was stored and is referenced."""
+        if not self.media_index.reuse_content(
+            content_hash,
+            file_size,
+            self.catalogue_name,
+            os.path.basename(file_path),
+            archive_id,
+        ):
+            return False
+        os.remove(file_path)
+        with self._lock:
+            self.reused_files += 1
+            self.reused_bytes += file_size
+        if archive_id and self.download_archive is not None:
+            self.download_archive.record(archive_id)
+        return True
+
+    def place_stored(self, dedup_archive):
+        """
+        Places the entries dedup_archive skipped as stored already into the
+        catalogue. Entries gone from storage since are save errors, so a retry
+        downloads them.
+        """
+        self._before_save()
+        placed, missing = dedup_archive.place_stored_entries()
+        with self._lock:
+            self.reused_files += len(placed)
+            self.reused_bytes += sum(stored.size_bytes for stored in placed.values())
+        if missing:
+            self.errors.append(
+                f"Stored files of {', '.join(missing)} are gone, "
+                f"retry the task to download them."
+            )
+
+    def _save(self, file_path, archive_id):
+        self._saving_started()
+        try:
+            self._before_save()
+            file_size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+            content_hash = None
+            if self.media_index is not None and os.path.exists(file_path):
+                # Read right after the download, mostly from the page cache
+                content_hash = hash_file(file_path)
+                if self._reuse_stored(file_path, file_size, content_hash, archive_id):
+                    return
+            save_result = self.save_strategy_func(
+                [file_path], self.catalogue_name, self.progress_hook
+            )
+            if not save_result.get("success"):
+                self.errors.append(
+                    save_result.get("error")
+                    or "; ".join(save_result.get("errors", []))
+                    or f"Unknown error while saving {file_path}."
+                )
+            else:
+                self._saved(file_size, archive_id)
+                if content_hash is not None:
+                    self.media_index.record(
+                        self.catalogue_name,
+                        os.path.basename(file_path),
+                        content_hash,
+                        file_size,
+                        archive_id,
+                    )
+        except Exception as e:
+            error_message = f"Unexpected error while saving {file_path}: {e}"
+            logger.error(error_message)
+            self.errors.append(error_message)
+        finally:
+            self._saving_finished()
+            self._slots.release()
+
+    def close(self):
+        """Waits for queued files to be saved and returns the save errors."""
+        # The saving threads must not keep the connections used by the archive
+        # open, every one of them waits at the barrier until all have a task
+        barrier = threading.Barrier(self.max_workers)
+        for _ in range(self.max_workers):
+            self._executor.submit(self._close_connection, barrier)
+        self._executor.shutdown(wait=True)
+
+        if self.saved_files:
+            elapsed = max(self.saving_seconds, 1e-6)
+            logger.info(
+                f"Saved {self.saved_files} files to {self.catalogue_name}, "
+                f"{self.saved_bytes / MiB:.1f} MiB in {elapsed:.2f}s of saving "
+                f"at {self.saved_bytes / MiB / elapsed:.1f} MiB/s"
+            )
+        if self.reused_files:
+            logger.info(
+                f"Referenced {self.reused_files} files stored already instead "
+                f"of saving {self.reused_bytes / MiB:.1f} MiB again"
+            )
+        return self.errors
+
+    def _close_connection(self, barrier):
+        barrier.wait()
+        connection.close()
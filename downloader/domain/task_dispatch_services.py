@@ -0,0 +1,138 @@
+from collections import Counter
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .task_state import TaskState
+from .task_lease_services import dispatch_lease_owner, lease_expiry
+
+
+def has_free_slot(counts, key, limit):
+    return not limit or counts[key] < limit
+
+
+def claim_next(queryset, **values):
+    """
+    Atomically updates the first row of the queryset with the given values
+    and returns it, or returns None when there is nothing left to claim.
+
+    Uses SELECT ... FOR UPDATE SKIP LOCKED where the database supports it,
+    otherwise an UPDATE guarded by the queryset filters, retried until it
+    wins against concurrent claimers.
+    """
+    connection = connections[queryset.db]
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic(using=queryset.db):
+            row = queryset.select_for_update(skip_locked=True).only("pk").first()
+            if row is None:
+                return None
+            queryset.model.objects.filter(pk=row.pk).update(**values)
+            pk = row.pk
+    else:
+        while True:
+            pk = queryset.values_list("pk", flat=True).first()
+            if pk is None:
+                return None
+            if queryset.filter(pk=pk).update(**values):
+                break
+
+    return queryset.model.objects.get(pk=pk)
+
+
+def claim_next_pending_task(
+    lease_owner, exclude_save_strategies=(), exclude_catalogues=(), max_bytes=None
+):
+    """
+    Moves the highest priority pending task to IN_PROGRESS under a lease
+    held by lease_owner and returns it. When max_bytes is given, tasks
+    probed to be larger are skipped, tasks not probed yet are not.
+    Safe to call from several consumers at once, each task is claimed once.
+    """
+    DownloadTask = apps.get_model("downloader", "DownloadTask")
+
+    candidates = (
+        DownloadTask.objects.filter(state=TaskState.PENDING.value)
+        .exclude(save_strategy__in=exclude_save_strategies)
+        .exclude(catalogue_name__in=exclude_catalogues)
+        .order_by("-priority", "created_at")
+    )
+    if max_bytes is not None:
+        candidates = candidates.filter(
+            Q(estimated_bytes__isnull=True) | Q(estimated_bytes__lte=max_bytes)
+        )
+    return claim_next(
+        candidates,
+        state=TaskState.IN_PROGRESS.value,
+        error_message="",
+        priority=None,
+        lease_owner=lease_owner,
+        lease_expires_at=lease_expiry(),
+        updated_at=timezone.now(),
+    )
+
+
+def claim_tasks_for_dispatch():
+    """
+    Claims pending tasks, highest priority first, until the global,
+    per-save-strategy or per-catalogue concurrency limits are reached.
+    Limits of 0 are unlimited.
+    Tasks whose estimated bytes exceed what is left of the byte budget are
+    skipped, unless nothing else runs, so a task larger than the whole
+    budget still runs on its own.
+    Returns (task id, lease owner) pairs for the claimed tasks.
+    """
+    DownloadTask = apps.get_model("downloader", "DownloadTask")
+
+    in_progress = list(
+        DownloadTask.objects.filter(state=TaskState.IN_PROGRESS.value).values_list(
+            "save_strategy", "catalogue_name", "estimated_bytes"
+        )
+    )
+    max_tasks = settings.DOWNLOADER_MAX_CONCURRENT_TASKS
+    free_slots = max_tasks - len(in_progress)
+
+    save_strategy_counts = Counter(save_strategy for save_strategy, _, _ in in_progress)
+    catalogue_counts = Counter(catalogue_name for _, catalogue_name, _ in in_progress)
+    save_strategy_limits = settings.DOWNLOADER_SAVE_STRATEGY_CONCURRENCY_LIMITS
+    catalogue_limit = settings.DOWNLOADER_MAX_CONCURRENT_TASKS_PER_CATALOGUE
+    byte_budget = settings.DOWNLOADER_MAX_IN_PROGRESS_BYTES
+    bytes_in_progress = sum(
+        estimated_bytes or 0 for _, _, estimated_bytes in in_progress
+    )
+    running = bool(in_progress)
+
+    claimed_tasks = []
+    while not max_tasks or len(claimed_tasks) < free_slots:
+        full_save_strategies = [
+            save_strategy
+            for save_strategy, limit in save_strategy_limits.items()
+            if not has_free_slot(save_strategy_counts, save_strategy, limit)
+        ]
+        full_catalogues = [
+            catalogue_name
+            for catalogue_name in catalogue_counts
+            if not has_free_slot(catalogue_counts, catalogue_name, catalogue_limit)
+        ]
+
+        max_bytes = None
+        if byte_budget and running:
+            max_bytes = byte_budget - bytes_in_progress
+
+        lease_owner = dispatch_lease_owner()
+        task = claim_next_pending_task(
+            lease_owner, full_save_strategies, full_catalogues, max_bytes
+        )
+        if task is None:
+            break
+
+        running = True
+        bytes_in_progress += task.estimated_bytes or 0
+        save_strategy_counts[task.save_strategy] += 1
+        catalogue_counts[task.catalogue_name] += 1
+        claimed_tasks.append((task.id, lease_owner))
+
+    return claimed_tasks
@@ -0,0 +1,90 @@
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .task_state import TaskState
+from .task_dispatch_services import claim_next
+
+
+@transaction.atomic
+def prepare_task_items(task, fan_out_func, download_archive=None):
+    """
+    Creates the items of a fanned out task on its first run, leaving out
+    entries found in download_archive, if given. On later runs
+    only items that did not complete are queued again.
+    Returns a dictionary with success status, like the strategy functions.
+    """
+    DownloadTaskItem = apps.get_model("downloader", "DownloadTaskItem")
+
+    if task.items.exists():
+        task.items.exclude(state=TaskState.COMPLETED.value).update(
+            state=TaskState.PENDING.value,
+            attempts=0,
+            error_message="",
+            updated_at=timezone.now(),
+        )
+        return {"success": True}
+
+    fan_out_result = fan_out_func(task.urls, download_archive)
+    if not fan_out_result.get("success"):
+        return fan_out_result
+
+    DownloadTaskItem.objects.bulk_create(
+        [
+            DownloadTaskItem(
+                task=task, url=url, position=position, filename_prefix=prefix
+            )
+            for position, (url, prefix) in enumerate(fan_out_result["entries"])
+        ],
+        batch_size=1000,
+    )
+    return {"success": True}
+
+
+def claim_next_task_item(task_id):
+    """Moves the next pending item of the task to IN_PROGRESS and returns it."""
+    DownloadTaskItem = apps.get_model("downloader", "DownloadTaskItem")
+
+    candidates = DownloadTaskItem.objects.filter(
+        task_id=task_id, state=TaskState.PENDING.value
+    ).order_by("attempts", "position")
+    return claim_next(
+        candidates,
+        state=TaskState.IN_PROGRESS.value,
+        attempts=F("attempts") + 1,
+        updated_at=timezone.now(),
+    )
+
+
+def finish_task_item(item, error_message=None):
+    """
+    Marks the item COMPLETED, or queues it again after an error until it
+    used up DOWNLOADER_MAX_ITEM_ATTEMPTS, then marks it FAILED.
+    """
+    if error_message is None:
+        state = TaskState.COMPLETED.value
+    elif item.attempts < settings.DOWNLOADER_MAX_ITEM_ATTEMPTS:
+        state = TaskState.PENDING.value
+    else:
+        state = TaskState.FAILED.value
+
+    type(item).objects.filter(id=item.id, state=TaskState.IN_PROGRESS.value).update(
+        state=state, error_message=error_message or "", updated_at=timezone.now()
+    )
+
+
+def task_items_outcome(task_id):
+    """
+    Returns (failed item count, item count) once every item of the task
+    finished, or None while some are still pending or in progress.
+    """
+    DownloadTaskItem = apps.get_model("downloader", "DownloadTaskItem")
+
+    items = DownloadTaskItem.objects.filter(task_id=task_id)
+    if items.filter(
+        state__in=[TaskState.PENDING.value, TaskState.IN_PROGRESS.value]
+    ).exists():
+        return None
+    return items.filter(state=TaskState.FAILED.value).count(), items.count()
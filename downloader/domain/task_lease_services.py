@@ -0,0 +1,187 @@
+import os
+import socket
+import threading
+import time
+import uuid
+import logging
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .task_state import TaskState
+from .task_model_services import next_top_priority
+
+logger = logging.getLogger("downloader")
+
+
+def worker_lease_owner():
+    """Identifies the current consumer thread, e.g. "host:pid:thread"."""
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def dispatch_lease_owner():
+    """Placeholder owner for a task claimed by the dispatcher but not yet started."""
+    return f"dispatch:{uuid.uuid4().hex}"
+
+
+def lease_expiry():
+    return timezone.now() + timedelta(seconds=settings.DOWNLOADER_TASK_LEASE_SECONDS)
+
+
+def acquire_task_lease(task_id, dispatch_owner, lease_owner):
+    """
+    Hands the lease taken at dispatch over to the worker that runs the task.
+    Returns False when the lease was reclaimed in the meantime.
+    """
+    DownloadTask = apps.get_model("downloader", "DownloadTask")
+    return bool(
+        DownloadTask.objects.filter(
+            id=task_id, state=TaskState.IN_PROGRESS.value, lease_owner=dispatch_owner
+        ).update(lease_owner=lease_owner, lease_expires_at=lease_expiry())
+    )
+
+
+def renew_task_lease(task_id, lease_owner):
+    """Extends the lease, returns False when it is no longer held by lease_owner."""
+    DownloadTask = apps.get_model("downloader", "DownloadTask")
+    return bool(
+        DownloadTask.objects.filter(
+            id=task_id, state=TaskState.IN_PROGRESS.value, lease_owner=lease_owner
+        ).update(lease_expires_at=lease_expiry())
+    )
+
+
+def release_task_lease(task_id, lease_owner, state, error_message=""):
+    """
+    Moves a leased task to its final state.
+    Returns False when the lease was lost, in which case the task is left alone.
+    """
+    DownloadTask = apps.get_model("downloader", "DownloadTask")
+    return bool(
+        DownloadTask.objects.filter(
+            id=task_id, state=TaskState.IN_PROGRESS.value, lease_owner=lease_owner
+        ).update(
+            state=state,
+            error_message=error_message,
+            lease_owner="",
+            lease_expires_at=None,
+            updated_at=timezone.now(),
+        )
+    )
+
+
+def reclaim_expired_tasks():
+    """
+    Returns IN_PROGRESS tasks whose lease expired to PENDING, or marks them
+    FAILED once they have been reclaimed DOWNLOADER_MAX_TASK_RECLAIMS times.
+    Returns the number of reclaimed tasks.
+    """
+    DownloadTask = apps.get_model("downloader", "DownloadTask")
+
+    now = timezone.now()
+    expired = DownloadTask.objects.filter(
+        Q(lease_expires_at__lt=now) | Q(lease_expires_at__isnull=True),
+        state=TaskState.IN_PROGRESS.value,
+    )
+
+    reclaimed = 0
+    for task_id, reclaim_count in list(expired.values_list("id", "reclaim_count")):
+        if reclaim_count >= settings.DOWNLOADER_MAX_TASK_RECLAIMS:
+            updates = {
+                "state": TaskState.FAILED.value,
+                "error_message": f"Task lease expired {reclaim_count + 1} times, giving up.",
+            }
+        else:
+            updates = {
+                "state": TaskState.PENDING.value,
+                "priority": next_top_priority(),
+            }
+
+        if expired.filter(id=task_id).update(
+            lease_owner="",
+            lease_expires_at=None,
+            reclaim_count=F("reclaim_count") + 1,
+            updated_at=now,
+            **updates,
+        ):
+            logger.warning(f"Reclaimed task {task_id} with expired lease")
+            reclaimed += 1
+
+    return reclaimed
+
+
+class LeaseLostError(Exception):
+    """Raised by TaskLeaseHeartbeat once the task lease was taken over."""
+
+
+class TaskLeaseHeartbeat:
+    """
+    Renews the task lease at most once per renew_interval seconds, by default
+    DOWNLOADER_TASK_LEASE_RENEW_SECONDS. Between start() and stop() a background thread renews it, so steps that
+    report no progress, e.g. resolving a playlist or merging formats, keep
+    it too. Also a progress hook, which raises LeaseLostError once the lease
+    is lost, so downloads and saves of the task stop.
+    """
+
+    def __init__(self, task_id, lease_owner, renew_interval=None):
+        self.task_id = task_id
+        self.lease_owner = lease_owner
+        if renew_interval is None:
+            renew_interval = max(settings.DOWNLOADER_TASK_LEASE_RENEW_SECONDS, 1)
+        self.renew_interval = renew_interval
+        self.lost = False
+        self._last_renewal = time.monotonic()
+        self._lock = threading.Lock()
+        self._thread_id = threading.get_ident()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def __call__(self, *_args):
+        self._renew()
+        # Hooks may fire from transfer threads, which must not keep connections open
+        if threading.get_ident() != self._thread_id:
+            connection.close()
+        if self.lost:
+            raise LeaseLostError(f"Lost the lease on task {self.task_id}")
+
+    def _renew(self):
+        with self._lock:
+            if time.monotonic() - self._last_renewal < self.renew_interval:
+                return
+            self._last_renewal = time.monotonic()
+
+        if not renew_task_lease(self.task_id, self.lease_owner):
+            self.lost = True
+            logger.warning(f"Lost the lease on task {self.task_id}")
+
+    def start(self):
+        """Starts renewing the lease in a background thread until stop()."""
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name=f"lease-heartbeat-{self.task_id}", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stops the background renewals and waits for the thread to finish."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        try:
+            while not self.lost and not self._stopped.wait(self.renew_interval):
+                try:
+                    self._renew()
+                except DatabaseError as e:
+                    # Retried at the next interval, well before the lease expires
+                    logger.warning(
+                        f"Failed to renew the lease on task {self.task_id}: {e}"
+                    )
+        finally:
+            connection.close()
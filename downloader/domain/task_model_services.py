@@ -3,59 +3,52 @@ from django.db.models import F, Max
 from django.apps import apps
 from .task_state import TaskState
 
-
-@transaction.atomic
-def clean_up_stale_priorities():
-    DownloadTask = apps.get_model("downloader", "DownloadTask")
-    tasks_to_clean_up = DownloadTask.objects.exclude(state=TaskState.PENDING.value)
-    tasks_to_clean_up.update(priority=None)
+# Distance between priorities of consecutively queued tasks. Moving a task
+# between two others only shifts the tasks sitting right above it, until
+# the first free priority value is found.
+PRIORITY_GAP = 1024
+RUN_BATCH_SIZE = 32
 
 
-@transaction.atomic
-def reorder_task_priorities_after_unset():
+def next_top_priority():
+    """Priority that puts a task in front of every pending task."""
     DownloadTask = apps.get_model("downloader", "DownloadTask")
 
-    tasks = DownloadTask.objects.filter(state=TaskState.PENDING.value).order_by(
-        "priority"
-    )
-
-    updated_tasks = []
-
-    for index, task in enumerate(tasks):
-        new_priority = index + 1
-        if task.priority != new_priority:
-            task.priority = new_priority
-            updated_tasks.append(task)
-
-    if updated_tasks:
-        DownloadTask.objects.bulk_update(updated_tasks, ["priority"])
+    max_priority = DownloadTask.objects.filter(state=TaskState.PENDING.value).aggregate(
+        Max("priority")
+    )["priority__max"]
+    return (max_priority or 0) + PRIORITY_GAP
 
 
 @transaction.atomic
-def reorder_priorities_to_updated_task(new_task):
+def make_room_for_priority(task):
+    """
+    Shifts the run of pending tasks with consecutive priorities starting at
+    the task's priority up by one, so the task keeps its place.
+    Only the tasks up to the first free priority value are touched.
+    """
     DownloadTask = apps.get_model("downloader", "DownloadTask")
 
-    MIN_PRIORITY = 1
-
-    max_priority = (
-        DownloadTask.objects.aggregate(max_priority=Max("priority"))["max_priority"]
-        or 0
+    pending_tasks = (
+        DownloadTask.objects.filter(state=TaskState.PENDING.value)
+        .exclude(id=task.id)
+        .order_by("priority")
+        .values_list("id", "priority")
     )
 
-    if new_task.priority < MIN_PRIORITY:
-        new_task.priority = MIN_PRIORITY
-    elif new_task.priority >= max_priority:
-        new_task.priority = max_priority + 1
-
-    if (
-        DownloadTask.objects.filter(
-            priority=new_task.priority, state=TaskState.PENDING.value
-        )
-        .exclude(id=new_task.id)
-        .exists()
-    ):
-        tasks_to_update = DownloadTask.objects.filter(
-            priority__gte=new_task.priority
-        ).exclude(id=new_task.id)
-
-        tasks_to_update.update(priority=F("priority") + 1)
+    run_ids = []
+    expected_priority = task.priority
+    while True:
+        batch = pending_tasks.filter(priority__gte=expected_priority)[:RUN_BATCH_SIZE]
+        matched = 0
+        for task_id, priority in batch:
+            if priority != expected_priority:
+                break
+            run_ids.append(task_id)
+            expected_priority += 1
+            matched += 1
+        if matched < RUN_BATCH_SIZE:
+            break
+
+    if run_ids:
+        DownloadTask.objects.filter(id__in=run_ids).update(priority=F("priority") + 1)
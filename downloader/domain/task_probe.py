@@ -0,0 +1,179 @@
+import logging
+from collections import Counter
+
+from django.conf import settings
+from yt_dlp.networking import HEADRequest
+from yt_dlp.networking.exceptions import RequestError
+from yt_dlp.utils import DownloadError, ExtractorError
+
+from .download_archive import entry_archive_id
+from .download_media_strategies import extract_info_cached, with_ydl_overrides
+from .format_stream import STREAMABLE_PROTOCOLS
+from .strategy_registry import MediaDownloadStrategies
+from .youtubedl_pool import borrow_youtubedl
+
+logger = logging.getLogger("downloader")
+
+# Formats the strategies downloading single entries select
+PROBE_FORMATS = {
+    "audio_highest": "bestaudio/best",
+    "video_highest": "bestvideo+bestaudio/best",
+}
+
+
+def iter_media(info_dict):
+    """Iterates the info dicts of the single media of a processed info dict."""
+    if info_dict.get("entries") is None:
+        yield info_dict
+        return
+    for entry in info_dict["entries"]:
+        if entry:
+            yield from iter_media(entry)
+
+
+def content_length(ydl, format_dict):
+    """
+    Returns the Content-Length of a format served as a single file over
+    HTTP, e.g. media linked directly, or None.
+    """
+    if format_dict.get("protocol") not in STREAMABLE_PROTOCOLS:
+        return None
+    try:
+        with ydl.urlopen(
+            HEADRequest(format_dict["url"], headers=format_dict.get("http_headers"))
+        ) as response:
+            return int(response.headers.get("Content-Length") or 0) or None
+    except (RequestError, ValueError):
+        return None
+
+
+def media_bytes(ydl, info_dict):
+    """
+    Returns the size of the formats selected in info_dict, estimated from
+    their bitrate and the duration, or asked from the server when unknown.
+    Returns None when the size of a format stays unknown.
+    """
+    total = 0
+    for format_dict in info_dict.get("requested_formats") or [info_dict]:
+        size = format_dict.get("filesize") or format_dict.get("filesize_approx")
+        if not size and format_dict.get("tbr") and info_dict.get("duration"):
+            size = format_dict["tbr"] * 1000 / 8 * info_dict["duration"]
+        if not size:
+            size = content_length(ydl, format_dict)
+        if not size:
+            return None
+        total += size
+    return total
+
+
+def media_format(info_dict):
+    """Describes the formats selected, e.g. "137+140 (mp4, 1920x1080)"."""
+    return (
+        f"{info_dict.get('format_id') or 'unknown'} "
+        f"({info_dict.get('ext') or 'unknown'}, "
+        f"{info_dict.get('resolution') or 'unknown resolution'})"
+    )
+
+
+def sample_entries(entries, sample_size):
+    """Returns up to sample_size entries spread evenly over entries."""
+    if len(entries) <= sample_size:
+        return entries
+    return [entries[i * len(entries) // sample_size] for i in range(sample_size)]
+
+
+def scaled_total(values, count):
+    """Sum of values scaled from the known ones to count values, or None."""
+    known = [value for value in values if value is not None]
+    if not count:
+        return 0
+    if not known:
+        return None
+    return sum(known) / len(known) * count
+
+
+def probe_task(urls, download_strategy, ydl_overrides=None, download_archive=None):
+    """
+    Estimates what a task with the download strategy downloads from urls,
+    without downloading anything. Entries found in download_archive, if
+    given, are left out.
+    Returns a dictionary with success status, estimated_bytes,
+    media_duration in seconds, media_format and entry_count.
+    Raises ValueError for unknown download strategies.
+    """
+    fan_out_func, _ = MediaDownloadStrategies.get_fan_out_functions(download_strategy)
+    probe_format = PROBE_FORMATS.get(
+        MediaDownloadStrategies.get_item_strategy(download_strategy)
+    )
+    if probe_format is None:
+        raise ValueError(f"No probe format for download strategy: {download_strategy}")
+    if fan_out_func:
+        fan_out_result = fan_out_func(urls, download_archive)
+        if not fan_out_result.get("success"):
+            return fan_out_result
+        entry_urls = [url for url, _ in fan_out_result["entries"]]
+        probed_urls = sample_entries(
+            entry_urls, max(settings.TASK_PROBE_SAMPLE_ENTRIES, 1)
+        )
+    else:
+        entry_urls = probed_urls = [urls]
+
+    ydl_opts = {
+        "format": probe_format,
+        "quiet": True,
+        "no_warnings": True,
+    }
+    with_ydl_overrides(ydl_opts, ydl_overrides)
+
+    media = []
+    sizes = []
+    error = None
+    extracted_count = 0
+    try:
+        with borrow_youtubedl(ydl_opts) as ydl:
+            for url in probed_urls:
+                try:
+                    info_dict = extract_info_cached(ydl, url, download=False)
+                except (DownloadError, ExtractorError) as e:
+                    # Unavailable entries fail their download too, so count as empty
+                    logger.info(f"Failed to probe {url}: {e}")
+                    error = error or e
+                    continue
+                extracted_count += 1
+                if info_dict:
+                    media.extend(iter_media(info_dict))
+            if download_archive is not None:
+                archived_ids = download_archive.archived_ids(
+                    [entry_archive_id(info_dict) for info_dict in media]
+                )
+                media = [
+                    info_dict
+                    for info_dict in media
+                    if entry_archive_id(info_dict) not in archived_ids
+                ]
+            sizes = [media_bytes(ydl, info_dict) for info_dict in media]
+    except Exception as e:
+        error_message = f"Unexpected error: {e}"
+        logger.error(error_message)
+        return {"success": False, "error": error_message}
+    if error and not extracted_count:
+        error_message = f"Error probing media: {error}"
+        logger.error(error_message)
+        return {"success": False, "error": error_message}
+
+    # Every probed entry stands for the same share of the entries
+    media_count = len(media) * len(entry_urls) / len(probed_urls) if probed_urls else 0
+    estimated_bytes = scaled_total(sizes, media_count)
+    media_duration = scaled_total(
+        [info_dict.get("duration") for info_dict in media], media_count
+    )
+    formats = Counter(media_format(info_dict) for info_dict in media)
+    return {
+        "success": True,
+        "estimated_bytes": (
+            round(estimated_bytes) if estimated_bytes is not None else None
+        ),
+        "media_duration": media_duration,
+        "media_format": formats.most_common(1)[0][0] if formats else "",
+        "entry_count": len(entry_urls) if fan_out_func else len(media),
+    }
@@ -1,8 +1,73 @@
+import csv
+import json
+from collections import Counter
+
 from django.db import transaction, IntegrityError, DatabaseError
+from django.db.models import F
 from django.core.exceptions import ValidationError
 
-from ..models import DownloadTask
+from ..models import DownloadProfile, DownloadTask
+from ..tasks import dispatch_download_tasks
 from .task_state import TaskState
+from .task_model_services import PRIORITY_GAP, next_top_priority
+
+UNFINISHED_STATES = [TaskState.PENDING.value, TaskState.IN_PROGRESS.value]
+# Types of the values of imported rows, JSON rows may hold any type
+COLUMN_TYPES = {
+    "urls": str,
+    "url": str,
+    "catalogue_name": str,
+    "download_strategy": str,
+    "save_strategy": str,
+    "download_profile": str,
+    "fan_out": (str, bool, int),
+    "incremental_sync": (str, bool, int),
+}
+
+
+@transaction.atomic
+def coalesce_duplicate_task(task):
+    """
+    Attaches task to an unfinished task downloading the same media the same
+    way, see task_dedup_key, instead of queuing it again.
+    Returns the unfinished task, or None when there is none.
+    """
+    task.refresh_dedup_key()
+    existing_task = (
+        DownloadTask.objects.filter(
+            dedup_key=task.dedup_key, state__in=UNFINISHED_STATES
+        )
+        .exclude(pk=task.pk)
+        .order_by("created_at")
+        .first()
+    )
+    if existing_task is not None:
+        DownloadTask.objects.filter(pk=existing_task.pk).update(
+            coalesced_count=F("coalesced_count") + 1
+        )
+        existing_task.refresh_from_db(fields=["coalesced_count"])
+    return existing_task
+
+
+def save_or_coalesce_task(task):
+    """
+    Saves task, unless an unfinished task downloads the same media the same
+    way, see coalesce_duplicate_task. Returns that task, or None when task
+    was saved.
+    """
+    existing_task = coalesce_duplicate_task(task)
+    if existing_task is not None:
+        return existing_task
+    try:
+        with transaction.atomic():
+            task.save()
+    except IntegrityError:
+        # A duplicate was saved since the lookup, see the dedup key constraint
+        existing_task = coalesce_duplicate_task(task)
+        if existing_task is None:
+            raise
+        return existing_task
+    return None
 
 
 @transaction.atomic
@@ -11,9 +76,11 @@ def create_and_enqueue_download_task(
 ):
     """
     Creates a DownloadTask instance and enqueues it for processing if creation is successful.
+    A duplicate of an unfinished task is attached to it instead, which is returned with
+    "coalesced" set.
     Ensures atomicity of database operations and returns a consistent response suitable for views.
     """
-    response = {"success": False, "task": None, "error": None}
+    response = {"success": False, "task": None, "error": None, "coalesced": False}
 
     try:
         task = DownloadTask(
@@ -24,7 +91,13 @@ def create_and_enqueue_download_task(
             state=TaskState.PENDING.value,
         )
         task.full_clean()
-        task.save()
+        existing_task = save_or_coalesce_task(task)
+        if existing_task is not None:
+            response["task"] = existing_task
+            response["coalesced"] = True
+            response["success"] = True
+            return response
+        dispatch_download_tasks()
         response["task"] = task
         response["success"] = True
     except ValidationError as e:
@@ -35,3 +108,144 @@ def create_and_enqueue_download_task(
     except DatabaseError as e:
         response["error"] = f"Database error: {str(e)}"
     return response
+
+
+def invalid_columns(row):
+    """Returns the columns of an imported row whose values have the wrong type."""
+    return [
+        column
+        for column, types in COLUMN_TYPES.items()
+        if row.get(column) is not None and not isinstance(row[column], types)
+    ]
+
+
+def parse_task_rows(lines, file_format):
+    """
+    Parses JSONL or CSV lines into task dictionaries.
+    Yields (line number, row) pairs, row is None when the line cannot be parsed.
+    """
+    if file_format == "csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError:
+            row = None
+        yield line_number, row if isinstance(row, dict) else None
+
+
+@transaction.atomic
+def bulk_create_download_tasks(numbered_rows, batch_size=1000):
+    """
+    Validates, deduplicates and creates tasks from (line number, row) pairs
+    without going through DownloadTask.save() for every row.
+    Rows that duplicate each other or an unfinished task are skipped, the latter
+    are counted on the unfinished task.
+    Earlier rows get higher priorities, all of them above the current queue.
+    Columns left out get the defaults of a task created in the form, e.g. no
+    fan-out, and download_profile names a DownloadProfile.
+    """
+    response = {"success": False, "created": 0, "duplicates": 0, "errors": []}
+
+    profiles = {profile.name: profile for profile in DownloadProfile.objects.all()}
+    tasks = []
+    seen_keys = set()
+    for line_number, row in numbered_rows:
+        if row is None:
+            response["errors"].append(f"Line {line_number}: unreadable row")
+            continue
+        columns = invalid_columns(row)
+        if columns:
+            response["errors"].append(
+                f"Line {line_number}: invalid values for {', '.join(columns)}"
+            )
+            continue
+
+        task = DownloadTask(
+            urls=(row.get("urls") or row.get("url") or "").strip(),
+            catalogue_name=row.get("catalogue_name") or "",
+            state=TaskState.PENDING.value,
+        )
+        if row.get("download_strategy"):
+            task.download_strategy = row["download_strategy"]
+        if row.get("save_strategy"):
+            task.save_strategy = row["save_strategy"]
+        # Checked by clean_fields, which also converts CSV values like "True"
+        for field_name in ["fan_out", "incremental_sync"]:
+            if row.get(field_name) not in (None, ""):
+                setattr(task, field_name, row[field_name])
+
+        try:
+            if not task.urls:
+                raise ValidationError({"urls": ["This field cannot be blank."]})
+            if row.get("download_profile"):
+                if row["download_profile"] not in profiles:
+                    raise ValidationError(
+                        {
+                            "download_profile": [
+                                f"Unknown download profile: {row['download_profile']}"
+                            ]
+                        }
+                    )
+                task.download_profile = profiles[row["download_profile"]]
+            task.clean_fields(exclude=["priority", "download_profile"])
+        except ValidationError as e:
+            response["errors"].append(f"Line {line_number}: {e.message_dict}")
+            continue
+
+        task.refresh_dedup_key()
+        if task.dedup_key in seen_keys:
+            response["duplicates"] += 1
+            continue
+        seen_keys.add(task.dedup_key)
+        tasks.append(task)
+
+    # The first unfinished task of every key gets the duplicates of that key
+    unfinished_task_ids = {}
+    for start in range(0, len(tasks), batch_size):
+        batch_keys = [task.dedup_key for task in tasks[start : start + batch_size]]
+        for task_id, dedup_key in (
+            DownloadTask.objects.filter(
+                state__in=UNFINISHED_STATES, dedup_key__in=batch_keys
+            )
+            .order_by("-created_at")
+            .values_list("id", "dedup_key")
+        ):
+            unfinished_task_ids[dedup_key] = task_id
+
+    new_tasks = [task for task in tasks if task.dedup_key not in unfinished_task_ids]
+    response["duplicates"] += len(tasks) - len(new_tasks)
+    coalesced_counts = Counter(
+        unfinished_task_ids[task.dedup_key]
+        for task in tasks
+        if task.dedup_key in unfinished_task_ids
+    )
+    for task_id, count in coalesced_counts.items():
+        DownloadTask.objects.filter(pk=task_id).update(
+            coalesced_count=F("coalesced_count") + count
+        )
+
+    top_priority = next_top_priority()
+    for index, task in enumerate(new_tasks):
+        task.priority = top_priority + (len(new_tasks) - 1 - index) * PRIORITY_GAP
+
+    try:
+        DownloadTask.objects.bulk_create(new_tasks, batch_size=batch_size)
+    except IntegrityError as e:
+        response["errors"].append(f"Database integrity error: {str(e)}")
+        return response
+    except DatabaseError as e:
+        response["errors"].append(f"Database error: {str(e)}")
+        return response
+
+    if new_tasks:
+        dispatch_download_tasks()
+    response["created"] = len(new_tasks)
+    response["success"] = True
+    return response
@@ -0,0 +1,161 @@
+import logging
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+logger = logging.getLogger("downloader")
+
+TARGET_CODEC = "mp3"
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class TranscodeError(Exception):
+    """Exception raised when ffmpeg fails to convert a file."""
+
+
+def transcode_executor():
+    """
+    Returns the pool shared by every task of the worker. ffmpeg runs in its
+    own process, so threads waiting for it are enough to use all cores.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max(settings.TRANSCODE_CONCURRENCY, 1),
+                thread_name_prefix="transcode",
+            )
+        return _executor
+
+
+def probe_audio_codec(file_path):
+    """Returns the codec of the first audio stream, or None when unknown."""
+    try:
+        process = subprocess.run(
+            [
+                settings.FFPROBE_BINARY,
+                "-v",
+                "error",
+                "-select_streams",
+                "a:0",
+                "-show_entries",
+                "stream=codec_name",
+                "-of",
+                "csv=p=0",
+                file_path,
+            ],
+            capture_output=True,
+            text=True,
+        )
+    except OSError:
+        return None
+    return process.stdout.strip() or None
+
+
+def convert_to_mp3(file_path):
+    """
+    Converts file_path to an mp3 file next to it and removes the original.
+    mp3 files are kept as they are, and mp3 audio in other containers is
+    copied into an mp3 file without encoding it again.
+    Returns the path of the mp3 file, raises TranscodeError.
+    """
+    base_path, extension = os.path.splitext(file_path)
+    if extension.lower() == f".{TARGET_CODEC}":
+        return file_path
+
+    mp3_path = f"{base_path}.{TARGET_CODEC}"
+    partial_path = f"{mp3_path}.part"
+    if probe_audio_codec(file_path) == TARGET_CODEC:
+        audio_options = ["-c:a", "copy"]
+    else:
+        # VBR at the highest quality, as FFmpegExtractAudio did
+        audio_options = ["-c:a", "libmp3lame", "-q:a", "0"]
+    command = [
+        settings.FFMPEG_BINARY,
+        "-y",
+        "-loglevel",
+        "error",
+        "-i",
+        file_path,
+        "-vn",
+        *audio_options,
+        "-f",
+        TARGET_CODEC,
+        partial_path,
+    ]
+
+    started = time.monotonic()
+    try:
+        subprocess.run(command, capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        details = getattr(e, "stderr", None) or e
+        raise TranscodeError(f"Failed to convert {file_path} to mp3: {details}")
+    os.replace(partial_path, mp3_path)
+    os.remove(file_path)
+    logger.info(
+        f"Converted {os.path.basename(file_path)} to mp3 "
+        f"({'copied' if audio_options[1] == 'copy' else 'encoded'}) "
+        f"in {time.monotonic() - started:.1f}s"
+    )
+    return mp3_path
+
+
+class TranscodingStage:
+    """
+    Converts downloaded files to mp3 on the shared transcoding pool and
+    passes every converted file to on_file_ready, if given. submit() returns
+    right away, unless max_pending files of this stage wait to be converted.
+    wait() must be called before on_file_ready stops accepting files.
+    """
+
+    def __init__(self, on_file_ready=None, max_pending=None):
+        self.on_file_ready = on_file_ready
+        self.futures = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(
+            max_pending or 2 * max(settings.TRANSCODE_CONCURRENCY, 1)
+        )
+
+    def submit(self, file_path, archive_id=None):
+        """Queues a downloaded file, safe to call from several threads."""
+        self._slots.acquire()
+        future = transcode_executor().submit(self._convert, file_path, archive_id)
+        with self._lock:
+            self.futures.append(future)
+
+    def _convert(self, file_path, archive_id):
+        try:
+            mp3_path = convert_to_mp3(file_path)
+        finally:
+            self._slots.release()
+        if self.on_file_ready:
+            self.on_file_ready(mp3_path, archive_id)
+        return mp3_path
+
+    def close(self):
+        """Waits for every queued file, ignoring errors, after a failed download."""
+        wait(self.futures)
+
+    def wait(self):
+        """
+        Waits for every queued file and returns the mp3 paths in the order
+        the files were queued. Raises the first error once all are done.
+        """
+        mp3_paths = []
+        error = None
+        for future in list(self.futures):
+            try:
+                mp3_paths.append(future.result())
+            except Exception as e:
+                error = error or e
+        if error:
+            raise error
+        return mp3_paths
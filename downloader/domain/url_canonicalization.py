@@ -0,0 +1,132 @@
+import hashlib
+import json
+import re
+from urllib.parse import urlsplit, urlunsplit
+
+from django.core.exceptions import ValidationError
+
+TRACKING_PARAMETERS = {
+    "fbclid",
+    "gclid",
+    "dclid",
+    "msclkid",
+    "igshid",
+    "mc_cid",
+    "mc_eid",
+}
+TRACKING_PARAMETER_PREFIXES = ("utm_",)
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Runs in the web tier, so the video ids of the common sites are recognised
+# with regular expressions instead of loading the yt-dlp extractors. Other
+# URLs are only normalised, short links would need a request to resolve.
+# (extractor, pattern of host and path with query, canonical URL of the id)
+VIDEO_URL_PATTERNS = [
+    (
+        "youtube",
+        re.compile(
+            r"^(?:(?:www|m|music)\.)?youtube(?:-nocookie)?\.com/"
+            r"(?:watch\?(?:.*&)?v=|shorts/|embed/|live/|v/)"
+            r"(?P<id>[0-9A-Za-z_-]{11})(?:[/?&#]|$)"
+        ),
+        "https://www.youtube.com/watch?v={id}",
+    ),
+    (
+        "youtube",
+        re.compile(r"^youtu\.be/(?P<id>[0-9A-Za-z_-]{11})(?:[/?&#]|$)"),
+        "https://www.youtube.com/watch?v={id}",
+    ),
+    (
+        "vimeo",
+        re.compile(r"^(?:www\.|player\.)?vimeo\.com/(?:video/)?(?P<id>\d+)(?:[/?#]|$)"),
+        "https://vimeo.com/{id}",
+    ),
+    (
+        "dailymotion",
+        re.compile(
+            r"^(?:(?:www|m)\.)?(?:dailymotion\.com/video|dai\.ly)/"
+            r"(?P<id>x[0-9a-z]+)(?:[/?_#]|$)"
+        ),
+        "https://www.dailymotion.com/video/{id}",
+    ),
+]
+
+
+def is_tracking_parameter(parameter):
+    name = parameter.partition("=")[0]
+    return name in TRACKING_PARAMETERS or name.startswith(TRACKING_PARAMETER_PREFIXES)
+
+
+def canonicalize_url(url):
+    """
+    Returns the canonical form of url and the "<extractor> <video id>" of
+    the video it points to, like a download archive id, or None when it is
+    not a known video URL, e.g. a playlist. Only meant for comparing URLs,
+    the parameters of the query are kept as they are but sorted.
+    """
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        # Malformed, e.g. "http://[::1/x" or an out of range port
+        return url, None
+    if parts.scheme.lower() not in DEFAULT_PORTS or not parts.hostname:
+        return url, None
+
+    host = parts.hostname.lower().rstrip(".")
+    query = [
+        parameter
+        for parameter in parts.query.split("&")
+        if parameter and not is_tracking_parameter(parameter)
+    ]
+    location = f"{host}{parts.path}?{'&'.join(query)}"
+    # Videos opened from a playlist download the playlist with playlist strategies
+    if not any(parameter.partition("=")[0] == "list" for parameter in query):
+        for extractor, pattern, canonical_form in VIDEO_URL_PATTERNS:
+            match = pattern.match(location)
+            if match:
+                video_id = match.group("id")
+                return canonical_form.format(id=video_id), f"{extractor} {video_id}"
+
+    if host.startswith("www."):
+        host = host[len("www.") :]
+    netloc = host
+    if port and port != DEFAULT_PORTS[parts.scheme.lower()]:
+        netloc = f"{host}:{port}"
+    canonical = urlunsplit(
+        (
+            parts.scheme.lower(),
+            netloc,
+            parts.path or "/",
+            "&".join(sorted(query)),
+            parts.fragment,
+        )
+    )
+    return canonical, None
+
+
+def validate_urls(urls):
+    """Raises ValidationError for lines of urls that are malformed URLs."""
+    for url in urls.splitlines():
+        try:
+            urlsplit(url.strip()).port
+        except ValueError:
+            raise ValidationError(f"Malformed URL: {url.strip()}")
+
+
+def task_dedup_key(
+    urls, download_strategy, save_strategy, catalogue_name, download_profile_id=None
+):
+    """
+    Returns the key shared by tasks saving the same media the same way,
+    whichever URL forms they were submitted with.
+    """
+    media = sorted(
+        video_id or canonical
+        for canonical, video_id in (
+            canonicalize_url(url) for url in urls.splitlines() if url.strip()
+        )
+    )
+    key = [download_strategy, save_strategy, catalogue_name, download_profile_id, media]
+    return hashlib.sha256(json.dumps(key).encode()).hexdigest()
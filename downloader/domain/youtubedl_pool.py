@@ -0,0 +1,92 @@
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import yt_dlp
+from django.conf import settings
+
+# Options that may differ between borrows of the same instance
+PER_BORROW_OPTIONS = ("outtmpl", "progress_hooks", "postprocessor_hooks")
+
+_local = threading.local()
+
+
+class PooledYoutubeDL:
+    """
+    A YoutubeDL instance kept open between downloads, so its extractors,
+    HTTP connections and cookies are reused. The output template and hooks
+    are set for every borrow.
+    """
+
+    def __init__(self, ydl_opts, adaptive_tuner=None):
+        self.progress_hooks = []
+        self.postprocessor_hooks = []
+        self.ydl = yt_dlp.YoutubeDL(
+            {
+                "cachedir": settings.YTDLP_CACHE_DIR,
+                **ydl_opts,
+                "progress_hooks": [self._progress_hook],
+                "postprocessor_hooks": [self._postprocessor_hook],
+            }
+        )
+        if adaptive_tuner is not None:
+            adaptive_tuner.attach(self.ydl)
+        # Templates of other output types, e.g. thumbnails, never change
+        self.default_outtmpl = dict(self.ydl.params["outtmpl"])
+
+    def _progress_hook(self, progress):
+        for hook in self.progress_hooks:
+            hook(progress)
+
+    def _postprocessor_hook(self, progress):
+        for hook in self.postprocessor_hooks:
+            hook(progress)
+
+    def prepare(self, ydl_opts):
+        self.progress_hooks = ydl_opts.get("progress_hooks") or []
+        self.postprocessor_hooks = ydl_opts.get("postprocessor_hooks") or []
+        self.ydl.params["outtmpl"] = dict(self.default_outtmpl)
+        if "outtmpl" in ydl_opts:
+            self.ydl.params["outtmpl"]["default"] = ydl_opts["outtmpl"]
+
+    def release(self):
+        self.progress_hooks = []
+        self.postprocessor_hooks = []
+
+    def close(self):
+        self.ydl.close()
+
+
+def pool_key(ydl_opts, adaptive_tuner=None):
+    options = sorted(
+        (key, value) for key, value in ydl_opts.items() if key not in PER_BORROW_OPTIONS
+    )
+    return repr(options), id(adaptive_tuner)
+
+
+@contextmanager
+def borrow_youtubedl(ydl_opts, adaptive_tuner=None):
+    """
+    Yields a warm YoutubeDL instance of the current thread for ydl_opts,
+    creating it on first use. Instances are never shared between threads.
+    The YTDLP_POOL_SIZE most recently used option sets stay open, and an
+    instance is dropped when a download raised through it.
+    """
+    pool = getattr(_local, "pool", None)
+    if pool is None:
+        pool = _local.pool = OrderedDict()
+
+    key = pool_key(ydl_opts, adaptive_tuner)
+    pooled = pool.pop(key, None) or PooledYoutubeDL(ydl_opts, adaptive_tuner)
+    pooled.prepare(ydl_opts)
+    try:
+        yield pooled.ydl
+    except BaseException:
+        pooled.close()
+        raise
+
+    pooled.release()
+    pool[key] = pooled
+    while len(pool) > settings.YTDLP_POOL_SIZE:
+        _, evicted = pool.popitem(last=False)
+        evicted.close()
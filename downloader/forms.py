@@ -0,0 +1,6 @@
+from django import forms
+
+
+class BulkTaskImportForm(forms.Form):
+    file = forms.FileField()
+    format = forms.ChoiceField(choices=[("jsonl", "JSONL"), ("csv", "CSV")])
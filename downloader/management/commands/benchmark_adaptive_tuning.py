@@ -0,0 +1,198 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import yt_dlp
+from django.core.management.base import BaseCommand
+
+from downloader.domain.adaptive_tuning import MiB, AdaptiveDownloadTuner
+
+
+class ThrottlingServer(ThreadingHTTPServer):
+    """
+    Serves an HLS stream and a plain file the way throttling sources do.
+
+    Every response starts after a fixed latency. HLS segments are sent at
+    rate each, and requests beyond max_connections at once are
+    answered with 429. The plain file is sent at burst_rate for the first
+    burst_bytes of every response and at rate after that.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, options):
+        super().__init__(("127.0.0.1", 0), ThrottlingRequestHandler)
+        self.options = options
+        self.segment = os.urandom(options["segment_kib"] * 1024)
+        self.file_size = options["file_mib"] * MiB
+        self.active = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class ThrottlingRequestHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.active += 1
+            too_many = server.active > server.options["max_connections"]
+        try:
+            time.sleep(server.options["latency"])
+            if self.path == "/stream.m3u8":
+                self.send_playlist()
+            elif self.path.startswith("/segment") and too_many:
+                self.send_error(429)
+            elif self.path.startswith("/segment"):
+                self.send_body(server.segment, "video/mp2t")
+            elif self.path == "/file.mp4":
+                self.send_file()
+            else:
+                self.send_error(404)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def send_playlist(self):
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:1"]
+        for index in range(self.server.options["segments"]):
+            lines += ["#EXTINF:1.0,", f"segment{index}.ts"]
+        lines.append("#EXT-X-ENDLIST")
+        body = "\n".join(lines).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/vnd.apple.mpegurl")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_file(self):
+        size = self.server.file_size
+        start, end = 0, size - 1
+        range_header = self.headers.get("Range", "")
+        if range_header.startswith("bytes="):
+            first, _, last = range_header[6:].partition("-")
+            start = int(first or 0)
+            end = min(int(last), size - 1) if last else size - 1
+
+        self.send_response(206 if range_header else 200)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        if range_header:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        self.stream(end - start + 1, self.server.options["burst_kib"] * 1024)
+
+    def send_body(self, body, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.stream(len(body), 0)
+
+    def stream(self, length, burst_bytes):
+        """Writes length bytes, the first burst_bytes at burst rate."""
+        options = self.server.options
+        block = bytes(64 * 1024)
+        sent = 0
+        while sent < length:
+            size = min(len(block), length - sent)
+            rate = options["burst_rate"] if sent < burst_bytes else options["rate"]
+            time.sleep(size / rate)
+            self.wfile.write(block[:size])
+            sent += size
+
+
+class Command(BaseCommand):
+    help = (
+        "Downloads from a local throttling HTTP server with adaptive tuning "
+        "and prints how fragment concurrency and HTTP chunk size converge. "
+        "Nothing is recorded in the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rounds", type=int, default=10)
+        parser.add_argument(
+            "--max-connections",
+            type=int,
+            default=6,
+            help="Concurrent segment requests above this are answered with 429.",
+        )
+        parser.add_argument(
+            "--rate-kib",
+            type=int,
+            default=2048,
+            help="Throttled rate of every connection in KiB/s.",
+        )
+        parser.add_argument(
+            "--burst-rate-kib",
+            type=int,
+            default=16384,
+            help="Rate of the first --burst-kib of each file response in KiB/s.",
+        )
+        parser.add_argument("--burst-kib", type=int, default=4096)
+        parser.add_argument("--latency", type=float, default=0.05)
+        parser.add_argument("--segments", type=int, default=24)
+        parser.add_argument("--segment-kib", type=int, default=256)
+        parser.add_argument("--file-mib", type=int, default=24)
+
+    def handle(self, *args, **options):
+        server = ThrottlingServer(
+            {
+                "max_connections": options["max_connections"],
+                "rate": options["rate_kib"] * 1024,
+                "burst_rate": options["burst_rate_kib"] * 1024,
+                "burst_kib": options["burst_kib"],
+                "latency": options["latency"],
+                "segments": options["segments"],
+                "segment_kib": options["segment_kib"],
+                "file_mib": options["file_mib"],
+            }
+        )
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        try:
+            for name, path, setting in [
+                ("HLS", "/stream.m3u8", "concurrent_fragment_downloads"),
+                ("HTTP", "/file.mp4", "http_chunk_size"),
+            ]:
+                self.stdout.write(f"{name}: {'round':>5} {setting:>30} {'MiB/s':>8}")
+                self.benchmark(server.base_url + path, setting, options["rounds"])
+        finally:
+            server.shutdown()
+
+    def benchmark(self, url, setting, rounds):
+        tuner = AdaptiveDownloadTuner()
+        for round_number in range(1, rounds + 1):
+            temp_dir = tempfile.mkdtemp()
+            ydl_opts = {
+                "outtmpl": os.path.join(temp_dir, "%(id)s.%(ext)s"),
+                "quiet": True,
+                "no_warnings": True,
+                "noprogress": True,
+                "fixup": "never",
+                "retries": 10,
+                "fragment_retries": 10,
+            }
+            try:
+                with tuner.attach(yt_dlp.YoutubeDL(ydl_opts)) as ydl:
+                    started = time.monotonic()
+                    info_dict = ydl.extract_info(url)
+                    value = ydl.params[setting]
+                    elapsed = time.monotonic() - started
+                size = os.path.getsize(ydl.prepare_filename(info_dict))
+                self.stdout.write(
+                    f"      {round_number:>5} {value:>30} {size / MiB / elapsed:>8.2f}"
+                )
+            finally:
+                shutil.rmtree(temp_dir)
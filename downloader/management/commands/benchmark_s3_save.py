@@ -0,0 +1,108 @@
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import boto3
+from django.core.management.base import BaseCommand, CommandError
+
+from downloader.domain.s3_clients import clear_s3_clients
+from downloader.domain.save_media_strategies import s3_save_strategy
+
+BENCHMARK_CATALOGUE = "benchmark-s3-save"
+
+
+def save_with_new_client(filepath, bucket_name):
+    """Saves a file the way s3_save_strategy did before clients were shared."""
+    s3_client = boto3.client(
+        "s3",
+        endpoint_url=os.environ.get("S3_ENDPOINT_URL"),
+        region_name=os.environ.get("S3_REGION"),
+        aws_access_key_id=os.environ.get("S3_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.environ.get("S3_SECRET_ACCESS_KEY"),
+    )
+    s3_client.head_bucket(Bucket=bucket_name)
+    s3_client.upload_file(filepath, bucket_name, os.path.basename(filepath))
+    os.remove(filepath)
+
+
+def start_moto_server():
+    """Starts a local moto S3 server and points the S3_* variables at it."""
+    try:
+        from moto.server import ThreadedMotoServer
+    except ImportError:
+        raise CommandError(
+            "Set S3_ENDPOINT_URL or install moto[server] to run a local S3."
+        )
+    # Keeps the request log of the server out of the results
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    os.environ.update(
+        {
+            "S3_ENDPOINT_URL": f"http://{host}:{port}",
+            "S3_ACCESS_KEY_ID": "benchmark",
+            "S3_SECRET_ACCESS_KEY": "benchmark",
+            "S3_REGION": "us-east-1",
+        }
+    )
+    return server
+
+
+class Command(BaseCommand):
+    help = (
+        "Saves small files to S3 one at a time, as a streaming save does, "
+        "once with a new client and bucket check per file and once with "
+        "s3_save_strategy, and prints the time per file. Uses the S3 from "
+        "S3_ENDPOINT_URL, or a local moto server when it is not set."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--files", type=int, default=50)
+        parser.add_argument("--size-kib", type=int, default=64)
+
+    def handle(self, *args, **options):
+        server = None
+        if not os.environ.get("S3_ENDPOINT_URL"):
+            server = start_moto_server()
+
+        bucket_name = f"{os.environ.get('CATALOGUE_PREFIX', '')}{BENCHMARK_CATALOGUE}"
+        temp_dir = tempfile.mkdtemp()
+        try:
+            # Creates the bucket
+            self.save_all(temp_dir, options, lambda path: self.save(path))
+
+            clear_s3_clients()
+            before = self.save_all(
+                temp_dir, options, lambda path: save_with_new_client(path, bucket_name)
+            )
+            clear_s3_clients()
+            after = self.save_all(temp_dir, options, lambda path: self.save(path))
+        finally:
+            shutil.rmtree(temp_dir)
+            if server:
+                server.stop()
+
+        self.stdout.write(f"{'':>26} {'ms per file':>12}")
+        self.stdout.write(f"{'new client per file':>26} {before * 1000:>12.1f}")
+        self.stdout.write(f"{'shared client':>26} {after * 1000:>12.1f}")
+
+    def save(self, filepath):
+        result = s3_save_strategy([filepath], BENCHMARK_CATALOGUE)
+        if not result["success"]:
+            raise CommandError(result.get("error") or result.get("errors"))
+
+    def save_all(self, temp_dir, options, save):
+        """Returns the mean seconds save took per file."""
+        content = os.urandom(options["size_kib"] * 1024)
+        elapsed = 0
+        for index in range(options["files"]):
+            filepath = os.path.join(temp_dir, f"{index}.m4a")
+            with open(filepath, "wb") as file:
+                file.write(content)
+            started = time.perf_counter()
+            save(filepath)
+            elapsed += time.perf_counter() - started
+        return elapsed / options["files"]
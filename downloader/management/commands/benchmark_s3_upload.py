@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from downloader.domain.s3_clients import MiB
+from downloader.domain.save_media_strategies import s3_save_strategy
+
+from .benchmark_s3_save import start_moto_server
+
+BENCHMARK_CATALOGUE = "benchmark-s3-upload"
+
+
+def parse_list(value):
+    return [int(item) for item in value.split(",")]
+
+
+class Command(BaseCommand):
+    help = (
+        "Uploads a playlist worth of files with s3_save_strategy for every "
+        "combination of --workers and --chunk-mib and prints the aggregate "
+        "throughput. Uses the S3 from S3_ENDPOINT_URL, or a local moto server "
+        "when it is not set."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--files", type=int, default=16)
+        parser.add_argument("--size-mib", type=int, default=8)
+        parser.add_argument(
+            "--workers",
+            type=parse_list,
+            default=[1, 4],
+            help="Comma separated values of DOWNLOADER_SAVE_WORKERS.",
+        )
+        parser.add_argument(
+            "--chunk-mib",
+            type=parse_list,
+            default=[8, 16],
+            help="Comma separated multipart thresholds and chunk sizes.",
+        )
+        parser.add_argument(
+            "--max-concurrency",
+            type=int,
+            default=8,
+            help="Parts uploaded at once per file.",
+        )
+
+    def handle(self, *args, **options):
+        server = None
+        if not os.environ.get("S3_ENDPOINT_URL"):
+            server = start_moto_server()
+
+        temp_dir = tempfile.mkdtemp()
+        try:
+            self.stdout.write(f"{'workers':>8} {'chunk MiB':>10} {'MiB/s':>8}")
+            for workers in options["workers"]:
+                for chunk_mib in options["chunk_mib"]:
+                    with override_settings(
+                        DOWNLOADER_SAVE_WORKERS=workers,
+                        S3_MULTIPART_THRESHOLD=chunk_mib * MiB,
+                        S3_MULTIPART_CHUNKSIZE=chunk_mib * MiB,
+                        S3_MAX_CONCURRENCY=options["max_concurrency"],
+                    ):
+                        elapsed = self.upload(temp_dir, options)
+                    total_mib = options["files"] * options["size_mib"]
+                    self.stdout.write(
+                        f"{workers:>8} {chunk_mib:>10} {total_mib / elapsed:>8.1f}"
+                    )
+        finally:
+            shutil.rmtree(temp_dir)
+            if server:
+                server.stop()
+
+    def upload(self, temp_dir, options):
+        """Returns the seconds s3_save_strategy took for all files."""
+        content = os.urandom(options["size_mib"] * MiB)
+        filepath_list = []
+        for index in range(options["files"]):
+            filepath = os.path.join(temp_dir, f"{index}.mp4")
+            with open(filepath, "wb") as file:
+                file.write(content)
+            filepath_list.append(filepath)
+
+        started = time.perf_counter()
+        result = s3_save_strategy(filepath_list, BENCHMARK_CATALOGUE)
+        elapsed = time.perf_counter() - started
+        if not result["success"]:
+            raise CommandError(result.get("error") or result.get("errors"))
+        return elapsed
@@ -0,0 +1,101 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from downloader.models import DownloadTask
+from downloader.domain.task_model_services import PRIORITY_GAP
+from downloader.domain.task_state import TaskState
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures DownloadTask.save() cost for growing task tables. "
+        "Runs inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            nargs="+",
+            type=int,
+            default=[1_000, 10_000, 100_000, 1_000_000],
+            help="Numbers of tasks in the table to benchmark with.",
+        )
+        parser.add_argument(
+            "--pending-ratio",
+            type=float,
+            default=0.1,
+            help="Share of the generated tasks that are pending.",
+        )
+        parser.add_argument(
+            "--samples",
+            type=int,
+            default=50,
+            help="Number of saves measured per operation.",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'tasks':>10} {'insert ms':>10} {'move ms':>10} {'complete ms':>12}"
+        )
+        for size in options["sizes"]:
+            with transaction.atomic():
+                self.populate(size, options["pending_ratio"])
+                timings = self.measure(options["samples"])
+                transaction.set_rollback(True)
+
+            self.stdout.write(
+                f"{size:>10} {timings['insert']:>10.3f} "
+                f"{timings['move']:>10.3f} {timings['complete']:>12.3f}"
+            )
+
+    def populate(self, size, pending_ratio):
+        pending_count = int(size * pending_ratio)
+        now = timezone.now()
+        batch = []
+        for index in range(size):
+            is_pending = index < pending_count
+            batch.append(
+                DownloadTask(
+                    urls=f"https://example.com/{index}",
+                    state=(
+                        TaskState.PENDING.value
+                        if is_pending
+                        else TaskState.COMPLETED.value
+                    ),
+                    priority=(index + 1) * PRIORITY_GAP if is_pending else None,
+                    created_at=now,
+                )
+            )
+            if len(batch) == 10_000:
+                DownloadTask.objects.bulk_create(batch)
+                batch = []
+        DownloadTask.objects.bulk_create(batch)
+
+    def measure(self, samples):
+        timings = {}
+
+        started = time.perf_counter()
+        inserted = []
+        for index in range(samples):
+            task = DownloadTask(urls=f"https://example.com/new/{index}")
+            task.save()
+            inserted.append(task)
+        timings["insert"] = (time.perf_counter() - started) * 1000 / samples
+
+        # Each move lands on an occupied priority, forcing a shift
+        started = time.perf_counter()
+        for task in inserted:
+            task.priority = PRIORITY_GAP
+            task.save()
+        timings["move"] = (time.perf_counter() - started) * 1000 / samples
+
+        started = time.perf_counter()
+        for task in inserted:
+            task.state = TaskState.COMPLETED.value
+            task.save()
+        timings["complete"] = (time.perf_counter() - started) * 1000 / samples
+
+        return timings
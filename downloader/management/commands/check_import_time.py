@@ -0,0 +1,91 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Only Huey workers download and save, the web tier must not import these
+WORKER_ONLY_MODULES = ["yt_dlp", "boto3", "botocore"]
+
+STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+import {urlconf}
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    "elapsed": elapsed,
+    "worker_only": [name for name in {worker_only!r} if name in sys.modules],
+}}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the startup of a web process, Django setup with Huey task "
+        "autodiscovery plus the URLconf, in a fresh interpreter. Fails when "
+        "it imports yt_dlp, boto3 or botocore, or takes longer than --max-seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-seconds",
+            type=float,
+            default=1.0,
+            help="Startup time budget.",
+        )
+        parser.add_argument(
+            "--top",
+            type=int,
+            default=10,
+            help="Number of slowest top level imports to list.",
+        )
+
+    def handle(self, *args, **options):
+        script = STARTUP_SCRIPT.format(
+            urlconf=settings.ROOT_URLCONF, worker_only=WORKER_ONLY_MODULES
+        )
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", script],
+            capture_output=True,
+            text=True,
+            env=os.environ.copy(),
+        )
+        if process.returncode != 0:
+            raise CommandError(f"Startup failed:\n{process.stderr[-2000:]}")
+
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+
+        self.stdout.write(f"Startup: {result['elapsed'] * 1000:.0f} ms")
+        self.stdout.write(f"{'cumulative ms':>14}  module")
+        for cumulative, module in self.slowest_imports(process.stderr)[
+            : options["top"]
+        ]:
+            self.stdout.write(f"{cumulative / 1000:>14.1f}  {module}")
+
+        if result["worker_only"]:
+            raise CommandError(
+                f"Web startup imports worker only modules: "
+                f"{', '.join(result['worker_only'])}"
+            )
+        if result["elapsed"] > options["max_seconds"]:
+            raise CommandError(
+                f"Web startup took {result['elapsed']:.2f}s, "
+                f"more than {options['max_seconds']:.2f}s"
+            )
+
+    def slowest_imports(self, importtime_output):
+        """Returns (cumulative microseconds, module) of top level imports, slowest first."""
+        imports = []
+        for line in importtime_output.splitlines():
+            if not line.startswith("import time:") or "[us]" in line:
+                continue
+            _self_us, cumulative_us, module = line[len("import time:") :].split("|")
+            # Nested imports are indented below the module importing them
+            if module.startswith("  "):
+                continue
+            imports.append((int(cumulative_us), module.strip()))
+        return sorted(imports, reverse=True)
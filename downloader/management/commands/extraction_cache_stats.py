@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+
+from downloader.models import ExtractionCacheCounter, ExtractionCacheEntry
+from downloader.domain.extraction_cache import (
+    evict_extraction_cache,
+    flush_lookup_counts,
+)
+
+
+class Command(BaseCommand):
+    help = "Shows extraction cache hit and miss counters and the cache size."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Reset the hit and miss counters after printing them.",
+        )
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Delete every cached entry.",
+        )
+
+    def handle(self, *args, **options):
+        evict_extraction_cache()
+        flush_lookup_counts()
+
+        counters = dict(ExtractionCacheCounter.objects.values_list("name", "value"))
+        hits = counters.get("hit", 0)
+        misses = counters.get("miss", 0)
+        lookups = hits + misses
+        hit_ratio = hits / lookups * 100 if lookups else 0
+
+        entries = ExtractionCacheEntry.objects.aggregate(
+            count=Count("id"), size=Sum("size_bytes")
+        )
+
+        self.stdout.write(f"Hits: {hits}")
+        self.stdout.write(f"Misses: {misses}")
+        self.stdout.write(f"Hit ratio: {hit_ratio:.1f}%")
+        self.stdout.write(f"Entries: {entries['count']}")
+        self.stdout.write(f"Size: {(entries['size'] or 0) / 1024 / 1024:.1f} MiB")
+
+        if options["reset"]:
+            ExtractionCacheCounter.objects.all().delete()
+            self.stdout.write(self.style.SUCCESS("Counters reset."))
+        if options["clear"]:
+            ExtractionCacheEntry.objects.all().delete()
+            self.stdout.write(self.style.SUCCESS("Cache cleared."))
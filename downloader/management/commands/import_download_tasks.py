@@ -0,0 +1,59 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from downloader.domain.task_services import (
+    bulk_create_download_tasks,
+    parse_task_rows,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates download tasks in bulk from a JSONL or CSV file with urls, "
+        "download_strategy, save_strategy, catalogue_name, download_profile, "
+        "fan_out and incremental_sync columns."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="JSONL or CSV file to import.")
+        parser.add_argument(
+            "--format",
+            choices=["jsonl", "csv"],
+            help="File format, guessed from the file extension when omitted.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of tasks inserted per query.",
+        )
+
+    def handle(self, *args, **options):
+        file_format = options["format"] or (
+            "csv" if os.path.splitext(options["path"])[1].lower() == ".csv" else "jsonl"
+        )
+
+        try:
+            with open(options["path"], newline="", encoding="utf-8") as f:
+                result = bulk_create_download_tasks(
+                    parse_task_rows(f, file_format), options["batch_size"]
+                )
+        except OSError as e:
+            raise CommandError(f"Cannot read {options['path']}: {e}")
+        except UnicodeDecodeError as e:
+            raise CommandError(f"{options['path']} is not UTF-8 encoded text: {e}")
+
+        for error in result["errors"]:
+            self.stderr.write(error)
+
+        if not result["success"]:
+            raise CommandError("Import failed, no tasks were created.")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {result['created']} tasks, "
+                f"skipped {result['duplicates']} duplicates "
+                f"and {len(result['errors'])} invalid rows."
+            )
+        )
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:59
+
+from django.db import migrations, models
+
+
+def fix_enum_state_values(apps, schema_editor):
+    # Task states used to be saved as "TaskState.COMPLETED" instead of "COMPLETED"
+    DownloadTask = apps.get_model("downloader", "DownloadTask")
+    for state in ["PENDING", "IN_PROGRESS", "COMPLETED", "FAILED"]:
+        DownloadTask.objects.filter(state=f"TaskState.{state}").update(state=state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('downloader', '0011_alter_downloadtask_save_strategy'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='downloadtask',
+            index=models.Index(fields=['state', '-priority', 'created_at'], name='downloadtask_claim_idx'),
+        ),
+        migrations.RunPython(fix_enum_state_values, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.6 on 2026-10-18 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("downloader", "0012_downloadtask_downloadtask_claim_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="downloadtask",
+            name="lease_expires_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="downloadtask",
+            name="lease_owner",
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name="downloadtask",
+            name="reclaim_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
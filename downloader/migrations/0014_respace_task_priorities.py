@@ -0,0 +1,29 @@
+# Generated by Django 5.0.6 on 2026-10-18 15:01
+
+from django.db import migrations
+
+PRIORITY_GAP = 1024
+
+
+def respace_task_priorities(apps, schema_editor):
+    DownloadTask = apps.get_model("downloader", "DownloadTask")
+
+    DownloadTask.objects.exclude(state="PENDING").update(priority=None)
+
+    pending_tasks = list(
+        DownloadTask.objects.filter(state="PENDING").order_by("priority", "-created_at")
+    )
+    for index, task in enumerate(pending_tasks):
+        task.priority = (index + 1) * PRIORITY_GAP
+    DownloadTask.objects.bulk_update(pending_tasks, ["priority"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("downloader", "0013_downloadtask_lease_expires_at_and_more"),
+    ]
+
+    operations = [
+        migrations.RunPython(respace_task_priorities, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.0.6 on 2026-10-18 15:10
+
+import django.db.models.deletion
+import django.utils.timezone
+import downloader.domain.task_state
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("downloader", "0014_respace_task_priorities"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="downloadtask",
+            name="fan_out",
+            field=models.BooleanField(
+                default=False,
+                help_text="Download each URL or playlist entry as a separate item, so items run in parallel and only failed items are retried.",
+            ),
+        ),
+        migrations.CreateModel(
+            name="DownloadTaskItem",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("url", models.TextField()),
+                ("position", models.PositiveIntegerField()),
+                ("filename_prefix", models.CharField(blank=True, max_length=20)),
+                (
+                    "state",
+                    models.CharField(
+                        choices=downloader.domain.task_state.TaskState.choices,
+                        default="PENDING",
+                        max_length=20,
+                    ),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("error_message", models.TextField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "task",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="items",
+                        to="downloader.downloadtask",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["position"],
+                "indexes": [
+                    models.Index(
+                        fields=["task", "state", "attempts", "position"],
+                        name="downloadtaskitem_claim_idx",
+                    )
+                ],
+            },
+        ),
+    ]
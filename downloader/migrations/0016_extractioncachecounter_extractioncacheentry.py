@@ -0,0 +1,68 @@
+# Generated by Django 5.0.6 on 2026-10-18 15:13
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("downloader", "0015_downloadtask_fan_out_downloadtaskitem"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ExtractionCacheCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=20, unique=True)),
+                ("value", models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ExtractionCacheEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=64, unique=True)),
+                ("url", models.TextField()),
+                ("kind", models.CharField(max_length=10)),
+                ("extractor", models.CharField(blank=True, max_length=100)),
+                ("video_id", models.CharField(blank=True, max_length=255)),
+                ("info", models.JSONField()),
+                ("size_bytes", models.PositiveIntegerField(default=0)),
+                ("hit_count", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "last_used_at",
+                    models.DateTimeField(
+                        db_index=True, default=django.utils.timezone.now
+                    ),
+                ),
+                ("expires_at", models.DateTimeField(db_index=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["extractor", "video_id"],
+                        name="extractioncache_video_idx",
+                    )
+                ],
+            },
+        ),
+    ]
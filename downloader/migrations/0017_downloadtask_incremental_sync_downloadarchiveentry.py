@@ -0,0 +1,47 @@
+# Generated by Django 5.0.6 on 2026-10-18 15:16
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("downloader", "0016_extractioncachecounter_extractioncacheentry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DownloadArchiveEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("save_strategy", models.CharField(max_length=50)),
+                ("catalogue_name", models.CharField(blank=True, max_length=255)),
+                ("archive_id", models.CharField(max_length=255)),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="downloadtask",
+            name="incremental_sync",
+            field=models.BooleanField(
+                default=False,
+                help_text="Only download entries that are not in the catalogue yet, e.g. to keep a channel or playlist mirrored.",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="downloadarchiveentry",
+            constraint=models.UniqueConstraint(
+                fields=("save_strategy", "catalogue_name", "archive_id"),
+                name="downloadarchive_unique_entry",
+            ),
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 5.0.6 on 2026-10-18 15:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("downloader", "0017_downloadtask_incremental_sync_downloadarchiveentry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DownloadProfile",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, unique=True)),
+                (
+                    "concurrent_fragment_downloads",
+                    models.PositiveIntegerField(
+                        default=1,
+                        help_text="Number of fragments of HLS or DASH formats downloaded at once.",
+                    ),
+                ),
+                (
+                    "http_chunk_size",
+                    models.PositiveBigIntegerField(
+                        blank=True,
+                        help_text="Download plain HTTP formats in chunks of this many bytes.",
+                        null=True,
+                    ),
+                ),
+                (
+                    "buffersize",
+                    models.PositiveIntegerField(
+                        blank=True,
+                        help_text="Download buffer size in bytes.",
+                        null=True,
+                    ),
+                ),
+                (
+                    "ratelimit",
+                    models.PositiveBigIntegerField(
+                        blank=True,
+                        help_text="Maximum download rate in bytes per second.",
+                        null=True,
+                    ),
+                ),
+                ("retries", models.PositiveIntegerField(default=10)),
+                ("fragment_retries", models.PositiveIntegerField(default=10)),
+                (
+                    "max_height",
+                    models.PositiveIntegerField(
+                        blank=True,
+                        help_text="Prefer the best video format not taller than this, e.g. 1080.",
+                        null=True,
+                    ),
+                ),
+                (
+                    "max_filesize",
+                    models.PositiveBigIntegerField(
+                        blank=True,
+                        help_text="Skip formats larger than this many bytes.",
+                        null=True,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="downloadtask",
+            name="download_profile",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Leave empty to download with the default yt-dlp options.",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="tasks",
+                to="downloader.downloadprofile",
+            ),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.0.6 on 2026-10-18 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("downloader", "0018_downloadprofile_downloadtask_download_profile"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ExtractorTuning",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("extractor", models.CharField(max_length=100, unique=True)),
+                (
+                    "concurrent_fragment_downloads",
+                    models.PositiveIntegerField(default=1),
+                ),
+                ("fragment_bytes_per_second", models.FloatField(blank=True, null=True)),
+                ("http_chunk_size", models.PositiveBigIntegerField()),
+                ("http_bytes_per_second", models.FloatField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="downloadprofile",
+            name="adaptive_tuning",
+            field=models.BooleanField(
+                default=False,
+                help_text="Adjust concurrent fragment downloads and HTTP chunk size to the measured throughput, starting from the values chosen for the extractor by earlier tasks.",
+            ),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.0.6 on 2026-10-18 15:32
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("downloader", "0019_extractortuning_downloadprofile_adaptive_tuning"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MultipartUpload",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("endpoint_url", models.CharField(blank=True, max_length=255)),
+                ("bucket", models.CharField(max_length=255)),
+                ("key", models.CharField(max_length=1024)),
+                ("upload_id", models.CharField(max_length=1024)),
+                ("fingerprint", models.CharField(max_length=64)),
+                ("file_size", models.PositiveBigIntegerField()),
+                ("part_size", models.PositiveBigIntegerField()),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("updated_at", models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["bucket", "fingerprint"],
+                        name="multipartupload_file_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="MultipartUploadPart",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("part_number", models.PositiveIntegerField()),
+                ("etag", models.CharField(max_length=255)),
+                (
+                    "upload",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="parts",
+                        to="downloader.multipartupload",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="multipartuploadpart",
+            constraint=models.UniqueConstraint(
+                fields=("upload", "part_number"), name="multipartuploadpart_unique_part"
+            ),
+        ),
+    ]
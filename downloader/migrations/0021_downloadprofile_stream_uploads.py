@@ -0,0 +1,21 @@
+# Generated by Django 5.0.6 on 2026-10-18 15:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("downloader", "0020_multipartupload_multipartuploadpart_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="downloadprofile",
+            name="stream_uploads",
+            field=models.BooleanField(
+                default=False,
+                help_text="Upload formats that need no merging or postprocessing straight to storage while they are downloaded, without staging them on disk. Only for save strategies supporting it, e.g. S3.",
+            ),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.0.6 on 2026-10-18 15:42
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("downloader", "0021_downloadprofile_stream_uploads"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StoredMedia",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("save_strategy", models.CharField(max_length=50)),
+                ("catalogue_name", models.CharField(blank=True, max_length=255)),
+                ("file_name", models.CharField(max_length=1024)),
+                ("content_hash", models.CharField(max_length=64)),
+                ("size_bytes", models.PositiveBigIntegerField()),
+                ("archive_id", models.CharField(blank=True, max_length=255)),
+                ("variant", models.CharField(blank=True, max_length=100)),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["save_strategy", "content_hash"],
+                        name="storedmedia_content_idx",
+                    ),
+                    models.Index(
+                        fields=["save_strategy", "variant", "archive_id"],
+                        name="storedmedia_entry_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="storedmedia",
+            constraint=models.UniqueConstraint(
+                fields=("save_strategy", "catalogue_name", "file_name"),
+                name="storedmedia_unique_file",
+            ),
+        ),
+    ]
@@ -0,0 +1,164 @@
+# Generated by Django 5.0.6 on 2026-10-18 15:45
+
+import hashlib
+import json
+import re
+from urllib.parse import urlsplit, urlunsplit
+
+from django.db import migrations, models
+
+# A copy of downloader.domain.url_canonicalization as of this migration, so
+# later changes to it do not change what the migration does
+TRACKING_PARAMETERS = {
+    "fbclid",
+    "gclid",
+    "dclid",
+    "msclkid",
+    "igshid",
+    "mc_cid",
+    "mc_eid",
+}
+TRACKING_PARAMETER_PREFIXES = ("utm_",)
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# (extractor, pattern of host and path with query, canonical URL of the id)
+VIDEO_URL_PATTERNS = [
+    (
+        "youtube",
+        re.compile(
+            r"^(?:(?:www|m|music)\.)?youtube(?:-nocookie)?\.com/"
+            r"(?:watch\?(?:.*&)?v=|shorts/|embed/|live/|v/)"
+            r"(?P<id>[0-9A-Za-z_-]{11})(?:[/?&#]|$)"
+        ),
+        "https://www.youtube.com/watch?v={id}",
+    ),
+    (
+        "youtube",
+        re.compile(r"^youtu\.be/(?P<id>[0-9A-Za-z_-]{11})(?:[/?&#]|$)"),
+        "https://www.youtube.com/watch?v={id}",
+    ),
+    (
+        "vimeo",
+        re.compile(r"^(?:www\.|player\.)?vimeo\.com/(?:video/)?(?P<id>\d+)(?:[/?#]|$)"),
+        "https://vimeo.com/{id}",
+    ),
+    (
+        "dailymotion",
+        re.compile(
+            r"^(?:(?:www|m)\.)?(?:dailymotion\.com/video|dai\.ly)/"
+            r"(?P<id>x[0-9a-z]+)(?:[/?_#]|$)"
+        ),
+        "https://www.dailymotion.com/video/{id}",
+    ),
+]
+
+
+def is_tracking_parameter(parameter):
+    name = parameter.partition("=")[0]
+    return name in TRACKING_PARAMETERS or name.startswith(TRACKING_PARAMETER_PREFIXES)
+
+
+def canonicalize_url(url):
+    """
+    Returns the canonical form of url and the "<extractor> <video id>" of
+    the video it points to, like a download archive id, or None when it is
+    not a known video URL, e.g. a playlist. Only meant for comparing URLs,
+    the parameters of the query are kept as they are but sorted.
+    """
+    url = url.strip()
+    parts = urlsplit(url)
+    if parts.scheme.lower() not in DEFAULT_PORTS or not parts.hostname:
+        return url, None
+
+    host = parts.hostname.lower().rstrip(".")
+    query = [
+        parameter
+        for parameter in parts.query.split("&")
+        if parameter and not is_tracking_parameter(parameter)
+    ]
+    location = f"{host}{parts.path}?{'&'.join(query)}"
+    # Videos opened from a playlist download the playlist with playlist strategies
+    if not any(parameter.partition("=")[0] == "list" for parameter in query):
+        for extractor, pattern, canonical_form in VIDEO_URL_PATTERNS:
+            match = pattern.match(location)
+            if match:
+                video_id = match.group("id")
+                return canonical_form.format(id=video_id), f"{extractor} {video_id}"
+
+    if host.startswith("www."):
+        host = host[len("www.") :]
+    netloc = host
+    if parts.port and parts.port != DEFAULT_PORTS[parts.scheme.lower()]:
+        netloc = f"{host}:{parts.port}"
+    canonical = urlunsplit(
+        (
+            parts.scheme.lower(),
+            netloc,
+            parts.path or "/",
+            "&".join(sorted(query)),
+            parts.fragment,
+        )
+    )
+    return canonical, None
+
+
+def task_dedup_key(
+    urls, download_strategy, save_strategy, catalogue_name, download_profile_id=None
+):
+    """
+    Returns the key shared by tasks saving the same media the same way,
+    whichever URL forms they were submitted with.
+    """
+    media = sorted(
+        video_id or canonical
+        for canonical, video_id in (
+            canonicalize_url(url) for url in urls.splitlines() if url.strip()
+        )
+    )
+    key = [download_strategy, save_strategy, catalogue_name, download_profile_id, media]
+    return hashlib.sha256(json.dumps(key).encode()).hexdigest()
+
+
+def set_unfinished_task_dedup_keys(apps, schema_editor):
+    DownloadTask = apps.get_model("downloader", "DownloadTask")
+
+    tasks = list(DownloadTask.objects.filter(state__in=["PENDING", "IN_PROGRESS"]))
+    for task in tasks:
+        task.dedup_key = task_dedup_key(
+            task.urls,
+            task.download_strategy,
+            task.save_strategy,
+            task.catalogue_name,
+            task.download_profile_id,
+        )
+    DownloadTask.objects.bulk_update(tasks, ["dedup_key"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("downloader", "0022_storedmedia_storedmedia_storedmedia_unique_file"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="downloadtask",
+            name="coalesced_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Submissions of the same media attached to this task while it was unfinished.",
+            ),
+        ),
+        migrations.AddField(
+            model_name="downloadtask",
+            name="dedup_key",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name="downloadtask",
+            index=models.Index(
+                fields=["dedup_key", "state"], name="downloadtask_dedup_idx"
+            ),
+        ),
+        migrations.RunPython(set_unfinished_task_dedup_keys, migrations.RunPython.noop),
+    ]
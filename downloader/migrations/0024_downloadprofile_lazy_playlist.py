@@ -0,0 +1,24 @@
+# Generated by Django 5.0.6 on 2026-10-18 15:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        (
+            "downloader",
+            "0023_downloadtask_coalesced_count_downloadtask_dedup_key_and_more",
+        ),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="downloadprofile",
+            name="lazy_playlist",
+            field=models.BooleanField(
+                default=False,
+                help_text="Download playlist entries while the playlist is resolved, holding only a window of entries in memory, e.g. for channels with thousands of videos. Does not apply to fanned out tasks.",
+            ),
+        ),
+    ]
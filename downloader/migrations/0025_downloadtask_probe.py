@@ -0,0 +1,45 @@
+# Generated by Django 5.0.6 on 2026-10-18 15:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("downloader", "0024_downloadprofile_lazy_playlist"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="downloadtask",
+            name="entry_count",
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="downloadtask",
+            name="estimated_bytes",
+            field=models.BigIntegerField(
+                blank=True,
+                editable=False,
+                help_text="Size of the media the task downloads, estimated by its probe.",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="downloadtask",
+            name="media_duration",
+            field=models.FloatField(
+                blank=True, editable=False, help_text="Seconds of media.", null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="downloadtask",
+            name="media_format",
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name="downloadtask",
+            name="probed_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("downloader", "0025_downloadtask_probe"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="downloadtask",
+            name="priority",
+            field=models.BigIntegerField(default=0, null=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.6 on 2026-10-18 16:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("downloader", "0026_alter_downloadtask_priority"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="downloadprofile",
+            name="media_dedup",
+            field=models.BooleanField(
+                default=False,
+                help_text="Link or copy entries stored already by any task into the catalogue instead of downloading them, and files whose content is stored already instead of saving them again.",
+            ),
+        ),
+    ]
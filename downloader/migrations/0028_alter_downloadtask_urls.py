@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-18 16:20
+
+import downloader.domain.url_canonicalization
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("downloader", "0027_downloadprofile_media_dedup"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="downloadtask",
+            name="urls",
+            field=models.TextField(
+                blank=True,
+                help_text="Enter multiple URLs separated by commas or new lines.",
+                validators=[downloader.domain.url_canonicalization.validate_urls],
+            ),
+        ),
+    ]
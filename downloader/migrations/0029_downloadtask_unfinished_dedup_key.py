@@ -0,0 +1,57 @@
+# Generated by Django 5.0.6 on 2026-10-18 16:21
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def coalesce_unfinished_duplicates(apps, schema_editor):
+    """
+    Attaches unfinished tasks queued before coalescing to the task of their
+    dedup key that runs, or else was queued first. Duplicates still pending
+    fail with a note, running ones keep running without a dedup key.
+    """
+    DownloadTask = apps.get_model("downloader", "DownloadTask")
+
+    kept_task_ids = {}
+    for task_id, dedup_key, state in (
+        DownloadTask.objects.filter(state__in=["PENDING", "IN_PROGRESS"])
+        .exclude(dedup_key="")
+        .order_by("state", "created_at", "id")
+        .values_list("id", "dedup_key", "state")
+    ):
+        kept_task_id = kept_task_ids.setdefault(dedup_key, task_id)
+        if kept_task_id == task_id:
+            continue
+        if state == "PENDING":
+            DownloadTask.objects.filter(id=task_id).update(
+                state="FAILED",
+                priority=None,
+                error_message=f"Duplicate of task {kept_task_id}, attached to it.",
+            )
+        else:
+            DownloadTask.objects.filter(id=task_id).update(dedup_key="")
+        DownloadTask.objects.filter(id=kept_task_id).update(
+            coalesced_count=F("coalesced_count") + 1
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("downloader", "0028_alter_downloadtask_urls"),
+    ]
+
+    operations = [
+        migrations.RunPython(coalesce_unfinished_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="downloadtask",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(
+                    ("state__in", ["PENDING", "IN_PROGRESS"]),
+                    models.Q(("dedup_key", ""), _negated=True),
+                ),
+                fields=("dedup_key",),
+                name="downloadtask_unfinished_dedup_key",
+            ),
+        ),
+    ]
@@ -1,16 +1,14 @@
 from django.db import models, transaction
 from django.urls import reverse
 from django.utils import timezone
-from django.db.models import Max
 from django.core.validators import RegexValidator
 
-from .domain.download_media_strategies import MediaDownloadStrategies
-from .domain.save_media_strategies import MediaSaveStrategies
+from .domain.strategy_registry import MediaDownloadStrategies, MediaSaveStrategies
 from .domain.task_state import TaskState
+from .domain.url_canonicalization import task_dedup_key, validate_urls
 from .domain.task_model_services import (
-    reorder_priorities_to_updated_task,
-    reorder_task_priorities_after_unset,
-    clean_up_stale_priorities,
+    make_room_for_priority,
+    next_top_priority,
 )
 
 infrastructure_safe_characters_validator = RegexValidator(
@@ -19,9 +17,112 @@ infrastructure_safe_characters_validator = RegexValidator(
 )
 
 
+class DownloadProfile(models.Model):
+    """
+    yt-dlp options tuning how a task downloads, e.g. many concurrent
+    fragments for HLS sources or large HTTP chunks for single files.
+    Empty fields keep the yt-dlp defaults.
+    """
+
+    name = models.CharField(max_length=100, unique=True)
+    concurrent_fragment_downloads = models.PositiveIntegerField(
+        default=1,
+        help_text="Number of fragments of HLS or DASH formats downloaded at once.",
+    )
+    http_chunk_size = models.PositiveBigIntegerField(
+        blank=True,
+        null=True,
+        help_text="Download plain HTTP formats in chunks of this many bytes.",
+    )
+    buffersize = models.PositiveIntegerField(
+        blank=True, null=True, help_text="Download buffer size in bytes."
+    )
+    ratelimit = models.PositiveBigIntegerField(
+        blank=True, null=True, help_text="Maximum download rate in bytes per second."
+    )
+    retries = models.PositiveIntegerField(default=10)
+    fragment_retries = models.PositiveIntegerField(default=10)
+    max_height = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        help_text="Prefer the best video format not taller than this, e.g. 1080.",
+    )
+    max_filesize = models.PositiveBigIntegerField(
+        blank=True,
+        null=True,
+        help_text="Skip formats larger than this many bytes.",
+    )
+    adaptive_tuning = models.BooleanField(
+        default=False,
+        help_text="Adjust concurrent fragment downloads and HTTP chunk size to "
+        "the measured throughput, starting from the values chosen for the "
+        "extractor by earlier tasks.",
+    )
+    stream_uploads = models.BooleanField(
+        default=False,
+        help_text="Upload formats that need no merging or postprocessing "
+        "straight to storage while they are downloaded, without staging them "
+        "on disk. Only for save strategies supporting it, e.g. S3.",
+    )
+    lazy_playlist = models.BooleanField(
+        default=False,
+        help_text="Download playlist entries while the playlist is resolved, "
+        "holding only a window of entries in memory, e.g. for channels with "
+        "thousands of videos. Does not apply to fanned out tasks.",
+    )
+    media_dedup = models.BooleanField(
+        default=False,
+        help_text="Link or copy entries stored already by any task into the "
+        "catalogue instead of downloading them, and files whose content is "
+        "stored already instead of saving them again.",
+    )
+
+    def __str__(self):
+        return self.name
+
+    def ydl_overrides(self):
+        """Returns the yt-dlp options of this profile."""
+        overrides = {
+            "concurrent_fragment_downloads": self.concurrent_fragment_downloads,
+            "retries": self.retries,
+            "fragment_retries": self.fragment_retries,
+        }
+        if self.http_chunk_size:
+            overrides["http_chunk_size"] = self.http_chunk_size
+        if self.buffersize:
+            overrides["buffersize"] = self.buffersize
+        if self.ratelimit:
+            overrides["ratelimit"] = self.ratelimit
+        if self.max_height:
+            overrides["format_sort"] = [f"res:{self.max_height}"]
+        if self.max_filesize:
+            overrides["max_filesize"] = self.max_filesize
+        if self.lazy_playlist:
+            overrides["lazy_playlist"] = True
+        return overrides
+
+
+class ExtractorTuning(models.Model):
+    """
+    The download settings adaptive tuning chose for an extractor, and the
+    throughput they achieved.
+    """
+
+    extractor = models.CharField(max_length=100, unique=True)
+    concurrent_fragment_downloads = models.PositiveIntegerField(default=1)
+    fragment_bytes_per_second = models.FloatField(blank=True, null=True)
+    http_chunk_size = models.PositiveBigIntegerField()
+    http_bytes_per_second = models.FloatField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Tuning for {self.extractor}"
+
+
 class DownloadTask(models.Model):
     urls = models.TextField(
         blank=True,
+        validators=[validate_urls],
         help_text="Enter multiple URLs separated by commas or new lines.",
     )
     download_strategy = models.CharField(
@@ -34,10 +135,18 @@ class DownloadTask(models.Model):
         choices=MediaSaveStrategies.choices(),
         default=MediaSaveStrategies.LOCAL_FILESYSTEM.value,
     )
+    download_profile = models.ForeignKey(
+        DownloadProfile,
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name="tasks",
+        help_text="Leave empty to download with the default yt-dlp options.",
+    )
     state = models.CharField(
         max_length=20, choices=TaskState.choices, default=TaskState.PENDING.value
     )
-    priority = models.IntegerField(default=0, null=True)
+    priority = models.BigIntegerField(default=0, null=True)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     error_message = models.TextField(blank=True, null=True)
@@ -47,9 +156,58 @@ class DownloadTask(models.Model):
         validators=[infrastructure_safe_characters_validator],
         help_text="Only letters, numbers, underscores, and hyphens are allowed.",
     )
+    fan_out = models.BooleanField(
+        default=False,
+        help_text="Download each URL or playlist entry as a separate item, "
+        "so items run in parallel and only failed items are retried.",
+    )
+    incremental_sync = models.BooleanField(
+        default=False,
+        help_text="Only download entries that are not in the catalogue yet, "
+        "e.g. to keep a channel or playlist mirrored.",
+    )
+    lease_owner = models.CharField(max_length=255, blank=True)
+    lease_expires_at = models.DateTimeField(blank=True, null=True)
+    reclaim_count = models.PositiveIntegerField(default=0)
+    dedup_key = models.CharField(max_length=64, blank=True, editable=False)
+    coalesced_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Submissions of the same media attached to this task "
+        "while it was unfinished.",
+    )
+    estimated_bytes = models.BigIntegerField(
+        blank=True,
+        null=True,
+        editable=False,
+        help_text="Size of the media the task downloads, estimated by its probe.",
+    )
+    media_duration = models.FloatField(
+        blank=True, null=True, editable=False, help_text="Seconds of media."
+    )
+    media_format = models.CharField(max_length=255, blank=True, editable=False)
+    entry_count = models.PositiveIntegerField(blank=True, null=True, editable=False)
+    probed_at = models.DateTimeField(blank=True, null=True, editable=False)
 
     class Meta:
         ordering = ["-priority", "created_at"]
+        indexes = [
+            models.Index(
+                fields=["state", "-priority", "created_at"],
+                name="downloadtask_claim_idx",
+            ),
+            models.Index(fields=["dedup_key", "state"], name="downloadtask_dedup_idx"),
+        ]
+        constraints = [
+            # Submissions racing each other are coalesced, not queued twice
+            models.UniqueConstraint(
+                fields=["dedup_key"],
+                condition=models.Q(
+                    state__in=[TaskState.PENDING.value, TaskState.IN_PROGRESS.value]
+                )
+                & ~models.Q(dedup_key=""),
+                name="downloadtask_unfinished_dedup_key",
+            ),
+        ]
 
     def __str__(self):
         return f"Task {self.id}: {self.urls}"
@@ -57,37 +215,227 @@ class DownloadTask(models.Model):
     def get_absolute_url(self):
         return reverse("view_task", kwargs={"pk": self.pk})
 
-    @transaction.atomic
-    def delete(self, *args, **kwargs):
-        super().delete(*args, **kwargs)
-        reorder_task_priorities_after_unset()
+    def refresh_dedup_key(self):
+        """Sets dedup_key from the URLs and what the task saves them as."""
+        self.dedup_key = task_dedup_key(
+            self.urls,
+            self.download_strategy,
+            self.save_strategy,
+            self.catalogue_name,
+            self.download_profile_id,
+        )
+
+    def clear_probe(self):
+        """Forgets the estimates of the probe of the task."""
+        self.estimated_bytes = None
+        self.media_duration = None
+        self.media_format = ""
+        self.entry_count = None
+        self.probed_at = None
 
     @transaction.atomic
     def save(self, *args, **kwargs):
-        clean_up_stale_priorities()
         is_new = self._state.adding
         is_pending = self.state == TaskState.PENDING.value
-        new_priority = self.priority
-
-        if is_new and is_pending:
-            new_priority = (
-                DownloadTask.objects.filter(state=TaskState.PENDING.value).aggregate(
-                    Max("priority")
-                )["priority__max"]
-                or 0
-            ) + 1
 
         if not is_pending:
-            new_priority = None
+            self.priority = None
+        elif is_new or self.priority is None:
+            self.priority = next_top_priority()
+        else:
+            self.priority = max(self.priority, 1)
+        dedup_key = self.dedup_key
+        self.refresh_dedup_key()
+        if not is_new and self.dedup_key != dedup_key:
+            # The task downloads something else now, so it is probed again
+            self.clear_probe()
 
-        self.priority = new_priority
         super().save(*args, **kwargs)
 
         if not is_new and is_pending:
-            reorder_priorities_to_updated_task(self)
+            make_room_for_priority(self)
 
-        if not is_pending:
-            reorder_task_priorities_after_unset()
+
+class DownloadTaskItem(models.Model):
+    """
+    A single URL or playlist entry of a fanned out DownloadTask.
+    """
+
+    task = models.ForeignKey(
+        DownloadTask, on_delete=models.CASCADE, related_name="items"
+    )
+    url = models.TextField()
+    position = models.PositiveIntegerField()
+    filename_prefix = models.CharField(max_length=20, blank=True)
+    state = models.CharField(
+        max_length=20, choices=TaskState.choices, default=TaskState.PENDING.value
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    error_message = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["position"]
+        indexes = [
+            models.Index(
+                fields=["task", "state", "attempts", "position"],
+                name="downloadtaskitem_claim_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Item {self.position} of task {self.task_id}: {self.url}"
+
+
+class DownloadArchiveEntry(models.Model):
+    """
+    Records that an entry, identified by its yt-dlp download archive id,
+    was saved to a catalogue of a save strategy.
+    """
+
+    save_strategy = models.CharField(max_length=50)
+    catalogue_name = models.CharField(max_length=255, blank=True)
+    archive_id = models.CharField(max_length=255)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["save_strategy", "catalogue_name", "archive_id"],
+                name="downloadarchive_unique_entry",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.archive_id} in {self.save_strategy}:{self.catalogue_name}"
+
+
+class StoredMedia(models.Model):
+    """
+    A file saved to a catalogue of a save strategy, indexed by the hash of
+    its content and by the download archive id of its entry, so the same
+    media is linked or copied in storage instead of being saved again.
+    The variant tells what was downloaded of the entry, e.g. audio or video.
+    """
+
+    save_strategy = models.CharField(max_length=50)
+    catalogue_name = models.CharField(max_length=255, blank=True)
+    file_name = models.CharField(max_length=1024)
+    content_hash = models.CharField(max_length=64)
+    size_bytes = models.PositiveBigIntegerField()
+    archive_id = models.CharField(max_length=255, blank=True)
+    variant = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["save_strategy", "catalogue_name", "file_name"],
+                name="storedmedia_unique_file",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["save_strategy", "content_hash"],
+                name="storedmedia_content_idx",
+            ),
+            models.Index(
+                fields=["save_strategy", "variant", "archive_id"],
+                name="storedmedia_entry_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.file_name} in {self.save_strategy}:{self.catalogue_name}"
+
+
+class ExtractionCacheEntry(models.Model):
+    """
+    Metadata returned by yt-dlp extract_info for a URL, reused until it expires.
+    """
+
+    key = models.CharField(max_length=64, unique=True)
+    url = models.TextField()
+    kind = models.CharField(max_length=10)
+    extractor = models.CharField(max_length=100, blank=True)
+    video_id = models.CharField(max_length=255, blank=True)
+    info = models.JSONField()
+    size_bytes = models.PositiveIntegerField(default=0)
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["extractor", "video_id"], name="extractioncache_video_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Cached {self.kind} info for {self.url}"
+
+
+class ExtractionCacheCounter(models.Model):
+    """
+    Counts extraction cache hits and misses across all workers.
+    """
+
+    name = models.CharField(max_length=20, unique=True)
+    value = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+
+class MultipartUpload(models.Model):
+    """
+    An S3 multipart upload in progress, kept so an upload of the same file
+    interrupted by a worker restart continues with the parts still missing.
+    """
+
+    endpoint_url = models.CharField(max_length=255, blank=True)
+    bucket = models.CharField(max_length=255)
+    key = models.CharField(max_length=1024)
+    upload_id = models.CharField(max_length=1024)
+    fingerprint = models.CharField(max_length=64)
+    file_size = models.PositiveBigIntegerField()
+    part_size = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["bucket", "fingerprint"], name="multipartupload_file_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Upload of {self.key} to {self.bucket}"
+
+
+class MultipartUploadPart(models.Model):
+    """A part of a multipart upload that S3 confirmed with its ETag."""
+
+    upload = models.ForeignKey(
+        MultipartUpload, on_delete=models.CASCADE, related_name="parts"
+    )
+    part_number = models.PositiveIntegerField()
+    etag = models.CharField(max_length=255)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["upload", "part_number"],
+                name="multipartuploadpart_unique_part",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Part {self.part_number} of {self.upload}"
 
 
 class TaskExecutionWindow(models.Model):
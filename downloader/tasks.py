@@ -1,21 +1,137 @@
-from huey.contrib.djhuey import db_task, periodic_task
+import logging
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from huey.contrib.djhuey import db_task, periodic_task, on_commit_task, lock_task
 from huey import crontab
+from huey.exceptions import RetryTask, TaskLockedException
 from django.utils import timezone
-from django.db import transaction, DatabaseError, IntegrityError
+from django.db import DatabaseError, IntegrityError
 from django.core.exceptions import ValidationError
 from .models import DownloadTask, TaskExecutionWindow
 from .domain.task_state import TaskState
-from .domain.save_media_strategies import MediaSaveStrategies
-from .domain.download_media_strategies import MediaDownloadStrategies
+from .domain.strategy_registry import MediaDownloadStrategies, MediaSaveStrategies
+from .domain.task_dispatch_services import claim_tasks_for_dispatch
+from .domain.streaming_save import StreamingSaver
+from .domain.download_archive import DownloadArchive
+from .domain.extraction_cache import evict_extraction_cache, flush_lookup_counts
+from .domain.media_index import DedupArchive, MediaIndex
+from .domain.task_item_services import (
+    claim_next_task_item,
+    finish_task_item,
+    prepare_task_items,
+    task_items_outcome,
+)
+from .domain.task_lease_services import (
+    LeaseLostError,
+    TaskLeaseHeartbeat,
+    acquire_task_lease,
+    reclaim_expired_tasks,
+    release_task_lease,
+    worker_lease_owner,
+)
+
+logger = logging.getLogger("downloader")
+
+# Created at import time so the consumer can flush it after a crash
+dispatch_lock = lock_task("dispatch-download-tasks")
+probe_lock = lock_task("probe-pending-tasks")
 
 
 @periodic_task(crontab(minute="*"))
 def process_tasks_in_window():
     """
     Periodic task that runs every minute.
-    Checks if the current time is within the allowed window.
-    If it is, processes one task with the highest priority.
+    Safety net for the event driven dispatch, in case an event was missed
+    or a task execution window has just opened.
+    """
+    try:
+        dispatch_pending_tasks()
+    except TaskLockedException:
+        # An event driven dispatch is running, it dispatches what this would
+        return
+
+
+@periodic_task(crontab(minute="15"))
+def abort_stale_uploads():
+    """
+    Periodic task that runs every hour.
+    Aborts S3 multipart uploads no retry continued, so S3 drops their parts.
+    """
+    # Imports boto3, which only workers need
+    from .domain.resumable_upload import abort_stale_multipart_uploads
+
+    abort_stale_multipart_uploads()
+
+
+@periodic_task(crontab(minute="*/5"))
+def evict_extraction_cache_entries():
+    """
+    Periodic task that runs every five minutes.
+    Evicts expired and least recently used extraction cache entries, rather
+    than every store of an entry, and writes the lookups counted meanwhile.
+    """
+    evict_extraction_cache()
+    flush_lookup_counts()
+
+
+@periodic_task(crontab(minute="*"))
+def probe_pending_tasks():
+    """
+    Periodic task that runs every minute.
+    Estimates the size of pending tasks not probed yet, the next to be
+    dispatched first, so the dispatcher can keep within its byte budget.
+    """
+    if not settings.TASK_PROBE_BATCH_SIZE:
+        return
+    # Imports yt_dlp, which only workers need
+    from .domain.task_probe import probe_task
+
+    try:
+        with probe_lock:
+            tasks = DownloadTask.objects.select_related("download_profile").filter(
+                state=TaskState.PENDING.value, probed_at__isnull=True
+            )[: settings.TASK_PROBE_BATCH_SIZE]
+            for task in tasks:
+                try:
+                    probe = probe_task(
+                        task.urls,
+                        task.download_strategy,
+                        task_ydl_overrides(task),
+                        task_incremental_archive(task),
+                    )
+                except ValueError as e:
+                    # E.g. an unknown strategy, the task fails when it runs
+                    logger.error(f"Failed to probe task {task.id}: {e}")
+                    probe = {"success": False, "error": str(e)}
+                record_task_probe(task, probe)
+    except TaskLockedException:
+        # The previous run is still probing
+        return
+
+
+@on_commit_task()
+def dispatch_download_tasks():
+    """
+    Dispatches pending tasks right away, enqueued once the surrounding
+    transaction commits. Called whenever a task is created or finishes.
+    """
+    try:
+        dispatch_pending_tasks()
+    except TaskLockedException:
+        raise RetryTask(delay=1)
+
+
+def dispatch_pending_tasks():
+    """
+    Returns tasks with expired leases to the queue, then checks if the
+    current time is within the allowed window.
+    If it is, dispatches as many pending tasks as the concurrency limits allow.
     """
+    reclaim_expired_tasks()
+
     task_execution_window = TaskExecutionWindow.get_current_window()
     if not task_execution_window:
         return
@@ -27,20 +143,9 @@ def process_tasks_in_window():
     ):
         return
 
-    in_progress_exists = DownloadTask.objects.filter(
-        state=TaskState.IN_PROGRESS.value
-    ).exists()
-    if in_progress_exists:
-        return
-
-    task = (
-        DownloadTask.objects.filter(state=TaskState.PENDING.value)
-        .order_by("-priority", "created_at")
-        .first()
-    )
-
-    if task:
-        process_download_and_save_task(task.id)
+    with dispatch_lock:
+        for task_id, dispatch_owner in claim_tasks_for_dispatch():
+            process_download_and_save_task(task_id, dispatch_owner)
 
 
 def is_within_time_window(current_time, start_time, end_time):
@@ -51,19 +156,37 @@ def is_within_time_window(current_time, start_time, end_time):
 
 
 @db_task()
-def process_download_and_save_task(task_id):
+def process_download_and_save_task(task_id, dispatch_owner):
+    lease_owner = worker_lease_owner()
     try:
-        with transaction.atomic():
-            task = DownloadTask.objects.get(id=task_id)
-            if task.state != TaskState.PENDING.value:
-                return
-            task.state = TaskState.IN_PROGRESS
-            task.error_message = ""
-            task.save()
+        if not acquire_task_lease(task_id, dispatch_owner, lease_owner):
+            return
+        task = DownloadTask.objects.select_related("download_profile").get(id=task_id)
     except (DownloadTask.DoesNotExist, DatabaseError, IntegrityError) as _e:
         return
 
+    heartbeat = TaskLeaseHeartbeat(task.id, lease_owner)
+    heartbeat.start()
+
     try:
+        fan_out_func, _ = MediaDownloadStrategies.get_fan_out_functions(
+            task.download_strategy
+        )
+        if task.fan_out and fan_out_func:
+            # Every item is deduplicated when it is downloaded
+            fan_out_result = prepare_task_items(
+                task, fan_out_func, task_incremental_archive(task)
+            )
+            if not fan_out_result.get("success"):
+                raise DownloadError(
+                    fan_out_result.get("error", "Unknown error during fan-out.")
+                )
+
+            for _ in range(settings.DOWNLOADER_MAX_CONCURRENT_ITEMS_PER_TASK - 1):
+                process_task_items(task.id, lease_owner)
+            # This worker runs items too, so the lease is renewed while others queue
+            process_task_items.call_local(task.id, lease_owner)
+            return
 
         download_strategy_func = MediaDownloadStrategies.get_strategy_function(
             task.download_strategy
@@ -71,40 +194,235 @@ def process_download_and_save_task(task_id):
         if not download_strategy_func:
             raise ValueError(f"Unknown download strategy: {task.download_strategy}")
 
-        download_result = download_strategy_func(task.urls)
+        download_and_save(download_strategy_func, task.urls, task, heartbeat)
 
-        if not download_result.get("success"):
-            raise DownloadError(
-                download_result.get("error", "Unknown error during download.")
-            )
+        release_task_lease(task.id, lease_owner, TaskState.COMPLETED.value)
+
+    except (DownloadError, SaveError, ValueError) as e:
+        release_task_lease(task.id, lease_owner, TaskState.FAILED.value, str(e))
+    except (DatabaseError, IntegrityError, ValidationError) as e:
+        release_task_lease(
+            task.id, lease_owner, TaskState.FAILED.value, f"Database error: {str(e)}"
+        )
+    finally:
+        heartbeat.stop()
+
+    dispatch_download_tasks()
+
+
+@db_task()
+def process_task_items(task_id, lease_owner):
+    """
+    Downloads and saves pending items of a fanned out task one by one.
+    Several of these run per task, the last one to finish completes the task.
+    """
+    try:
+        task = DownloadTask.objects.select_related("download_profile").get(id=task_id)
+    except (DownloadTask.DoesNotExist, DatabaseError) as _e:
+        return
 
-        file_paths = download_result.get("file_paths", [])
+    _, item_strategy_func = MediaDownloadStrategies.get_fan_out_functions(
+        task.download_strategy
+    )
+    heartbeat = TaskLeaseHeartbeat(task.id, lease_owner)
+    heartbeat.start()
+
+    try:
+        while not heartbeat.lost:
+            item = claim_next_task_item(task.id)
+            if item is None:
+                break
 
-        save_strategy_func = MediaSaveStrategies.get_strategy_function(
-            task.save_strategy
+            try:
+                download_and_save(
+                    item_strategy_func,
+                    item.url,
+                    task,
+                    heartbeat,
+                    filename_prefix=item.filename_prefix,
+                )
+                finish_task_item(item)
+            except (DownloadError, SaveError, ValueError) as e:
+                # The item is queued again by whoever took over the task
+                if not heartbeat.lost:
+                    finish_task_item(item, str(e))
+            except (DatabaseError, IntegrityError, ValidationError) as e:
+                finish_task_item(item, f"Database error: {str(e)}")
+    finally:
+        heartbeat.stop()
+
+    outcome = task_items_outcome(task.id)
+    if outcome is None:
+        return
+
+    failed_count, item_count = outcome
+    if failed_count:
+        release_task_lease(
+            task.id,
+            lease_owner,
+            TaskState.FAILED.value,
+            f"{failed_count} of {item_count} items failed.",
         )
-        if not save_strategy_func:
-            raise ValueError(f"Unknown save strategy: {task.save_strategy}")
+    else:
+        release_task_lease(task.id, lease_owner, TaskState.COMPLETED.value)
+
+    dispatch_download_tasks()
+
 
-        save_result = save_strategy_func(file_paths, task.catalogue_name)
+def task_download_archive(task):
+    """
+    Returns the download archive yt-dlp skips entries with. With media dedup
+    it skips entries stored anywhere, to be placed into the catalogue after
+    the download, and entries of the catalogue archive when the task only
+    syncs entries missing from the catalogue. Returns None when nothing is
+    skipped.
+    """
+    download_archive = DownloadArchive(task.save_strategy, task.catalogue_name)
+    media_index = task_media_index(task)
+    if media_index is not None:
+        return DedupArchive(media_index, download_archive, task.incremental_sync)
+    if not task.incremental_sync:
+        return None
+    return download_archive
 
-        if not save_result.get("success"):
-            raise SaveError(save_result.get("error", "Unknown error during saving."))
 
-        with transaction.atomic():
-            task.state = TaskState.COMPLETED
-            task.save()
+def task_incremental_archive(task):
+    """
+    Returns the archive of the entries the task skips as incremental sync,
+    unlike task_download_archive without stored media, or None.
+    """
+    if not task.incremental_sync:
+        return None
+    return DownloadArchive(task.save_strategy, task.catalogue_name)
 
-    except (DownloadError, SaveError, ValueError) as e:
-        with transaction.atomic():
-            task.state = TaskState.FAILED
-            task.error_message = str(e)
-            task.save()
-    except (DatabaseError, IntegrityError, ValidationError) as e:
-        with transaction.atomic():
-            task.state = TaskState.FAILED
-            task.error_message = f"Database error: {str(e)}"
-            task.save()
+
+def record_task_probe(task, probe):
+    """
+    Stores the estimates of a probe on the task, unless it was changed to
+    download something else meanwhile. Failed probes are recorded without
+    estimates, so they are not repeated.
+    """
+    DownloadTask.objects.filter(id=task.id, dedup_key=task.dedup_key).update(
+        estimated_bytes=probe.get("estimated_bytes"),
+        media_duration=probe.get("media_duration"),
+        media_format=probe.get("media_format", ""),
+        entry_count=probe.get("entry_count"),
+        probed_at=timezone.now(),
+    )
+
+
+def task_media_index(task):
+    """
+    Returns the index of the media stored with the save strategy of the
+    task, as the variant the task downloads, or None unless MEDIA_DEDUP or
+    the download profile of the task enables media dedup.
+    """
+    profile = task.download_profile
+    if not settings.MEDIA_DEDUP and (profile is None or not profile.media_dedup):
+        return None
+    # Entries of a playlist are stored like single entries of its item strategy
+    variant = MediaDownloadStrategies.get_item_strategy(task.download_strategy)
+    if profile is not None and profile.max_height:
+        variant = f"{variant}@{profile.max_height}"
+    return MediaIndex(task.save_strategy, variant)
+
+
+def task_ydl_overrides(task):
+    """Returns the yt-dlp options of the download profile of the task, if any."""
+    if task.download_profile is None:
+        return None
+    return task.download_profile.ydl_overrides()
+
+
+def task_adaptive_tuner(task):
+    """Returns a tuner when the download profile of the task enables adaptive tuning."""
+    profile = task.download_profile
+    if profile is None or not profile.adaptive_tuning:
+        return None
+    # Imports yt_dlp, which only workers need
+    from .domain.adaptive_tuning import AdaptiveDownloadTuner
+
+    return AdaptiveDownloadTuner(
+        profile.concurrent_fragment_downloads, profile.http_chunk_size
+    )
+
+
+def task_stream_save_func(task):
+    """
+    Returns the function saving streamed files when the download profile of
+    the task enables streaming uploads and its save strategy supports them.
+    """
+    profile = task.download_profile
+    if profile is None or not profile.stream_uploads:
+        return None
+    return MediaSaveStrategies.get_stream_strategy_function(task.save_strategy)
+
+
+def make_staging_dir(task):
+    """
+    Creates the directory the strategies download into, on the filesystem
+    the save strategy prefers, e.g. next to the catalogues for local saves.
+    """
+    staging_root = MediaSaveStrategies.get_staging_dir(task.save_strategy)
+    if staging_root:
+        os.makedirs(staging_root, exist_ok=True)
+    return tempfile.mkdtemp(prefix=f"task-{task.id}-", dir=staging_root)
+
+
+def download_and_save(download_strategy_func, urls, task, heartbeat, **options):
+    """
+    Downloads urls with the given strategy function and saves every file
+    with the save strategy of the task as soon as it is downloaded.
+    Saved entries are always recorded in the download archive of the catalogue,
+    so a later incremental sync skips them.
+    Raises DownloadError or SaveError, DownloadError also once the lease is lost.
+    """
+    save_strategy_func = MediaSaveStrategies.get_strategy_function(task.save_strategy)
+    if not save_strategy_func:
+        raise ValueError(f"Unknown save strategy: {task.save_strategy}")
+
+    saver = StreamingSaver(
+        save_strategy_func,
+        task.catalogue_name,
+        heartbeat,
+        download_archive=DownloadArchive(task.save_strategy, task.catalogue_name),
+        max_workers=settings.DOWNLOADER_SAVE_WORKERS,
+        stream_save_func=task_stream_save_func(task),
+        media_index=task_media_index(task),
+    )
+    download_archive = task_download_archive(task)
+    adaptive_tuner = task_adaptive_tuner(task)
+    staging_dir = make_staging_dir(task)
+    try:
+        download_result = download_strategy_func(
+            urls,
+            heartbeat,
+            on_file_ready=saver.submit,
+            download_archive=download_archive,
+            ydl_overrides=task_ydl_overrides(task),
+            adaptive_tuner=adaptive_tuner,
+            staging_dir=staging_dir,
+            stream_file=saver.save_stream if saver.stream_save_func else None,
+            **options,
+        )
+        if isinstance(download_archive, DedupArchive):
+            saver.place_stored(download_archive)
+    except LeaseLostError as e:
+        raise DownloadError(str(e)) from e
+    finally:
+        save_errors = saver.close()
+        # Whatever the strategies left behind, e.g. empty download directories
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        if adaptive_tuner is not None:
+            adaptive_tuner.save()
+
+    if not download_result.get("success"):
+        raise DownloadError(
+            download_result.get("error", "Unknown error during download.")
+        )
+
+    if save_errors:
+        raise SaveError("; ".join(save_errors))
 
 
 class DownloadError(Exception):
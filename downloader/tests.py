@@ -1,3 +1,775 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .domain import extraction_cache, task_probe, task_services
+from .domain.download_archive import DownloadArchive
+from .domain.media_index import DedupArchive, MediaIndex
+from .domain.save_media_strategies import (
+    BASE_LOCAL_DIRECTORY,
+    local_filesystem_save_strategy,
+)
+from .domain.strategy_registry import MediaSaveStrategies
+from .domain.streaming_save import StreamingSaver
+from .domain.task_dispatch_services import (
+    claim_next_pending_task,
+    claim_tasks_for_dispatch,
+)
+from .domain.task_lease_services import (
+    LeaseLostError,
+    TaskLeaseHeartbeat,
+    reclaim_expired_tasks,
+    renew_task_lease,
+)
+from .domain.task_state import TaskState
+from .domain.task_services import (
+    bulk_create_download_tasks,
+    create_and_enqueue_download_task,
+    parse_task_rows,
+)
+from .domain.url_canonicalization import canonicalize_url, task_dedup_key
+from .models import (
+    DownloadArchiveEntry,
+    DownloadProfile,
+    DownloadTask,
+    DownloadTaskItem,
+    ExtractionCacheCounter,
+    ExtractionCacheEntry,
+    StoredMedia,
+)
+from .tasks import (
+    DownloadError,
+    dispatch_lock,
+    evict_extraction_cache_entries,
+    probe_pending_tasks,
+    process_task_items,
+    process_tasks_in_window,
+    task_media_index,
+)
+
+LOCAL_SAVE = MediaSaveStrategies.LOCAL_FILESYSTEM.value
+S3_SAVE = MediaSaveStrategies.S3_SAVE.value
+
+
+def make_temp_dir(test_case):
+    path = tempfile.mkdtemp()
+    test_case.addCleanup(shutil.rmtree, path, ignore_errors=True)
+    return path
+
+
+def create_task(name, **fields):
+    return DownloadTask.objects.create(
+        urls=f"https://example.com/{name}.mp4", catalogue_name="tasks", **fields
+    )
+
+
+def lease_task(task, lease_owner="worker", expires_in=600):
+    DownloadTask.objects.filter(id=task.id).update(
+        state=TaskState.IN_PROGRESS.value,
+        priority=None,
+        lease_owner=lease_owner,
+        lease_expires_at=timezone.now() + timedelta(seconds=expires_in),
+    )
+
+
+def write_file(path, size=64 * 1024):
+    with open(path, "wb") as file:
+        file.write(os.urandom(size))
+    return path
+
+
+class ProbePendingTasksTests(TestCase):
+    def test_task_with_unknown_strategy_does_not_stop_the_batch(self):
+        known = DownloadTask.objects.create(
+            urls="https://example.com/known.mp4", catalogue_name="probe"
+        )
+        unknown = DownloadTask.objects.create(
+            urls="https://example.com/unknown.mp4", catalogue_name="probe"
+        )
+        DownloadTask.objects.filter(id=unknown.id).update(
+            download_strategy="removed_strategy"
+        )
+        probe_task = task_probe.probe_task
+
+        def probe(urls, download_strategy, *args):
+            if download_strategy == "removed_strategy":
+                return probe_task(urls, download_strategy, *args)
+            return {"success": True, "estimated_bytes": 100, "entry_count": 1}
+
+        with mock.patch.object(task_probe, "probe_task", side_effect=probe):
+            probe_pending_tasks.call_local()
+
+        known.refresh_from_db()
+        unknown.refresh_from_db()
+        self.assertIsNotNone(unknown.probed_at)
+        self.assertIsNone(unknown.estimated_bytes)
+        self.assertIsNotNone(known.probed_at)
+        self.assertEqual(known.estimated_bytes, 100)
+
+
+class StreamingSaverMediaIndexTests(TransactionTestCase):
+    def test_playlist_entries_saved_by_several_threads_are_all_recorded(self):
+        destination = make_temp_dir(self)
+        staging = make_temp_dir(self)
+        saver = StreamingSaver(
+            local_filesystem_save_strategy,
+            "playlist",
+            max_pending=16,
+            download_archive=DownloadArchive(LOCAL_SAVE, "playlist"),
+            max_workers=4,
+            media_index=MediaIndex(LOCAL_SAVE, "video_highest"),
+        )
+        with mock.patch.dict(os.environ, {"FILESYSTEM_DESTINATION_PATH": destination}):
+            for index in range(1, 17):
+                file_path = write_file(os.path.join(staging, f"{index:02d}-entry.mp4"))
+                saver.submit(file_path, f"generic entry{index}")
+            errors = saver.close()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(saver.saved_files, 16)
+        self.assertEqual(
+            StoredMedia.objects.filter(catalogue_name="playlist").count(), 16
+        )
+        self.assertEqual(
+            DownloadArchiveEntry.objects.filter(catalogue_name="playlist").count(), 16
+        )
+
+
+class DedupArchiveTests(TestCase):
+    def setUp(self):
+        self.destination = make_temp_dir(self)
+        patcher = mock.patch.dict(
+            os.environ, {"FILESYSTEM_DESTINATION_PATH": self.destination}
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        os.makedirs(self.catalogue_path("stored"))
+        self.stored_path = write_file(
+            os.path.join(self.catalogue_path("stored"), "entry1.mp4"), 1024
+        )
+        StoredMedia.objects.create(
+            save_strategy=LOCAL_SAVE,
+            catalogue_name="stored",
+            file_name="entry1.mp4",
+            content_hash="0" * 64,
+            size_bytes=1024,
+            archive_id="generic entry1",
+            variant="video_highest",
+        )
+        self.archive = DedupArchive(
+            MediaIndex(LOCAL_SAVE, "video_highest"),
+            DownloadArchive(LOCAL_SAVE, "target"),
+        )
+
+    def catalogue_path(self, catalogue_name):
+        return os.path.join(self.destination, BASE_LOCAL_DIRECTORY, catalogue_name)
+
+    def test_lookup_places_nothing_until_stored_entries_are_placed(self):
+        self.assertIn("generic entry1", self.archive)
+        self.assertNotIn("generic entry2", self.archive)
+        self.assertFalse(os.path.exists(self.catalogue_path("target")))
+        self.assertFalse(DownloadArchiveEntry.objects.exists())
+        self.assertEqual(StoredMedia.objects.count(), 1)
+
+        placed, missing = self.archive.place_stored_entries()
+
+        self.assertEqual(list(placed), ["generic entry1"])
+        self.assertEqual(missing, [])
+        self.assertTrue(
+            os.path.samefile(
+                self.stored_path,
+                os.path.join(self.catalogue_path("target"), "entry1.mp4"),
+            )
+        )
+        self.assertTrue(
+            DownloadArchiveEntry.objects.filter(
+                catalogue_name="target", archive_id="generic entry1"
+            ).exists()
+        )
+
+    def test_missing_stored_file_is_downloaded_without_errors_logged(self):
+        os.remove(self.stored_path)
+
+        with self.assertNoLogs("downloader", "ERROR"):
+            self.assertNotIn("generic entry1", self.archive)
+            placed, missing = self.archive.place_stored_entries()
+
+        self.assertEqual((placed, missing), ({}, []))
+        self.assertEqual(StoredMedia.objects.count(), 1)
+
+    def test_stored_file_gone_before_placing_is_reported_missing(self):
+        self.assertIn("generic entry1", self.archive)
+        os.remove(self.stored_path)
+
+        with self.assertNoLogs("downloader", "ERROR"):
+            placed, missing = self.archive.place_stored_entries()
+
+        self.assertEqual((placed, missing), ({}, ["generic entry1"]))
+        self.assertFalse(StoredMedia.objects.exists())
+
+
+class TaskMediaIndexTests(TestCase):
+    def test_media_dedup_is_enabled_by_the_download_profile(self):
+        task = DownloadTask.objects.create(
+            urls="https://example.com/video.mp4", catalogue_name="dedup"
+        )
+        self.assertIsNone(task_media_index(task))
+
+        task.download_profile = DownloadProfile.objects.create(
+            name="dedup", media_dedup=True
+        )
+        self.assertIsInstance(task_media_index(task), MediaIndex)
+
+    @override_settings(MEDIA_DEDUP=True)
+    def test_media_dedup_setting_enables_it_for_every_task(self):
+        task = DownloadTask.objects.create(
+            urls="https://example.com/video.mp4", catalogue_name="dedup"
+        )
+        self.assertIsInstance(task_media_index(task), MediaIndex)
+
+
+class UrlCanonicalizationTests(TestCase):
+    def dedup_key(self, urls):
+        return task_dedup_key(urls, "video_highest", LOCAL_SAVE, "videos")
+
+    def test_video_url_forms_share_a_dedup_key(self):
+        self.assertEqual(
+            self.dedup_key("https://youtu.be/dQw4w9WgXcQ?si=abc"),
+            self.dedup_key(
+                "https://www.youtube.com/watch?feature=share&v=dQw4w9WgXcQ&pp=x"
+            ),
+        )
+        self.assertEqual(
+            canonicalize_url("https://m.youtube.com/shorts/dQw4w9WgXcQ?si=abc")[1],
+            "youtube dQw4w9WgXcQ",
+        )
+
+    def test_other_urls_keep_their_query_and_fragment(self):
+        self.assertEqual(
+            canonicalize_url("https://www.Example.com:443/video?foo&b=2&a=1#t=30")[0],
+            "https://example.com/video?a=1&b=2&foo#t=30",
+        )
+        self.assertEqual(
+            canonicalize_url("https://example.com/video?si=1&utm_source=x")[0],
+            "https://example.com/video?si=1",
+        )
+        self.assertNotEqual(
+            self.dedup_key("https://example.com/video#part1"),
+            self.dedup_key("https://example.com/video#part2"),
+        )
+        self.assertNotEqual(
+            self.dedup_key("https://example.com/video?foo"),
+            self.dedup_key("https://example.com/video"),
+        )
+
+    def test_malformed_urls_are_compared_as_they_are(self):
+        for url in ["http://example.com:99999/x", "http://[::1/x"]:
+            self.assertEqual(canonicalize_url(f" {url} "), (url, None))
+            self.dedup_key(url)
+
+    def test_videos_opened_from_a_playlist_are_not_single_videos(self):
+        self.assertIsNone(
+            canonicalize_url("https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PL1")[1]
+        )
+
+
+@mock.patch("downloader.domain.task_services.dispatch_download_tasks")
+@mock.patch("downloader.views.dispatch_download_tasks")
+class TaskCoalescingTests(TestCase):
+    def test_submitted_urls_are_stored_as_submitted(self, *_):
+        urls = "https://example.com/video?foo#t=30\nhttps://youtu.be/dQw4w9WgXcQ?si=abc"
+
+        self.client.post(
+            reverse("downloader:new_task"),
+            {
+                "urls": urls,
+                "download_strategy": "video_highest",
+                "save_strategy": LOCAL_SAVE,
+                "catalogue_name": "videos",
+            },
+        )
+
+        self.assertEqual(DownloadTask.objects.get().urls, urls)
+
+    def test_malformed_urls_are_rejected(self, *_):
+        response = self.client.post(
+            reverse("downloader:new_task"),
+            {
+                "urls": "http://example.com:99999/x",
+                "download_strategy": "video_highest",
+                "save_strategy": LOCAL_SAVE,
+                "catalogue_name": "videos",
+            },
+        )
+        result = create_and_enqueue_download_task(
+            "http://[::1/x", "video_highest", LOCAL_SAVE
+        )
+        imported = bulk_create_download_tasks(
+            parse_task_rows(
+                [
+                    '{"urls": "http://example.com:99999/x"}\n',
+                    '{"urls": "https://example.com/ok"}\n',
+                ],
+                "jsonl",
+            )
+        )
+
+        self.assertFormError(
+            response.context["form"],
+            "urls",
+            "Malformed URL: http://example.com:99999/x",
+        )
+        self.assertFalse(result["success"])
+        self.assertIn("Malformed URL", result["error"])
+        self.assertEqual(imported["created"], 1)
+        self.assertIn("Line 1:", imported["errors"][0])
+        self.assertEqual(DownloadTask.objects.get().urls, "https://example.com/ok")
+
+    def test_duplicate_saved_after_the_lookup_is_coalesced(self, *_):
+        first = create_task("video")
+        coalesce = task_services.coalesce_duplicate_task
+        # Looked up before the first task was committed, like a concurrent submission
+        lookups = iter([lambda task: None, coalesce])
+
+        with mock.patch.object(
+            task_services,
+            "coalesce_duplicate_task",
+            side_effect=lambda task: next(lookups)(task),
+        ):
+            response = self.client.post(
+                reverse("downloader:new_task"),
+                {
+                    "urls": first.urls,
+                    "download_strategy": first.download_strategy,
+                    "save_strategy": first.save_strategy,
+                    "catalogue_name": first.catalogue_name,
+                },
+            )
+
+        self.assertRedirects(
+            response,
+            reverse("downloader:task_detail", args=[first.pk]),
+            fetch_redirect_response=False,
+        )
+        self.assertEqual(DownloadTask.objects.count(), 1)
+        first.refresh_from_db()
+        self.assertEqual(first.coalesced_count, 1)
+
+    def test_unfinished_tasks_have_unique_dedup_keys(self, *_):
+        create_task("video")
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            create_task("video")
+        finished = create_task("finished", state=TaskState.COMPLETED.value)
+        create_task("finished", state=TaskState.COMPLETED.value)
+        self.assertEqual(DownloadTask.objects.filter(urls=finished.urls).count(), 2)
+
+    def test_duplicate_of_an_unfinished_task_is_attached_to_it(self, *_):
+        first = create_and_enqueue_download_task(
+            "https://youtu.be/dQw4w9WgXcQ?si=abc", "video_highest", LOCAL_SAVE
+        )
+        duplicate = create_and_enqueue_download_task(
+            "https://www.youtube.com/watch?v=dQw4w9WgXcQ&feature=share",
+            "video_highest",
+            LOCAL_SAVE,
+        )
+
+        self.assertTrue(duplicate["coalesced"])
+        self.assertEqual(duplicate["task"].pk, first["task"].pk)
+        self.assertEqual(duplicate["task"].coalesced_count, 1)
+        self.assertEqual(DownloadTask.objects.count(), 1)
+        self.assertEqual(
+            DownloadTask.objects.get().urls, "https://youtu.be/dQw4w9WgXcQ?si=abc"
+        )
+
+
+class ClaimTaskTests(TransactionTestCase):
+    def test_concurrent_claimers_claim_every_task_once(self):
+        tasks = [create_task(f"video{index}") for index in range(20)]
+        claimed = []
+
+        def claim_all(worker):
+            try:
+                while True:
+                    task = claim_next_pending_task(f"worker{worker}")
+                    if task is None:
+                        return
+                    claimed.append(task.id)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=claim_all, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertCountEqual(claimed, [task.id for task in tasks])
+        self.assertFalse(
+            DownloadTask.objects.filter(state=TaskState.PENDING.value).exists()
+        )
+
+    def test_highest_priority_is_claimed_first(self):
+        first = create_task("first")
+        second = create_task("second")
+
+        self.assertEqual(claim_next_pending_task("worker").id, second.id)
+        self.assertEqual(claim_next_pending_task("worker").id, first.id)
+
+
+@override_settings(
+    DOWNLOADER_MAX_CONCURRENT_TASKS=0,
+    DOWNLOADER_SAVE_STRATEGY_CONCURRENCY_LIMITS={},
+    DOWNLOADER_MAX_CONCURRENT_TASKS_PER_CATALOGUE=0,
+    DOWNLOADER_MAX_IN_PROGRESS_BYTES=0,
+)
+class DispatchLimitTests(TestCase):
+    def claimed_names(self):
+        return sorted(
+            DownloadTask.objects.get(id=task_id).urls.rsplit("/", 1)[1]
+            for task_id, _ in claim_tasks_for_dispatch()
+        )
+
+    def test_limits_of_zero_are_unlimited(self):
+        for index in range(6):
+            create_task(f"video{index}")
+
+        self.assertEqual(len(self.claimed_names()), 6)
+
+    @override_settings(DOWNLOADER_MAX_CONCURRENT_TASKS=3)
+    def test_global_limit_counts_running_tasks(self):
+        lease_task(create_task("running"))
+        for index in range(3):
+            create_task(f"video{index}")
+
+        self.assertEqual(self.claimed_names(), ["video1.mp4", "video2.mp4"])
+        self.assertEqual(claim_tasks_for_dispatch(), [])
+
+    @override_settings(DOWNLOADER_SAVE_STRATEGY_CONCURRENCY_LIMITS={S3_SAVE: 1})
+    def test_save_strategy_limit(self):
+        lease_task(create_task("running", save_strategy=S3_SAVE))
+        create_task("s3", save_strategy=S3_SAVE)
+        create_task("local1")
+        create_task("local2")
+
+        self.assertEqual(self.claimed_names(), ["local1.mp4", "local2.mp4"])
+
+    @override_settings(DOWNLOADER_MAX_CONCURRENT_TASKS_PER_CATALOGUE=1)
+    def test_catalogue_limit(self):
+        create_task("first")
+        create_task("second")
+        DownloadTask.objects.create(
+            urls="https://example.com/other.mp4", catalogue_name="other"
+        )
+
+        self.assertEqual(self.claimed_names(), ["other.mp4", "second.mp4"])
+
+
+class TaskPriorityTests(TestCase):
+    def pending_order(self):
+        return list(
+            DownloadTask.objects.filter(state=TaskState.PENDING.value)
+            .order_by("-priority", "created_at")
+            .values_list("id", flat=True)
+        )
+
+    def test_task_moved_onto_the_priority_of_another_is_placed_below_it(self):
+        lowest = create_task("lowest")
+        middle = create_task("middle")
+        highest = create_task("highest")
+
+        highest.priority = lowest.priority
+        highest.save()
+
+        self.assertEqual(self.pending_order(), [middle.id, lowest.id, highest.id])
+
+    def test_only_the_run_of_consecutive_priorities_is_shifted(self):
+        tasks = [create_task(f"video{index}") for index in range(4)]
+        for priority, task in zip([10, 11, 12, 20], tasks):
+            DownloadTask.objects.filter(id=task.id).update(priority=priority)
+        moved = create_task("moved")
+
+        moved.priority = 10
+        moved.save()
+
+        self.assertEqual(
+            list(
+                DownloadTask.objects.filter(id__in=[task.id for task in tasks])
+                .order_by("id")
+                .values_list("priority", flat=True)
+            ),
+            [11, 12, 13, 20],
+        )
+        self.assertEqual(self.pending_order()[-1], moved.id)
+
+
+class TaskLeaseTests(TestCase):
+    def test_expired_leases_are_reclaimed_to_the_top_of_the_queue(self):
+        queued = create_task("queued")
+        expired = create_task("expired")
+        running = create_task("running")
+        lease_task(expired, expires_in=-1)
+        lease_task(running)
+
+        self.assertEqual(reclaim_expired_tasks(), 1)
+
+        expired.refresh_from_db()
+        running.refresh_from_db()
+        queued.refresh_from_db()
+        self.assertEqual(expired.state, TaskState.PENDING.value)
+        self.assertEqual(expired.reclaim_count, 1)
+        self.assertEqual(expired.lease_owner, "")
+        self.assertGreater(expired.priority, queued.priority)
+        self.assertEqual(running.state, TaskState.IN_PROGRESS.value)
+
+    @override_settings(DOWNLOADER_MAX_TASK_RECLAIMS=3)
+    def test_task_reclaimed_too_often_fails(self):
+        task = create_task("crashing")
+        lease_task(task, expires_in=-1)
+        DownloadTask.objects.filter(id=task.id).update(reclaim_count=3)
+
+        reclaim_expired_tasks()
+
+        task.refresh_from_db()
+        self.assertEqual(task.state, TaskState.FAILED.value)
+        self.assertEqual(task.reclaim_count, 4)
+
+
+class TaskLeaseHeartbeatTests(TransactionTestCase):
+    def run_heartbeat(self, heartbeat):
+        """Runs the heartbeat thread until it attempted a renewal."""
+        renewed = threading.Event()
+
+        def renew(task_id, lease_owner):
+            try:
+                return renew_task_lease(task_id, lease_owner)
+            finally:
+                renewed.set()
+
+        with mock.patch(
+            "downloader.domain.task_lease_services.renew_task_lease",
+            side_effect=renew,
+        ):
+            heartbeat.start()
+            try:
+                self.assertTrue(renewed.wait(timeout=10))
+            finally:
+                heartbeat.stop()
+
+    def test_lease_is_renewed_without_progress_hooks(self):
+        task = create_task("silent")
+        lease_task(task, expires_in=1)
+        heartbeat = TaskLeaseHeartbeat(task.id, "worker", renew_interval=0.01)
+
+        self.run_heartbeat(heartbeat)
+
+        task.refresh_from_db()
+        self.assertGreater(
+            task.lease_expires_at, timezone.now() + timedelta(seconds=60)
+        )
+        self.assertFalse(heartbeat.lost)
+
+    def test_reclaimed_lease_is_noticed(self):
+        task = create_task("reclaimed")
+        lease_task(task, lease_owner="other worker")
+        heartbeat = TaskLeaseHeartbeat(task.id, "worker", renew_interval=0.01)
+
+        self.run_heartbeat(heartbeat)
+
+        self.assertTrue(heartbeat.lost)
+
+    def test_progress_hook_raises_once_the_lease_is_lost(self):
+        task = create_task("aborted")
+        lease_task(task)
+        heartbeat = TaskLeaseHeartbeat(task.id, "worker")
+
+        heartbeat({"status": "downloading"})
+        heartbeat.lost = True
+
+        with self.assertRaises(LeaseLostError):
+            heartbeat({"status": "downloading"})
+
+    def test_nothing_is_saved_once_the_lease_is_lost(self):
+        task = create_task("unsaved")
+        lease_task(task)
+        heartbeat = TaskLeaseHeartbeat(task.id, "worker")
+        heartbeat.lost = True
+        save_strategy = mock.Mock(return_value={"success": True})
+        saver = StreamingSaver(save_strategy, "tasks", heartbeat)
+
+        saver.submit(write_file(os.path.join(make_temp_dir(self), "lost.mp4")))
+        errors = saver.close()
+
+        save_strategy.assert_not_called()
+        self.assertEqual(len(errors), 1)
+        self.assertIn(f"Lost the lease on task {task.id}", errors[0])
+
+
+class ProcessTasksInWindowTests(TestCase):
+    @mock.patch("downloader.tasks.claim_tasks_for_dispatch")
+    def test_running_dispatch_is_left_alone(self, claim_tasks_for_dispatch):
+        with dispatch_lock:
+            process_tasks_in_window.call_local()
+
+        claim_tasks_for_dispatch.assert_not_called()
+
+
+@override_settings(DOWNLOADER_MAX_ITEM_ATTEMPTS=1)
+@mock.patch("downloader.tasks.dispatch_download_tasks")
+class FanOutOutcomeTests(TestCase):
+    def run_items(self, task, failing_urls):
+        def download_and_save(strategy_func, url, *args, **kwargs):
+            if url in failing_urls:
+                raise DownloadError(f"{url} is unavailable")
+
+        with mock.patch("downloader.tasks.download_and_save", download_and_save):
+            process_task_items.call_local(task.id, "worker")
+        task.refresh_from_db()
+
+    def fanned_out_task(self, item_count):
+        task = create_task("playlist", download_strategy="video_playlist_highest")
+        lease_task(task)
+        for position in range(item_count):
+            DownloadTaskItem.objects.create(
+                task=task, url=f"https://example.com/{position}", position=position
+            )
+        return task
+
+    def test_failed_items_fail_the_task(self, _):
+        task = self.fanned_out_task(3)
+
+        self.run_items(task, {"https://example.com/1"})
+
+        self.assertEqual(task.state, TaskState.FAILED.value)
+        self.assertEqual(task.error_message, "1 of 3 items failed.")
+        self.assertEqual(task.items.filter(state=TaskState.COMPLETED.value).count(), 2)
+
+    def test_task_completes_once_every_item_completed(self, _):
+        task = self.fanned_out_task(3)
+
+        self.run_items(task, set())
+
+        self.assertEqual(task.state, TaskState.COMPLETED.value)
+
+
+@mock.patch("downloader.domain.task_services.dispatch_download_tasks")
+class BulkTaskImportTests(TestCase):
+    def test_rows_set_the_fields_of_the_task_form(self, _):
+        profile = DownloadProfile.objects.create(name="hls")
+        lines = [
+            "urls,catalogue_name,download_profile,fan_out,incremental_sync\n",
+            "https://example.com/list,lists,hls,True,1\n",
+            "https://example.com/video,videos,,,\n",
+            "https://example.com/other,videos,missing,,\n",
+        ]
+
+        result = bulk_create_download_tasks(parse_task_rows(lines, "csv"))
+
+        self.assertEqual(result["created"], 2)
+        self.assertEqual(len(result["errors"]), 1)
+        self.assertIn("Unknown download profile: missing", result["errors"][0])
+        imported = DownloadTask.objects.get(catalogue_name="lists")
+        self.assertEqual(imported.download_profile, profile)
+        self.assertTrue(imported.fan_out)
+        self.assertTrue(imported.incremental_sync)
+        default = DownloadTask.objects.get(catalogue_name="videos")
+        self.assertIsNone(default.download_profile)
+        self.assertFalse(default.fan_out)
+        self.assertFalse(default.incremental_sync)
+
+    def test_rows_with_values_of_the_wrong_type_are_line_errors(self, _):
+        lines = [
+            '{"urls": ["https://example.com/a"]}\n',
+            '{"urls": "https://example.com/b", "download_profile": ["hls"]}\n',
+            '{"urls": "https://example.com/c", "fan_out": {"on": true}}\n',
+            '{"urls": "https://example.com/d", "fan_out": true}\n',
+        ]
+
+        result = bulk_create_download_tasks(parse_task_rows(lines, "jsonl"))
+
+        self.assertEqual(
+            result["errors"],
+            [
+                "Line 1: invalid values for urls",
+                "Line 2: invalid values for download_profile",
+                "Line 3: invalid values for fan_out",
+            ],
+        )
+        self.assertTrue(DownloadTask.objects.get(urls="https://example.com/d").fan_out)
+
+    def test_file_that_is_not_utf8_is_a_form_error(self, _):
+        upload = SimpleUploadedFile(
+            "tasks.jsonl",
+            '{"urls": "https://example.com/caf\u00e9"}\n'.encode("latin-1"),
+        )
+
+        response = self.client.post(
+            reverse("downloader:bulk_new_task"), {"file": upload, "format": "jsonl"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(
+            response.context["form"], "file", "The file is not UTF-8 encoded text."
+        )
+        self.assertFalse(DownloadTask.objects.exists())
+
+    def test_command_reports_a_file_that_is_not_utf8(self, _):
+        path = os.path.join(make_temp_dir(self), "tasks.jsonl")
+        with open(path, "wb") as file:
+            file.write('{"urls": "https://example.com/caf\u00e9"}\n'.encode("latin-1"))
+
+        with self.assertRaisesMessage(CommandError, "is not UTF-8 encoded text"):
+            call_command("import_download_tasks", path)
+
+
+@override_settings(EXTRACTION_CACHE_COUNTER_FLUSH_SECONDS=3600)
+class ExtractionCacheTests(TestCase):
+    def setUp(self):
+        extraction_cache._lookup_counts.clear()
+        self.addCleanup(extraction_cache._lookup_counts.clear)
+
+    def test_stores_leave_eviction_to_the_periodic_task(self):
+        ExtractionCacheEntry.objects.create(
+            key="expired",
+            url="https://example.com/expired",
+            kind=extraction_cache.FULL_INFO,
+            info={},
+            expires_at=timezone.now() - timedelta(seconds=1),
+        )
+
+        extraction_cache.store_cached_info(
+            "https://example.com/video", extraction_cache.FULL_INFO, {"id": "video"}
+        )
+        self.assertTrue(ExtractionCacheEntry.objects.filter(key="expired").exists())
+
+        evict_extraction_cache_entries.call_local()
+        self.assertFalse(ExtractionCacheEntry.objects.filter(key="expired").exists())
+        self.assertEqual(ExtractionCacheEntry.objects.count(), 1)
+
+    def test_lookups_are_counted_in_memory_until_flushed(self):
+        url = "https://example.com/video"
+        extraction_cache.get_cached_info(url, extraction_cache.FULL_INFO)
+        extraction_cache.store_cached_info(url, extraction_cache.FULL_INFO, {})
+        for _ in range(2):
+            extraction_cache.get_cached_info(url, extraction_cache.FULL_INFO)
+
+        self.assertFalse(ExtractionCacheCounter.objects.exists())
+
+        extraction_cache.flush_lookup_counts()
+        extraction_cache.get_cached_info(url, extraction_cache.FULL_INFO)
+        extraction_cache.flush_lookup_counts()
+
+        self.assertEqual(
+            dict(ExtractionCacheCounter.objects.values_list("name", "value")),
+            {"hit": 3, "miss": 1},
+        )
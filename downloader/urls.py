@@ -3,6 +3,7 @@ from .views import (
     TaskListView,
     TaskDetailView,
     TaskCreateView,
+    BulkTaskCreateView,
     TaskDeleteView,
     ExecutionWindowListView,
     ExecutionWindowCreateView,
@@ -14,6 +15,7 @@ app_name = 'downloader'
 urlpatterns = [
     path("tasks/", TaskListView.as_view(), name="task_list"),
     path("tasks/new/", TaskCreateView.as_view(), name="new_task"),
+    path("tasks/bulk/", BulkTaskCreateView.as_view(), name="bulk_new_task"),
     path("tasks/<int:pk>/", TaskDetailView.as_view(), name="task_detail"),
     path("tasks/<int:pk>/delete/", TaskDeleteView.as_view(), name="delete_task"),
 
@@ -1,10 +1,19 @@
+import io
 import os
 
 from django.core.paginator import Paginator
+from django.http import HttpResponseRedirect
 from django.shortcuts import render, redirect, get_object_or_404
-from django.views.generic import ListView, CreateView, DetailView, DeleteView
+from django.views.generic import ListView, CreateView, DetailView, DeleteView, FormView
 from django.urls import reverse_lazy
+from .forms import BulkTaskImportForm
 from .models import DownloadTask, TaskExecutionWindow
+from .tasks import dispatch_download_tasks
+from .domain.task_services import (
+    bulk_create_download_tasks,
+    parse_task_rows,
+    save_or_coalesce_task,
+)
 
 LOG_FILE_PATH = 'logs/download-progress.log'
 
@@ -33,9 +42,41 @@ class TaskCreateView(CreateView):
         "download_strategy",
         "save_strategy",
         "catalogue_name",
+        "download_profile",
+        "fan_out",
+        "incremental_sync",
     ]
     success_url = reverse_lazy("downloader:task_list")
 
+    def form_valid(self, form):
+        existing_task = save_or_coalesce_task(form.instance)
+        if existing_task is not None:
+            return redirect("downloader:task_detail", pk=existing_task.pk)
+        self.object = form.instance
+        dispatch_download_tasks()
+        return HttpResponseRedirect(self.get_success_url())
+
+
+# ✅ Bulk Task Import View
+class BulkTaskCreateView(FormView):
+    form_class = BulkTaskImportForm
+    template_name = "tasks/bulk_new_task.html"
+
+    def form_valid(self, form):
+        lines = io.TextIOWrapper(
+            form.cleaned_data["file"].file, encoding="utf-8", newline=""
+        )
+        try:
+            result = bulk_create_download_tasks(
+                parse_task_rows(lines, form.cleaned_data["format"])
+            )
+        except UnicodeDecodeError:
+            form.add_error("file", "The file is not UTF-8 encoded text.")
+            return self.form_invalid(form)
+        return self.render_to_response(
+            self.get_context_data(form=form, result=result)
+        )
+
 
 # ✅ Task Delete View
 class TaskDeleteView(DeleteView):